@@ -1,22 +1,47 @@
+import argparse
+import io
+import itertools
 import os
+import queue
 import sys
-from typing import cast
+import threading
+import time
+from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from fnmatch import fnmatch
+from importlib.metadata import version
+from typing import TYPE_CHECKING, cast
 
+import matplotlib
 from matplotlib import pyplot as plt
 import matplotlib.cm as cm
+from matplotlib.collections import PathCollection
 from matplotlib.colors import Normalize
-
-from cartopy.feature import ShapelyFeature
-from cartopy.mpl.geoaxes import GeoAxes
-import cartopy.crs as ccrs
+from matplotlib.path import Path
+from matplotlib.text import Text
 
 import pandas as pd
 import numpy as np
 from tqdm.auto import tqdm
 
 import constants as c
+import manifest
+import tracing
+from cache import load_cleaned
+from cube import LINE_BY, MAP_BY, DeficitCube, changed_keys
+from projection import SCENARIOS, project
+from tracing import span
+from uncertainty import DRAWS
 from utils import *
 
+# cartopy, shapely, the geometry store and the PDF backend are imported by the
+# map and bundle code that needs them, so line-only runs, dry runs and --help
+# start without them (see startup_budget.py).
+if TYPE_CHECKING:
+    from cartopy.mpl.geoaxes import GeoAxes
+
+    from uncertainty import Bands, Uncertainty
+
 
 # -------------------------------------------------------------------
 # HELPER FUNCTIONS FOR LINE PLOTS
@@ -31,10 +56,13 @@ def plot_line_figure(
     cadre_label_mapping: dict,
     cadre_colors: dict,
     proj_year: int,
+    band: pd.DataFrame | None = None,
 ) -> plt.Figure:  # type: ignore
     """
     Given the “frame” (as returned by build_line_frame), produce a matplotlib Figure
     with the actual vs. projected lines drawn. Returns the Figure object (unsaved).
+    With `band` (low/high columns indexed like the frame, see uncertainty.py)
+    each cadre's percentile band is shaded behind its line.
     Pure: it creates a small Figure in memory but does not call plt.savefig().
     """
     fig, ax = plt.subplots(figsize=(7, 4), facecolor="white")
@@ -56,6 +84,21 @@ def plot_line_figure(
         ymax = max(ymax, series.max())
         ymin = min(ymin, series.min())
 
+        if band is not None:
+            bounds = band.loc[subser.index].droplevel(["states", "variable", "cadres"])
+            bounds = np.clip(bounds, a_min=-1, a_max=1)
+            ax.fill_between(
+                bounds.index,
+                bounds["low"],
+                bounds["high"],
+                color=color,
+                alpha=0.2,
+                lw=0,
+                label="_nolegend_",
+            )
+            ymax = max(ymax, bounds["high"].max())
+            ymin = min(ymin, bounds["low"].min())
+
         real = series[series.index <= proj_year]
         proj = series[series.index >= proj_year]
 
@@ -81,13 +124,15 @@ def plot_line_figure(
     return fig
 
 
-def get_line_output_path(results_dir: str, varname: str, state: str) -> str:
+def get_line_output_path(
+    results_dir: str, varname: str, state: str, ext: str = "pdf"
+) -> str:
     """
-    Constructs the path where the line‐plot PDF should be saved, e.g.:
+    Constructs the path where the line‐plot PDF (or `ext` file) should be saved:
       {results_dir}/lines/{varname}/{state}.pdf
     Pure: just returns a string, does not create directories.
     """
-    return os.path.join(results_dir, "lines", varname, f"{state}.pdf")
+    return os.path.join(results_dir, "lines", varname, f"{state}.{ext}")
 
 
 # -------------------------------------------------------------------
@@ -125,72 +170,197 @@ def prepare_color_mapper(vmin: int = 0, vmax: int = 7):
     return mapper
 
 
-def plot_map_figure(
+@dataclass
+class MapTemplate:
+    """
+    A map figure whose state polygons, labels and colorbar are built once.
+    Each map only recolors `states` and retitles the axes before saving.
+    """
+
+    fig: plt.Figure  # type: ignore
+    ax: "GeoAxes"
+    states: PathCollection
+    state_names: list[str]
+    labels: dict[str, Text]
+    # keeps the geometries alive so the id-based template cache stays valid
+    state_geoms: dict
+
+
+# Templates of this process, keyed by `_map_template_key`
+_MAP_TEMPLATES: dict[tuple, MapTemplate] = {}
+
+
+def _map_template_key(
+    state_geoms, state_abbr, label_points, mapper, a_step, base, vmin, vmax
+):
+    return (
+        id(state_geoms),
+        id(state_abbr),
+        id(label_points),
+        id(mapper),
+        a_step,
+        base,
+        vmin,
+        vmax,
+    )
+
+
+def geometry_paths(geoms: list) -> list[Path]:
+    """
+    Returns one compound Path per (multi)polygon in lon/lat, built from the
+    coordinate arrays of all geometries at once. Equivalent to
+    `geos_to_path(PlateCarree().project_geometry(g))` for geometries inside
+    the projection's domain, without the per-geometry projection calls that
+    dominate the template build at district level. Pure: no I/O.
+    """
+    import shapely
+
+    parts, owner = shapely.get_parts(geoms, return_index=True)
+    rings, part = shapely.get_rings(parts, return_index=True)
+    coords, ring = shapely.get_coordinates(rings, return_index=True)
+
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    starts = np.flatnonzero(np.diff(ring, prepend=-1))
+    codes[starts] = Path.MOVETO
+    codes[np.append(starts[1:], len(coords)) - 1] = Path.CLOSEPOLY
+
+    # geometry of every coordinate; get_parts/get_rings keep the input order
+    split = np.searchsorted(owner[part[ring]], np.arange(1, len(geoms)))
+    return [Path(v, k) for v, k in zip(np.split(coords, split), np.split(codes, split))]
+
+
+def build_map_template(
     state_geoms: dict,
-    digitized_series: pd.Series,
-    varname: str,
-    year: int,
-    cadre: str,
-    cadre_label_mapping: dict,
-    varname_mapping: dict,
     state_abbr: dict,
     mapper,
     a_step,
     base,
     vmin,
     vmax,
-) -> plt.Figure:  # type: ignore
+    label_points: dict | None = None,
+) -> MapTemplate:
     """
-    Given the digitized series (indexed by state name), returns a matplotlib Figure
-    that draws each state polygon, colors it, and adds text labels. Pure in the sense
-    that it only creates a Figure and returns it (does not save to disk).
+    Puts every state polygon once into a single rasterized collection,
+    places (hidden) state labels and adds the colorbar. Labels sit at
+    `label_points` ({state: (x, y)}, e.g. the geometry store's precomputed
+    centroids), or at centroids computed here.
     """
+    import cartopy.crs as ccrs
+    import shapely
+
     proj_crs = ccrs.PlateCarree()
 
     fig = plt.figure(figsize=(7, 7), facecolor="white")
-    ax = cast(GeoAxes, fig.add_subplot(projection=proj_crs))
+    ax = cast("GeoAxes", fig.add_subplot(projection=proj_crs))
     ax.set_extent([67, 98, 6, 38])
 
+    state_names = list(state_geoms.keys())
+    states = PathCollection(
+        geometry_paths([state_geoms[state] for state in state_names]),
+        transform=ax.transData,
+        edgecolor="black",
+        facecolor="none",
+        lw=0.5,
+        rasterized=True,
+    )
+    ax.add_collection(states)
+
+    labels = {}
+    labelled = [state for state in state_names if state in state_abbr]
+    if label_points is None:
+        centroids = shapely.centroid([state_geoms[state] for state in labelled])
+        points = shapely.get_coordinates(centroids)
+    else:
+        points = [label_points[state] for state in labelled]
+    for state, (x, y) in zip(labelled, points):
+        labels[state] = ax.text(
+            x,
+            y,
+            state_abbr[state],
+            va="center",
+            ha="center",
+            transform=proj_crs,
+            visible=False,
+        )
+
     cticks = np.arange(vmin - 0.5, vmax + 1.5, 1)
     # cticklabels correspond to actual value ranges, e.g. [-1, -0.75, …, 1]
     # but here we keep them as simple integers or bins for demonstration
     cticklabels = np.arange(
         a_step * (vmin + base), a_step * (vmax + base) + 2 * a_step, a_step
     )
+    cbar = plt.colorbar(mapper, shrink=0.8, ax=ax)
+    cbar.set_ticks(cticks)
+    cbar.set_ticklabels(cticklabels)
 
-    # Track which states are filled
-    filled = {s: False for s in state_geoms.keys()}
+    return MapTemplate(fig, ax, states, state_names, labels, state_geoms)
 
-    # Drop top‐levels
-    series = digitized_series.droplevel(["variable", "year", "cadres"])
 
-    for state, value in series.items():
-        if state == "india":
-            continue
-        record = state_geoms[state]
-        color = mapper.to_rgba(value)
-        feature = ShapelyFeature(
-            [record], proj_crs, edgecolor="black", lw=0.5, facecolor=color
+def get_map_template(
+    state_geoms: dict,
+    state_abbr: dict,
+    mapper,
+    a_step,
+    base,
+    vmin,
+    vmax,
+    label_points: dict | None = None,
+) -> MapTemplate:
+    """
+    Returns this process's template for the given geometries and color scale,
+    building it on first use.
+    """
+    key = _map_template_key(
+        state_geoms, state_abbr, label_points, mapper, a_step, base, vmin, vmax
+    )
+    if key not in _MAP_TEMPLATES:
+        _MAP_TEMPLATES[key] = build_map_template(
+            state_geoms, state_abbr, mapper, a_step, base, vmin, vmax, label_points
         )
-        centroid = record.centroid
-        abbr = state_abbr[state]
-        ax.add_feature(feature, rasterized=True)
-        ax.text(centroid.x, centroid.y, abbr, va="center", ha="center")
-        filled[state] = True
-
-    # Outline states without data
-    for state, is_filled in filled.items():
-        if not is_filled:
-            record = state_geoms[state]
-            feature = ShapelyFeature(
-                [record], proj_crs, edgecolor="black", facecolor="none", lw=0.5
-            )
-            ax.add_feature(feature, rasterized=True)
+    return _MAP_TEMPLATES[key]
 
-    # Add colorbar
-    cbar = plt.colorbar(mapper, shrink=0.8, ax=ax)
-    cbar.set_ticks(cticks)
-    cbar.set_ticklabels(cticklabels)
+
+def plot_map_figure(
+    state_geoms: dict,
+    digitized_series: pd.Series,
+    varname: str,
+    year: int,
+    cadre: str,
+    cadre_label_mapping: dict,
+    varname_mapping: dict,
+    state_abbr: dict,
+    mapper,
+    a_step,
+    base,
+    vmin,
+    vmax,
+    label_points: dict | None = None,
+) -> plt.Figure:  # type: ignore
+    """
+    Given the digitized series (indexed by state name), returns a matplotlib Figure
+    with each state colored and labelled. States without data are only outlined.
+    The Figure is the process-wide template from `get_map_template`, recolored and
+    retitled in place: save it before the next call and do not close it.
+    """
+    template = get_map_template(
+        state_geoms, state_abbr, mapper, a_step, base, vmin, vmax, label_points
+    )
+
+    # Drop top‐levels
+    series = digitized_series.droplevel(["variable", "year", "cadres"])
+    series = series.drop("india", errors="ignore")
+    unknown = series.index.difference(template.state_names)
+    if len(unknown):
+        raise KeyError(f"no geometry for {list(unknown)}")
+
+    filled = pd.Index(template.state_names).isin(series.index)
+    values = series.reindex(template.state_names).to_numpy(dtype=float)
+    facecolors = mapper.to_rgba(values)
+    facecolors[~filled] = 0  # unfilled states are outlined only
+    template.states.set_facecolors(facecolors)
+    shown = pd.Index(list(template.labels)).isin(series.index)
+    for label, visible in zip(template.labels.values(), shown):
+        label.set_visible(visible)
 
     # Title
     var_full_name = varname_mapping[varname]
@@ -203,67 +373,220 @@ def plot_map_figure(
         title = f"{line1} {line2}"
     else:
         title = f"{line1}\n{line2}"
-    ax.set_title(title, size="x-large", loc="left")
-    fig.tight_layout()
+    template.ax.set_title(title, size="x-large", loc="left")
+    template.fig.tight_layout()
 
-    return fig
+    return template.fig
 
 
 def get_map_output_path(
-    results_dir: str, varname: str, year: int, cadre: str, cadre_label_mapping: dict
+    results_dir: str,
+    varname: str,
+    year: int,
+    cadre: str,
+    cadre_label_mapping: dict,
+    ext: str = "pdf",
 ) -> str:
     """
-    Returns the path where the map PDF should be saved:
+    Returns the path where the map PDF (or `ext` file) should be saved:
       {results_dir}/maps/{varname}/{year}/{CadreLabel}.pdf
     Pure: string construction only.
     """
     cadre_label = cadre_label_mapping.get(
         cadre, " ".join([w.capitalize() for w in cadre.split()])
     )
-    return os.path.join(results_dir, "maps", varname, str(year), f"{cadre_label}.pdf")
+    return os.path.join(results_dir, "maps", varname, str(year), f"{cadre_label}.{ext}")
 
 
 # -------------------------------------------------------------------
-# MAIN GENERATORS (use the pure helpers inside)
+# PER-FIGURE STAGES: plan -> slice -> draw -> encode -> write
 # -------------------------------------------------------------------
 
 
-def generate_line_plots(
-    cleaned: pd.Series,
+DPI = 450
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """
+    How figures are written: file format and dpi, and whether all figures of a
+    variable go into one multi-page PDF bundle instead of one file each.
+    """
+
+    format: str
+    dpi: int
+    bundle: bool = False
+
+
+PROFILES = {
+    # one vector PDF per figure, for the paper
+    "publication": OutputProfile("pdf", DPI),
+    # fast low-dpi rasters for review cycles
+    "preview": OutputProfile("png", 96),
+    "preview-webp": OutputProfile("webp", 96),
+    # one multi-page PDF per variable, for the supplement
+    "bundle": OutputProfile("pdf", DPI, bundle=True),
+}
+# Raster dpi per file format; every profile sharing a format uses the same dpi
+FORMAT_DPI = {profile.format: profile.dpi for profile in PROFILES.values()}
+# Only the PDF backend stamps a creation date
+FORMAT_METADATA = {"pdf": {"CreationDate": None}}
+
+
+def get_bundle_output_path(results_dir: str, kind: str, varname: str) -> str:
+    """
+    Returns the path of the multi-page PDF holding every figure of a variable:
+      {results_dir}/bundles/{kind}/{varname}.pdf
+    Pure: string construction only.
+    """
+    return os.path.join(results_dir, "bundles", kind, f"{varname}.pdf")
+
+
+def encode_figure(fig: plt.Figure, out_path: str) -> bytes:  # type: ignore
+    """
+    Renders the figure into the file format of `out_path`, at that format's
+    dpi, and returns the bytes. The creation date is left out so identical
+    inputs produce byte-identical files. Runs on the thread that drew the
+    figure: Agg rendering is not thread-safe.
+    """
+    fmt = os.path.splitext(out_path)[1][1:]
+    buf = io.BytesIO()
+    fig.savefig(
+        buf, format=fmt, dpi=FORMAT_DPI.get(fmt, DPI), metadata=FORMAT_METADATA.get(fmt)
+    )
+    return buf.getvalue()
+
+
+def write_output(out_path: str, data: bytes) -> None:
+    """
+    Writes an encoded figure atomically, so readers never see a partial file.
+    """
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, out_path)
+
+
+def save_figure(fig: plt.Figure, out_path: str, close: bool = True) -> None:  # type: ignore
+    """
+    Encodes and writes the figure in one go, then closes it unless `close` is
+    False (map templates). Whether it needs drawing at all is decided
+    beforehand from the build manifest.
+    """
+    write_output(out_path, encode_figure(fig, out_path))
+    if close:
+        plt.close(fig)
+
+
+def plan_line_plot(
+    key: tuple[str, str],
+    group_series: pd.Series,
     varname_mapping: dict,
     cadre_label_mapping: dict,
     cadres_of_interest: tuple,
+    cadre_colors: dict,
     proj_year: int,
     results_dir: str,
-) -> None:
+    style: str,
+    profile: OutputProfile = PROFILES["publication"],
+    bands_digest: str | None = None,
+) -> tuple[str, str] | None:
     """
-    Iterates over (state, variable) groups and:
-      1. Determines which cadres to plot
-      2. Builds the frame for plotting
-      3. Calls `plot_line_figure(...)` to get a Figure
-      4. Saves the figure to disk
+    Returns the (output path, input fingerprint) of the line plot of one
+    (state, variable) group without drawing it, or None when there are no
+    cadres to plot. With uncertainty bands, `bands_digest` (see
+    `uncertainty.bands_digest`) stands in for them: a band only depends on
+    its cell's value and those settings, so no simulation is needed to plan.
+    Pure: no I/O.
     """
-    cadre_colors = {
-        cadre: f"C{i}"
-        for i, cadre in enumerate(
-            cadres_of_interest + ("nursing cadres", "supporting cadres")
-        )
-    }
+    state, varname = key
+    intersection = determine_cadre_intersection(
+        varname, group_series, cadres_of_interest
+    )
+    if not intersection:
+        return None
 
-    for (state, varname), group_series in tqdm(
-        list(cleaned.groupby(["states", "variable"]))
-    ):
-        if varname not in varname_mapping:
-            print(f"skipping {varname}, not in mapping", file=sys.stderr)
-            continue
+    cadres = sorted(intersection)
+    frame = group_series.loc[:, :, :, cadres].sort_index()
+    inputs = [
+        frame,
+        state,
+        varname_mapping[varname],
+        [(cadre_label_mapping.get(k, k), cadre_colors.get(k)) for k in cadres],
+        proj_year,
+        style,
+    ]
+    if bands_digest is not None:
+        inputs.append(bands_digest)
+    fp = manifest.fingerprint(*inputs)
+    return get_line_output_path(results_dir, varname, state, profile.format), fp
 
-        intersection = determine_cadre_intersection(
-            varname, group_series, cadres_of_interest
-        )
-        if not intersection:
-            continue
 
-        frame = group_series.loc[:, :, :, list(intersection)]
+def plan_map_plot(
+    key: tuple[str, int, str],
+    group_series: pd.Series,
+    varname_mapping: dict,
+    cadre_label_mapping: dict,
+    state_abbr: dict,
+    vmin: int,
+    vmax: int,
+    results_dir: str,
+    geometry: str,
+    style: str,
+    profile: OutputProfile = PROFILES["publication"],
+) -> tuple[str, str]:
+    """
+    Returns the (output path, input fingerprint) of the map of one
+    (variable, year, cadre) group without drawing it. The fingerprint covers the
+    digitized buckets, so value changes within a bucket do not redraw the map.
+    Pure: no I/O.
+    """
+    varname, year, cadre = key
+    digitized, a_step, base = digitize_values_for_map(varname, group_series)
+    fp = manifest.fingerprint(
+        digitized,
+        (a_step, base, vmin, vmax),
+        varname_mapping[varname],
+        cadre_label_mapping.get(cadre, cadre),
+        sorted(state_abbr.items()),
+        geometry,
+        style,
+    )
+    out_path = get_map_output_path(
+        results_dir, varname, year, cadre, cadre_label_mapping, profile.format
+    )
+    return out_path, fp
+
+
+def draw_line_plot(
+    key: tuple[str, str],
+    group_series: pd.Series,
+    varname_mapping: dict,
+    cadre_label_mapping: dict,
+    cadres_of_interest: tuple,
+    cadre_colors: dict,
+    proj_year: int,
+    results_dir: str,
+    profile: OutputProfile = PROFILES["publication"],
+    bands: "Bands | None" = None,
+) -> tuple[str, plt.Figure] | None:  # type: ignore
+    """
+    Draws the line plot of one (state, variable) group, with the percentile
+    band of every cadre when `bands` is given. Returns the output path
+    and the figure, already detached from pyplot, or None when there are no
+    cadres to plot.
+    """
+    state, varname = key
+    intersection = determine_cadre_intersection(
+        varname, group_series, cadres_of_interest
+    )
+    if not intersection:
+        return None
+
+    out_path = get_line_output_path(results_dir, varname, state, profile.format)
+    frame = group_series.loc[:, :, :, list(intersection)]
+    with span("draw line", figure=out_path):
         fig = plot_line_figure(
             frame=frame,
             state=state,
@@ -272,43 +595,37 @@ def generate_line_plots(
             cadre_label_mapping=cadre_label_mapping,
             cadre_colors=cadre_colors,
             proj_year=proj_year,
+            band=None if bands is None else bands.line_band(state, varname),
         )
-
-        out_path = get_line_output_path(results_dir, varname, state)
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        if not os.path.exists(out_path):
-            fig.savefig(out_path, dpi=450)
-        plt.close(fig)
+    plt.close(fig)
+    return out_path, fig
 
 
-def generate_map_plots(
-    cleaned: pd.Series,
+def draw_map_plot(
+    key: tuple[str, int, str],
+    group_series: pd.Series,
     state_geoms: dict,
     varname_mapping: dict,
     cadre_label_mapping: dict,
     state_abbr: dict,
+    mapper,
+    vmin: int,
+    vmax: int,
     results_dir: str,
-) -> None:
+    profile: OutputProfile = PROFILES["publication"],
+    label_points: dict | None = None,
+) -> tuple[str, plt.Figure]:  # type: ignore
     """
-    Iterates over (variable, year, cadre) groups and:
-      1. Digitizes the values
-      2. Prepares the color mapper & ticks
-      3. Calls `plot_map_figure(...)` to get a Figure
-      4. Saves the figure to disk
+    Draws the map of one (variable, year, cadre) group. Returns the output path
+    and the shared map template figure, which must be encoded before the next
+    map is drawn.
     """
-
-    vmin, vmax = 0, 7
-    # (We can reuse the same mapper for all, since vmin/vmax don't change)
-    mapper = prepare_color_mapper(vmin=vmin, vmax=vmax)
-
-    for (varname, year, cadre), group_series in tqdm(
-        cleaned.groupby(["variable", "year", "cadres"])
-    ):
-        if varname not in varname_mapping:
-            print(f"skipping {varname}, not in mapping", file=sys.stderr)
-            continue
-
-        digitized, a_step, base = digitize_values_for_map(varname, group_series)
+    varname, year, cadre = key
+    out_path = get_map_output_path(
+        results_dir, varname, year, cadre, cadre_label_mapping, profile.format
+    )
+    digitized, a_step, base = digitize_values_for_map(varname, group_series)
+    with span("draw map", figure=out_path):
         fig = plot_map_figure(
             state_geoms=state_geoms,
             digitized_series=digitized,
@@ -323,45 +640,946 @@ def generate_map_plots(
             base=base,
             vmin=vmin,
             vmax=vmax,
+            label_points=label_points,
         )
+    return out_path, fig
+
+
+def encode_output(drawn: tuple) -> tuple[str, bytes]:
+    """
+    Encode step: turns the (out_path, figure or bytes) of a draw stage into
+    (out_path, bytes).
+    """
+    out_path, payload = drawn
+    if isinstance(payload, bytes):
+        return out_path, payload
+    with span("encode", figure=out_path):
+        return out_path, encode_figure(payload, out_path)
 
-        out_path = get_map_output_path(
-            results_dir, varname, year, cadre, cadre_label_mapping
+
+def render_job(key: tuple, group_series: pd.Series, draw, draw_kwargs: dict):
+    """
+    Runs draw, encode and write for one group in the calling thread.
+    Returns the output path, or None when nothing was drawn.
+    """
+    drawn = draw(key, group_series, **draw_kwargs)
+    if drawn is None:
+        return None
+    out_path, data = encode_output(drawn)
+    with span("write", figure=out_path):
+        write_output(out_path, data)
+    return out_path
+
+
+# -------------------------------------------------------------------
+# JOB RUNNER (streaming pipeline or process pool)
+# -------------------------------------------------------------------
+
+# Figures buffered between two pipeline stages, and jobs in flight per worker
+PIPELINE_DEPTH = 4
+
+# Per-process state of a render worker, filled once by `_init_render_worker`
+_WORKER_STATE: dict = {}
+
+
+def _init_render_worker(cube: DeficitCube, by: list, draw, draw_kwargs: dict):
+    """
+    Process-pool initializer: receives the cube and the draw arguments
+    (geometries included) once per worker instead of once per job.
+    """
+    _WORKER_STATE["cube"] = cube
+    _WORKER_STATE["by"] = by
+    _WORKER_STATE["draw"] = draw
+    _WORKER_STATE["kwargs"] = draw_kwargs
+
+
+def _render_job(key: tuple):
+    group = _WORKER_STATE["cube"].group(_WORKER_STATE["by"], key)
+    try:
+        return render_job(key, group, _WORKER_STATE["draw"], _WORKER_STATE["kwargs"])
+    finally:
+        tracing.flush_part()
+
+
+def select_group_keys(
+    cube: DeficitCube, by: list, varname_mapping: dict
+) -> list[tuple]:
+    """
+    Returns the sorted non-empty group keys of `by` whose variable has a
+    label, warning about the ones that are skipped.
+    """
+    var_pos = by.index("variable")
+    keys, skipped = [], set()
+    for key in cube.group_keys(by):
+        if key[var_pos] in varname_mapping:
+            keys.append(key)
+        else:
+            skipped.add(key[var_pos])
+    for varname in sorted(skipped):
+        print(f"skipping {varname}, not in mapping", file=sys.stderr)
+    return sorted(keys)
+
+
+_DONE = object()
+
+
+def _stage_worker(inbox: queue.Queue, fn, outbox: queue.Queue | None, errors: list):
+    """
+    Applies `fn` to every item of `inbox` until `_DONE`, passing results on to
+    `outbox`. After a failure anywhere it only drains `inbox`, so upstream
+    stages never block on a full queue.
+    """
+    while (item := inbox.get()) is not _DONE:
+        if errors:
+            continue
+        try:
+            result = fn(item)
+        except BaseException as e:
+            errors.append(e)
+            continue
+        if outbox is not None:
+            outbox.put(result)
+    if outbox is not None:
+        outbox.put(_DONE)
+
+
+def stream_render_jobs(
+    cube: DeficitCube,
+    by: list,
+    keys,
+    draw,
+    draw_kwargs: dict,
+    on_result=None,
+    total: int | None = None,
+    depth: int = PIPELINE_DEPTH,
+) -> None:
+    """
+    Renders the groups of `keys` as a streaming pipeline in this process:
+
+        keys -> slice -> draw -> encode (this thread) -> write (one thread)
+
+    Figures are drawn and encoded on this thread, since matplotlib rendering
+    is not thread-safe; only the file writes overlap with drawing the next
+    figure. The write queue holds `depth` encoded figures, so memory stays
+    bounded whatever the number of groups. `keys` may be any iterable;
+    groups are sliced from the cube only when they are drawn.
+    `on_result(key, out_path)` is called from the writer thread.
+    """
+    write_q = queue.Queue(depth)
+    errors: list = []
+    pbar = tqdm(total=total)
+
+    def write(job):
+        key, (out_path, data) = job
+        with span("write", figure=out_path):
+            write_output(out_path, data)
+        if on_result is not None:
+            on_result(key, out_path)
+        pbar.update()
+
+    writer = threading.Thread(
+        target=_stage_worker, args=(write_q, write, None, errors), name="write"
+    )
+    writer.start()
+    try:
+        for key in keys:
+            if errors:
+                break
+            drawn = draw(key, cube.group(by, key), **draw_kwargs)
+            if drawn is None:
+                pbar.update()
+                continue
+            write_q.put((key, encode_output(drawn)))
+    finally:
+        write_q.put(_DONE)
+        writer.join()
+        pbar.close()
+    if errors:
+        raise errors[0]
+
+
+def run_render_jobs(
+    cube: DeficitCube,
+    by: list,
+    keys: list[tuple],
+    draw,
+    draw_kwargs: dict,
+    workers: int = 1,
+    on_result=None,
+) -> None:
+    """
+    Draws, encodes and writes the figure of every key, either as a streaming
+    pipeline in this process or on a pool of `workers` processes. The pool
+    only ever holds `PIPELINE_DEPTH` jobs per worker; completions and failures
+    are reported on a single progress bar and failed keys raise at the end.
+    `on_result(key, out_path)` is called as each job succeeds.
+    """
+    if workers <= 1:
+        stream_render_jobs(
+            cube, by, keys, draw, draw_kwargs, on_result, total=len(keys)
         )
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        if not os.path.exists(out_path):
-            fig.savefig(out_path, dpi=450)
-        plt.close(fig)
+        return
 
+    failed = []
+    pending_keys = iter(keys)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_render_worker,
+        initargs=(cube, by, draw, draw_kwargs),
+    ) as pool:
 
-if __name__ == "__main__":
-    # Define file paths
-    EXCEL_FILE = "Documents/14_07_22_VW_AAAQ_mastersheet__26_NOV_23.xlsx"
-    SHAPEFILE_PATH = "Documents/maps-master/States/Admin2"
-    RESULTS_DIR = "Results/raw-value-based"
-    PROJ_YEAR = 2011
+        def submit(n: int) -> dict:
+            return {
+                pool.submit(_render_job, key): key
+                for key in itertools.islice(pending_keys, n)
+            }
 
-    # Load and preprocess data
-    raw_data = load_raw_data(EXCEL_FILE)
-    state_geometries = load_state_geometries(SHAPEFILE_PATH)
-    cleaned_stacked = clean_data(raw_data)
-
-    # Generate line plots
-    generate_line_plots(
-        cleaned=cleaned_stacked,
-        varname_mapping=c.VARNAME_MAPPING,
-        cadre_label_mapping=c.CADRE_LABEL_MAPPING,
-        cadres_of_interest=c.CADRES_OF_INTEREST,
-        proj_year=PROJ_YEAR,
-        results_dir=RESULTS_DIR,
+        futures = submit(workers * PIPELINE_DEPTH)
+        with tqdm(total=len(keys)) as pbar:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = futures.pop(future)
+                    try:
+                        out_path = future.result()
+                    except Exception as e:
+                        failed.append(key)
+                        tqdm.write(f"failed to render {key}: {e!r}", file=sys.stderr)
+                    else:
+                        if on_result is not None and out_path is not None:
+                            on_result(key, out_path)
+                    pbar.update()
+                futures.update(submit(len(done)))
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(keys)} figures failed to render")
+
+
+def write_bundle(
+    bundle_path: str, cube: DeficitCube, by: list, keys: list[tuple], draw, draw_kwargs
+) -> int:
+    """
+    Draws the figures of `keys` one at a time and streams each as a page into
+    the multi-page PDF at `bundle_path`, so a single figure is alive at a time.
+    The file is moved into place once complete. Returns the number of pages.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+    tmp_path = f"{bundle_path}.{os.getpid()}.tmp"
+    pages = 0
+    try:
+        with PdfPages(tmp_path, metadata={"CreationDate": None}) as pdf:
+            for key in keys:
+                drawn = draw(key, cube.group(by, key), **draw_kwargs)
+                if drawn is None:
+                    continue
+                out_path, fig = drawn
+                with span("bundle page", figure=out_path):
+                    pdf.savefig(fig, dpi=DPI)
+                pages += 1
+        if pages:
+            os.replace(tmp_path, bundle_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return pages
+
+
+def _bundle_job(job: tuple[str, list]):
+    bundle_path, keys = job
+    try:
+        return write_bundle(
+            bundle_path,
+            _WORKER_STATE["cube"],
+            _WORKER_STATE["by"],
+            keys,
+            _WORKER_STATE["draw"],
+            _WORKER_STATE["kwargs"],
+        )
+    finally:
+        tracing.flush_part()
+
+
+def run_bundle_jobs(
+    cube: DeficitCube,
+    by: list,
+    bundles: dict[str, list],
+    draw,
+    draw_kwargs: dict,
+    workers: int = 1,
+    on_result=None,
+) -> None:
+    """
+    Writes every {bundle path: keys} bundle, in this process or one bundle per
+    job on a pool of `workers` processes. `on_result(bundle_path, pages)` is
+    called as each bundle is written; failed bundles raise at the end.
+    """
+    if workers <= 1:
+        for bundle_path, keys in tqdm(bundles.items()):
+            pages = write_bundle(bundle_path, cube, by, keys, draw, draw_kwargs)
+            if on_result is not None:
+                on_result(bundle_path, pages)
+        return
+
+    failed = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_render_worker,
+        initargs=(cube, by, draw, draw_kwargs),
+    ) as pool:
+        futures = {pool.submit(_bundle_job, job): job[0] for job in bundles.items()}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            bundle_path = futures[future]
+            try:
+                pages = future.result()
+            except Exception as e:
+                failed.append(bundle_path)
+                tqdm.write(f"failed to write {bundle_path}: {e!r}", file=sys.stderr)
+            else:
+                if on_result is not None:
+                    on_result(bundle_path, pages)
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(bundles)} bundles failed")
+
+
+def run_incremental(
+    cube: DeficitCube,
+    by: list,
+    keys: list[tuple],
+    plan,
+    plan_kwargs: dict,
+    draw,
+    draw_kwargs: dict,
+    results_dir: str,
+    workers: int = 1,
+    dry_run: bool = False,
+    profile: OutputProfile = PROFILES["publication"],
+    kind: str = "",
+) -> tuple[int, int]:
+    """
+    Fingerprints every key with `plan`, renders only the figures whose
+    fingerprint differs from the build manifest (or whose file is missing),
+    and records each newly written figure in the manifest. With a bundle
+    profile, a variable's bundle under {results_dir}/bundles/{kind}/ is
+    rewritten when any of its pages is stale. With `dry_run` nothing is drawn.
+    Returns the number of planned and of stale figures.
+    """
+    manifest_path = manifest.get_manifest_path(results_dir)
+    entries = manifest.load_manifest(manifest_path)
+
+    planned = {}
+    with span("plan", figures=len(keys)):
+        for key in keys:
+            result = plan(key, cube.group(by, key), **plan_kwargs)
+            if result is not None:
+                planned[key] = result
+
+    if profile.bundle:
+        var_pos = by.index("variable")
+        bundles: dict[str, list] = {}
+        for key in planned:
+            path = get_bundle_output_path(results_dir, kind, key[var_pos])
+            bundles.setdefault(path, []).append(key)
+        stale = {}
+        for path, bundle_keys in bundles.items():
+            fp = manifest.fingerprint(*(planned[key][1] for key in bundle_keys))
+            if not manifest.is_current(entries, results_dir, path, fp):
+                stale[path] = fp
+        n_pages = sum(len(bundles[path]) for path in stale)
+        print(
+            f"{len(stale)} of {len(bundles)} bundles to write ({n_pages} pages)",
+            file=sys.stderr,
+        )
+        if not stale or dry_run:
+            return len(keys), n_pages
+
+        def on_bundle(path, pages):
+            manifest.record(entries, results_dir, path, stale[path])
+
+        try:
+            run_bundle_jobs(
+                cube,
+                by,
+                {path: bundles[path] for path in stale},
+                draw,
+                draw_kwargs,
+                workers,
+                on_bundle,
+            )
+        finally:
+            manifest.save_manifest(manifest_path, entries)
+        return len(keys), n_pages
+
+    stale = {
+        key: fp
+        for key, (out_path, fp) in planned.items()
+        if not manifest.is_current(entries, results_dir, out_path, fp)
+    }
+    print(f"{len(stale)} of {len(keys)} figures to draw", file=sys.stderr)
+    if not stale or dry_run:
+        return len(keys), len(stale)
+
+    def on_result(key, out_path):
+        manifest.record(entries, results_dir, out_path, stale[key])
+
+    try:
+        run_render_jobs(cube, by, list(stale), draw, draw_kwargs, workers, on_result)
+    finally:
+        manifest.save_manifest(manifest_path, entries)
+    return len(keys), len(stale)
+
+
+# -------------------------------------------------------------------
+# MAIN GENERATORS (use the pure helpers inside)
+# -------------------------------------------------------------------
+
+
+def generate_line_plots(
+    cleaned: pd.Series,
+    varname_mapping: dict,
+    cadre_label_mapping: dict,
+    cadres_of_interest: tuple,
+    proj_year: int,
+    results_dir: str,
+    workers: int = 1,
+    keys: list[tuple] | None = None,
+    dry_run: bool = False,
+    profile: str = "publication",
+    uncertainty: "Uncertainty | None" = None,
+    draws: int = DRAWS,
+) -> tuple[int, int]:
+    """
+    Iterates over (state, variable) groups (all, or only `keys`) and, for each,
+    calls `draw_line_plot`:
+      1. Determines which cadres to plot
+      2. Builds the frame for plotting
+      3. Calls `plot_line_figure(...)` to get a Figure
+    and then encodes and saves the figure to disk, overlapping with the drawing
+    of the next one. With `workers > 1` the groups are rendered on a process pool.
+    `profile` names the output format in PROFILES. With `uncertainty`, the
+    percentile bands of `draws` Monte Carlo draws are computed up front for the
+    states of the plotted groups (not on dry runs) and shaded on every plot.
+    Returns the number of planned and of (re)drawn figures.
+    """
+    output = PROFILES[profile]
+    cadre_colors = {
+        cadre: f"C{i}"
+        for i, cadre in enumerate(
+            cadres_of_interest + ("nursing cadres", "supporting cadres")
+        )
+    }
+
+    cube = DeficitCube.from_series(cleaned)
+    by = LINE_BY
+    if keys is None:
+        keys = select_group_keys(cube, by, varname_mapping)
+    bands = digest = None
+    if uncertainty is not None:
+        from uncertainty import bands_digest, simulate_bands
+
+        digest = bands_digest(cube, uncertainty, draws=draws)
+        if not dry_run:
+            state_pos = by.index("states")
+            states = sorted({key[state_pos] for key in keys})
+            selected = cube.reindex(states, cube.variables, cube.cadres, cube.years)
+            bands = simulate_bands(selected, uncertainty, draws=draws)
+    render_kwargs = dict(
+        varname_mapping=varname_mapping,
+        cadre_label_mapping=cadre_label_mapping,
+        cadres_of_interest=cadres_of_interest,
+        cadre_colors=cadre_colors,
+        proj_year=proj_year,
+        results_dir=results_dir,
+        profile=output,
+    )
+    style = manifest.source_digest(
+        plot_line_figure, extra=(output.dpi, matplotlib.__version__)
+    )
+    return run_incremental(
+        cube,
+        by,
+        keys,
+        plan_line_plot,
+        dict(render_kwargs, style=style, bands_digest=digest),
+        draw_line_plot,
+        dict(render_kwargs, bands=bands),
+        results_dir,
+        workers=workers,
+        dry_run=dry_run,
+        profile=output,
+        kind="lines",
+    )
+
+
+def generate_map_plots(
+    cleaned: pd.Series,
+    state_geoms: dict,
+    varname_mapping: dict,
+    cadre_label_mapping: dict,
+    state_abbr: dict,
+    results_dir: str,
+    workers: int = 1,
+    keys: list[tuple] | None = None,
+    dry_run: bool = False,
+    profile: str = "publication",
+    label_points: dict | None = None,
+) -> tuple[int, int]:
+    """
+    Iterates over (variable, year, cadre) groups (all, or only `keys`) and, for
+    each, calls `draw_map_plot`:
+      1. Digitizes the values
+      2. Prepares the color mapper & ticks
+      3. Calls `plot_map_figure(...)` to get a Figure and encodes it
+    and then saves the figure to disk, overlapping with the drawing of the next
+    one. With `workers > 1` the groups are rendered on a process pool.
+    `profile` names the output format in PROFILES; `label_points` places the
+    state labels (see `build_map_template`).
+    Returns the number of planned and of (re)drawn figures.
+    """
+    output = PROFILES[profile]
+
+    vmin, vmax = 0, 7
+    # (We can reuse the same mapper for all, since vmin/vmax don't change)
+    mapper = prepare_color_mapper(vmin=vmin, vmax=vmax)
+
+    cube = DeficitCube.from_series(cleaned)
+    by = MAP_BY
+    plan_kwargs = dict(
+        varname_mapping=varname_mapping,
+        cadre_label_mapping=cadre_label_mapping,
+        state_abbr=state_abbr,
+        vmin=vmin,
+        vmax=vmax,
+        results_dir=results_dir,
+        profile=output,
+    )
+    style = manifest.source_digest(
+        plot_map_figure,
+        build_map_template,
+        prepare_color_mapper,
+        extra=(output.dpi, matplotlib.__version__, version("cartopy")),
     )
+    if keys is None:
+        keys = select_group_keys(cube, by, varname_mapping)
+    return run_incremental(
+        cube,
+        by,
+        keys,
+        plan_map_plot,
+        dict(
+            plan_kwargs,
+            geometry=manifest.geometry_digest(state_geoms),
+            style=style,
+        ),
+        draw_map_plot,
+        dict(
+            plan_kwargs,
+            state_geoms=state_geoms,
+            label_points=label_points,
+            mapper=mapper,
+        ),
+        results_dir,
+        workers=workers,
+        dry_run=dry_run,
+        profile=output,
+        kind="maps",
+    )
+
+
+# -------------------------------------------------------------------
+# JOB PLANNER AND COMMAND LINE
+# -------------------------------------------------------------------
+
+EXCEL_FILE = "Documents/14_07_22_VW_AAAQ_mastersheet__26_NOV_23.xlsx"
+SHAPEFILE_PATH = "Documents/maps-master/States/Admin2"
+RESULTS_DIR = "Results/raw-value-based"
+PROJ_YEAR = 2011
+KINDS = ("lines", "maps")
+# Rough single-core cost of drawing and saving one figure, in seconds
+EST_SECONDS_PER_FIGURE = {
+    "publication": {"lines": 0.35, "maps": 0.5},
+    "preview": {"lines": 0.15, "maps": 0.3},
+}
+
+
+def filter_keys(keys: list[tuple], by: list, filters: dict) -> list[tuple]:
+    """
+    Keeps the keys whose level values match every filter on a level in `by`.
+    `filters` maps a level name to a list of values; strings are matched
+    case-insensitively as fnmatch patterns. Pure: no I/O.
+    """
+    active = {
+        by.index(level): values
+        for level, values in filters.items()
+        if values and level in by
+    }
+
+    def matches(value, patterns) -> bool:
+        if isinstance(value, str):
+            return any(fnmatch(value.lower(), str(p).lower()) for p in patterns)
+        return value in patterns
+
+    return [
+        key
+        for key in keys
+        if all(matches(key[pos], values) for pos, values in active.items())
+    ]
+
+
+def plan_jobs(
+    cube: DeficitCube,
+    varname_mapping: dict,
+    kinds: tuple = KINDS,
+    variables: list[str] | None = None,
+    states: list[str] | None = None,
+    cadres: list[str] | None = None,
+    years: list[int] | None = None,
+) -> dict[str, list[tuple]]:
+    """
+    Returns the explicit job plan {kind: [group keys]}. Line plots are narrowed
+    by variable and state; maps by variable, year and cadre (a map always shows
+    every state).
+    """
+    filters = {
+        "variable": variables,
+        "states": states,
+        "cadres": cadres,
+        "year": years,
+    }
+    plan = {}
+    if "lines" in kinds:
+        keys = select_group_keys(cube, LINE_BY, varname_mapping)
+        plan["lines"] = filter_keys(keys, LINE_BY, filters)
+    if "maps" in kinds:
+        keys = select_group_keys(cube, MAP_BY, varname_mapping)
+        plan["maps"] = filter_keys(keys, MAP_BY, filters)
+    return plan
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Render AAAQ deficit line plots and maps into the Results tree."
+    )
+    parser.add_argument("--excel-file", default=EXCEL_FILE)
+    parser.add_argument("--shapefile", default=SHAPEFILE_PATH)
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--proj-year", type=int, default=PROJ_YEAR)
+    parser.add_argument("--workers", type=int, default=os.process_cpu_count() or 1)
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        default="publication",
+        help="output format: per-figure PDFs, low-dpi previews or one PDF per variable",
+    )
+    parser.add_argument(
+        "--projection",
+        choices=["mastersheet", *SCENARIOS],
+        default="mastersheet",
+        help="draw the mastersheet projections or re-extrapolate the observed years",
+    )
+    parser.add_argument(
+        "--district-file",
+        help="district table to plot per district instead of the mastersheet states",
+    )
+    parser.add_argument(
+        "--uncertainty",
+        action="store_true",
+        help="shade Monte Carlo percentile bands on the line plots",
+    )
+    parser.add_argument(
+        "--draws",
+        type=int,
+        default=DRAWS,
+        help="Monte Carlo draws of the uncertainty bands",
+    )
+    parser.add_argument("--kind", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument(
+        "--variable", nargs="+", help="variable names or patterns, e.g. 'AvD_HLEG'"
+    )
+    parser.add_argument("--state", nargs="+", help="state names or patterns")
+    parser.add_argument("--cadre", nargs="+", help="cadres to map, e.g. doctor")
+    parser.add_argument("--year", nargs="+", type=int, help="years to map")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the job plan and estimated cost without drawing",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="after the first run, re-render changed figures whenever the source is saved",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="seconds between checks of the source file in watch mode",
+    )
+    return parser
+
+
+def load_plot_data(args: argparse.Namespace) -> tuple[pd.Series, DeficitCube]:
+    """
+    Loads the cleaned series of the command line's source (mastersheet or
+    district table) and its cube, projected when --projection asks for it.
+    """
+    if args.district_file:
+        from districts import clean_district_data, load_district_table
+
+        cleaned = clean_district_data(load_district_table(args.district_file))
+    else:
+        cleaned = load_cleaned(args.excel_file)
+    cube = DeficitCube.from_series(cleaned)
+    if args.projection != "mastersheet":
+        cube = project(cube, args.projection)
+        cleaned = cube.to_series()
+    return cleaned, cube
+
+
+def load_map_geometries(args: argparse.Namespace) -> tuple[dict, dict, dict | None]:
+    """
+    Returns the map geometries, their labels and the label positions for the
+    command line's source.
+    """
+    from geometry import open_geometry_store
+
+    store = open_geometry_store(args.shapefile)
+    if args.district_file:
+        from districts import (
+            DistrictIndex,
+            load_district_geometries,
+            misassigned_districts,
+        )
+
+        district_geoms = load_district_geometries(args.shapefile)
+        index = DistrictIndex(district_geoms)
+        wrong = misassigned_districts(index, store.geometries("full"))
+        if wrong:
+            shown = ", ".join(f"{key} (in {state})" for key, state in wrong[:5])
+            print(
+                f"warning: {len(wrong)} districts lie in another state than "
+                f"their name says: {shown}" + (", ..." if len(wrong) > 5 else ""),
+                file=sys.stderr,
+            )
+        # districts are too small to label
+        return district_geoms, {}, None
+    return store.geometries("full"), c.STATE_ABBR, store.centroids
+
+
+def match_map_districts(cleaned: pd.Series, district_geoms: dict) -> pd.Series:
+    """
+    Renames the districts of `cleaned` to the geometry keys they match (see
+    `districts.match_districts`). Districts without a geometry are dropped
+    with a warning, so the maps show the others.
+    """
+    from districts import match_districts
+
+    keys = cleaned.index.unique("states").drop("india", errors="ignore")
+    matched, unmatched = match_districts(keys, district_geoms)
+    if unmatched:
+        shown = ", ".join(unmatched[:5]) + (", ..." if len(unmatched) > 5 else "")
+        print(
+            f"warning: {len(unmatched)} districts have no geometry and are "
+            f"left off the maps: {shown}",
+            file=sys.stderr,
+        )
+        cleaned = cleaned.drop(unmatched, level="states")
+    return cleaned.rename(index=matched, level="states")
+
 
-    # Generate map plots
-    generate_map_plots(
-        cleaned=cleaned_stacked,
-        state_geoms=state_geometries,
-        varname_mapping=c.VARNAME_MAPPING,
-        cadre_label_mapping=c.CADRE_LABEL_MAPPING,
-        state_abbr=c.STATE_ABBR,
-        results_dir=RESULTS_DIR,
+def plan_args_jobs(cube: DeficitCube, args: argparse.Namespace) -> dict:
+    return plan_jobs(
+        cube,
+        c.VARNAME_MAPPING,
+        kinds=tuple(args.kind),
+        variables=args.variable,
+        states=args.state,
+        cadres=args.cadre,
+        years=args.year,
     )
+
+
+def uncertainty_spec(args: argparse.Namespace) -> "Uncertainty | None":
+    if not args.uncertainty:
+        return None
+    from uncertainty import Uncertainty
+
+    return Uncertainty()
+
+
+def render_jobs(
+    args: argparse.Namespace,
+    cleaned: pd.Series,
+    jobs: dict,
+    geometries: tuple[dict, dict, dict | None] | None,
+    workers: int,
+) -> dict[str, tuple[int, int]]:
+    """
+    Runs the line and map jobs of a plan. Returns {kind: (planned, drawn)}.
+    """
+    counts = {}
+    if "lines" in jobs:
+        counts["lines"] = generate_line_plots(
+            cleaned=cleaned,
+            varname_mapping=c.VARNAME_MAPPING,
+            cadre_label_mapping=c.CADRE_LABEL_MAPPING,
+            cadres_of_interest=c.CADRES_OF_INTEREST,
+            proj_year=args.proj_year,
+            results_dir=args.results_dir,
+            workers=workers,
+            keys=jobs["lines"],
+            dry_run=args.dry_run,
+            profile=args.profile,
+            uncertainty=uncertainty_spec(args),
+            draws=args.draws,
+        )
+
+    if "maps" in jobs:
+        state_geoms, state_abbr, label_points = geometries or load_map_geometries(args)
+        if args.district_file:
+            cleaned = match_map_districts(cleaned, state_geoms)
+        counts["maps"] = generate_map_plots(
+            cleaned=cleaned,
+            state_geoms=state_geoms,
+            varname_mapping=c.VARNAME_MAPPING,
+            cadre_label_mapping=c.CADRE_LABEL_MAPPING,
+            state_abbr=state_abbr,
+            results_dir=args.results_dir,
+            workers=workers,
+            keys=jobs["maps"],
+            dry_run=args.dry_run,
+            profile=args.profile,
+            label_points=label_points,
+        )
+    return counts
+
+
+# -------------------------------------------------------------------
+# WATCH MODE
+# -------------------------------------------------------------------
+
+# Below this many changed figures a watch cycle draws in this process, where
+# the map template stays built, instead of starting a worker pool
+WATCH_POOL_MIN_FIGURES = 40
+
+
+def source_signature(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def wait_for_change(path: str, signature, poll_interval: float) -> tuple[int, int]:
+    """
+    Polls `path` until its (mtime, size) differs from `signature` and then
+    holds still for one more poll, so a file that is being saved is only read
+    once complete. Returns the new signature.
+    """
+    while True:
+        time.sleep(poll_interval)
+        current = source_signature(path)
+        if current is None or current == signature:
+            continue
+        time.sleep(poll_interval)
+        if source_signature(path) == current:
+            return current
+
+
+def changed_jobs(
+    old: DeficitCube, new: DeficitCube, jobs: dict, bundle: bool
+) -> dict[str, list[tuple]]:
+    """
+    Narrows a job plan of `new` to the figures whose values differ from `old`.
+    A bundle holds every figure of a variable, so with `bundle` a changed
+    figure keeps all the figures of its variable. Pure: no I/O.
+    """
+    narrowed = {}
+    for kind, keys in jobs.items():
+        by = LINE_BY if kind == "lines" else MAP_BY
+        changed = set(changed_keys(old, new, by))
+        if bundle:
+            var_pos = by.index("variable")
+            variables = {key[var_pos] for key in changed}
+            narrowed[kind] = [key for key in keys if key[var_pos] in variables]
+        else:
+            narrowed[kind] = [key for key in keys if key in changed]
+    return narrowed
+
+
+def watch(
+    args: argparse.Namespace,
+    cube: DeficitCube,
+    geometries: tuple[dict, dict, dict | None] | None,
+) -> None:
+    """
+    Re-renders the figures whose values changed every time the source file is
+    saved, until interrupted. The resident cube is the baseline of the next
+    diff; the geometries and the map template stay loaded between saves. The
+    manifest still skips figures whose fingerprint did not change (e.g. map
+    values that stay in the same bucket).
+    """
+    path = args.district_file or args.excel_file
+    bundle = PROFILES[args.profile].bundle
+    signature = source_signature(path)
+    print(f"watching {path} (Ctrl-C to stop)", file=sys.stderr)
+    while True:
+        signature = wait_for_change(path, signature, args.poll_interval)
+        start = time.perf_counter()
+        try:
+            cleaned, new_cube = load_plot_data(args)
+        except Exception as e:
+            print(
+                f"could not load {path}: {e!r}; waiting for the next save",
+                file=sys.stderr,
+            )
+            continue
+        jobs = changed_jobs(cube, new_cube, plan_args_jobs(new_cube, args), bundle)
+        n_jobs = sum(len(keys) for keys in jobs.values())
+        workers = args.workers if n_jobs >= WATCH_POOL_MIN_FIGURES else 1
+        with span("watch cycle", figures=n_jobs):
+            counts = render_jobs(args, cleaned, jobs, geometries, workers)
+        cube = new_cube
+        drawn = sum(stale for _, stale in counts.values())
+        print(
+            f"{n_jobs} figures with changed values, {drawn} redrawn "
+            f"in {time.perf_counter() - start:.1f} s",
+            file=sys.stderr,
+        )
+        tracing.write(summary=False)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = build_arg_parser().parse_args(argv)
+
+    # Load and preprocess data
+    cleaned_stacked, cube = load_plot_data(args)
+    jobs = plan_args_jobs(cube, args)
+    # kept resident in watch mode
+    geometries = load_map_geometries(args) if "maps" in jobs else None
+    counts = render_jobs(args, cleaned_stacked, jobs, geometries, args.workers)
+
+    if args.dry_run:
+        total = 0.0
+        for kind, (planned, stale) in counts.items():
+            tier = "preview" if args.profile.startswith("preview") else "publication"
+            seconds = stale * EST_SECONDS_PER_FIGURE[tier][kind]
+            total += seconds
+            print(f"{kind}: {planned} jobs, {stale} to draw, ~{seconds:.0f} s")
+        workers = max(args.workers, 1)
+        print(f"estimated ~{total / workers:.0f} s on {workers} worker(s)")
+    elif args.watch:
+        try:
+            watch(args, cube, geometries)
+        except KeyboardInterrupt:
+            pass
+
+    # Set AAAQ_TRACE=trace.json to record stage spans
+    tracing.write()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+Offline benchmark suite for the AAAQ pipeline.
+
+Generates synthetic mastersheets in the column grammar `clean_data` parses
+(`AvD_<norm>_<year>`, `AvD_male_<norm>_<year>`, `ApD_cadre_mix_<norm>_<year>`,
+`ApD_sex_mix_<year>`, `AsD_<year>`, `QD_<year>`, plus hidden and decadal-change
+columns) and a matching synthetic shapefile, then times each pipeline stage and
+records its peak traced memory.
+
+A scale of k multiplies the number of states, cadres, norms and years by k**(1/4)
+each, so the sheet holds roughly k times the cells of the real one. With
+--grow states only the rows grow, k times the states, which is what a district
+table does to the pipeline (20x gives 720, about the number of districts).
+
+Usage:
+    python benchmark.py --scales 1 10 100 --output bench_results.json
+    python benchmark.py --grow states --scales 1 5 20
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import shapefile
+import shapely
+from openpyxl.utils import get_column_letter
+
+import constants as c
+import utils
+from compact import CompactSeries
+from cube import LINE_BY, MAP_BY, DeficitCube
+
+# Dimensions of the real mastersheet (states incl. india/goa/daman & diu)
+BASE_STATES = 36
+BASE_CADRES = 10
+BASE_NORMS = 7
+BASE_YEARS = 6
+
+# ST_NM values `load_state_geometries` renames or merges
+SPECIAL_SHAPES = [
+    "Delhi",
+    "Andaman & Nicobar",
+    "Dadra and Nagar Haveli and Daman and Diu",
+    "Jammu & Kashmir",
+    "Ladakh",
+    "Andhra Pradesh",
+    "Telangana",
+]
+
+
+# -------------------------------------------------------------------
+# SYNTHETIC INPUTS
+# -------------------------------------------------------------------
+
+
+def synthetic_dimensions(scale: float, grow: str = "all") -> dict[str, int]:
+    """
+    Returns the number of states, cadres, norms and years for a scale factor,
+    growing all four or only the states (`grow`). Pure: no I/O.
+    """
+    if grow == "states":
+        return {
+            "states": math.ceil(BASE_STATES * scale),
+            "cadres": BASE_CADRES,
+            "norms": BASE_NORMS,
+            "years": BASE_YEARS,
+        }
+    factor = scale**0.25
+    return {
+        "states": math.ceil(BASE_STATES * factor),
+        "cadres": math.ceil(BASE_CADRES * factor),
+        "norms": math.ceil(BASE_NORMS * factor),
+        "years": math.ceil(BASE_YEARS * factor),
+    }
+
+
+def synthetic_labels(dims: dict[str, int]) -> dict[str, list]:
+    """
+    Returns state, cadre, norm and year labels. Real names come first so the
+    synthetic data exercises the same special cases as the mastersheet.
+    Pure: no I/O.
+    """
+    real_states = ["India", "Goa", "Daman & Diu"] + [
+        s.title() for s in c.STATE_ABBR if s not in ("goa", "daman and diu")
+    ]
+    states = (real_states + [f"State {i:05d}" for i in range(dims["states"])])[
+        : max(dims["states"], 3)
+    ]
+    real_cadres = ["all cadres", "nursing cadres", "supporting cadres"] + list(
+        c.CADRES_OF_INTEREST
+    )
+    cadres = (real_cadres + [f"cadre {i:04d}" for i in range(dims["cadres"])])[
+        : dims["cadres"]
+    ]
+    real_norms = ["Bhore", "HLEG", "IHME_UHC80", "IHME_UHC90", "IPHS", "MDG", "SDG"]
+    norms = (real_norms + [f"N{i:03d}" for i in range(dims["norms"])])[: dims["norms"]]
+    years = [1981 + 10 * i for i in range(dims["years"])]
+    return {"states": states, "cadres": cadres, "norms": norms, "years": years}
+
+
+def synthetic_columns(labels: dict[str, list]) -> list[str]:
+    """
+    Returns the value column names in the mastersheet grammar. Pure: no I/O.
+    """
+    columns = []
+    for year in labels["years"]:
+        for norm in labels["norms"]:
+            columns += [f"AvD_{norm}_{year}", f"AvD_male_{norm}_{year}"]
+            columns.append(f"ApD_cadre_mix_{norm}_{year}")
+        columns += [f"ApD_sex_mix_{year}", f"AsD_{year}", f"QD_{year}"]
+    return columns
+
+
+def make_synthetic_mastersheet(
+    path: str, scale: float, seed: int = 0, grow: str = "all"
+) -> dict:
+    """
+    Writes a synthetic mastersheet with roughly `scale` times the cells of the
+    real one, including a hidden column, CHANGE_COLS and error cells.
+    Returns the dimensions used.
+    """
+    dims = synthetic_dimensions(scale, grow)
+    labels = synthetic_labels(dims)
+    value_cols = synthetic_columns(labels)
+    header = ["states", "cadres", *value_cols, "hidden_helper", c.CHANGE_COLS[0]]
+
+    rng = np.random.default_rng(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(c.MASTERSHEET)
+    ws.column_dimensions[get_column_letter(len(header) - 1)].hidden = True
+    ws.append(header)
+    for state in labels["states"]:
+        values = rng.uniform(-1.5, 1.5, size=(len(labels["cadres"]), len(value_cols)))
+        errors = rng.random(values.shape) < 0.02
+        for cadre, row, err in zip(labels["cadres"], values.tolist(), errors):
+            row = ["#DIV/0!" if e else v for v, e in zip(row, err)]
+            ws.append([state, cadre, *row, 0.0, 0.0])
+    wb.save(path)
+    return dims
+
+
+def make_synthetic_shapefile(path: str, states: list[str], vertices: int = 256):
+    """
+    Writes a shapefile with one circular polygon per state (plus the shapes
+    `load_state_geometries` merges), each with about `vertices` vertices.
+    """
+    names = SPECIAL_SHAPES + [
+        s for s in states if s.lower() not in ("india", "n.c.t. of delhi")
+    ]
+    side = math.ceil(math.sqrt(len(names)))
+    with shapefile.Writer(path, shapeType=shapefile.POLYGON) as w:
+        w.field("ST_NM", "C", size=64)
+        for i, name in enumerate(names):
+            x, y = 67 + 31 * (i % side) / side, 6 + 32 * (i // side) / side
+            poly = shapely.Point(x, y).buffer(12 / side, quad_segs=vertices // 4)
+            w.poly([list(poly.exterior.coords)])
+            w.record(name)
+
+
+# -------------------------------------------------------------------
+# MEASUREMENT
+# -------------------------------------------------------------------
+
+
+def measure(stages: list, name: str, fn, *args, memory: bool = True, **kwargs):
+    """
+    Runs `fn(*args, **kwargs)`, appends {stage, seconds, peak_mib} to `stages`
+    and returns the result. Peak memory comes from a second, traced run so that
+    tracemalloc overhead does not leak into the timing.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    peak_mib = None
+    if memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = fn(*args, **kwargs)
+        peak_mib = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    stages.append({"stage": name, "seconds": seconds, "peak_mib": peak_mib})
+    print(
+        f"  {name:<28}{seconds:>10.4f} s"
+        + (f"{peak_mib:>10.1f} MiB" if peak_mib is not None else ""),
+        file=sys.stderr,
+    )
+    return result
+
+
+def _sample_queries(keys: list, n: int, seed: int = 0) -> list:
+    return random.Random(seed).choices(keys, k=n)
+
+
+def query_groupby(groups, keys: list) -> None:
+    for key in keys:
+        groups.get_group(key)
+
+
+def query_cube(cube: DeficitCube | CompactSeries, by: list, keys: list) -> None:
+    for key in keys:
+        cube.group(by, key)
+
+
+def query_cube_view(cube: DeficitCube, by: list, keys: list) -> None:
+    view = cube.by_state_var if by == LINE_BY else cube.by_var_year_cadre
+    for key in keys:
+        view(*key)
+
+
+def draw_line_figures(cube: DeficitCube, n: int) -> None:
+    import matplotlib.pyplot as plt
+
+    import AAAQ_plots_script as plots
+
+    cadre_colors = {k: f"C{i % 10}" for i, k in enumerate(cube.cadres)}
+    varname_mapping = {v: c.VARNAME_MAPPING.get(v, v) for v in cube.variables}
+    for state, varname in cube.group_keys(LINE_BY)[:n]:
+        group = cube.line_group(state, varname)
+        fig = plots.plot_line_figure(
+            frame=group,
+            state=state,
+            varname=varname,
+            varname_mapping=varname_mapping,
+            cadre_label_mapping=c.CADRE_LABEL_MAPPING,
+            cadre_colors=cadre_colors,
+            proj_year=c.PROJECTION_YEAR,
+        )
+        plt.close(fig)
+
+
+def draw_map_figures(cube: DeficitCube, state_geoms: dict, n: int) -> None:
+    import AAAQ_plots_script as plots
+
+    state_abbr = {s: s[:2].upper() for s in state_geoms}
+    varname_mapping = {v: c.VARNAME_MAPPING.get(v, v) for v in cube.variables}
+    mapper = plots.prepare_color_mapper()
+    for varname, year, cadre in cube.group_keys(MAP_BY)[:n]:
+        group = cube.map_group(varname, year, cadre)
+        group = group[group.index.get_level_values("states").isin(state_geoms)]
+        digitized, a_step, base = plots.digitize_values_for_map(varname, group)
+        plots.plot_map_figure(
+            state_geoms=state_geoms,
+            digitized_series=digitized,
+            varname=varname,
+            year=year,
+            cadre=cadre,
+            cadre_label_mapping=c.CADRE_LABEL_MAPPING,
+            varname_mapping=varname_mapping,
+            state_abbr=state_abbr,
+            mapper=mapper,
+            a_step=a_step,
+            base=base,
+            vmin=0,
+            vmax=7,
+        )
+
+
+def run_benchmark(
+    scale: float,
+    work_dir: str,
+    n_queries: int = 1000,
+    n_figures: int = 5,
+    memory: bool = True,
+    grow: str = "all",
+) -> dict:
+    """
+    Generates the synthetic inputs for one scale and measures every stage.
+    """
+    print(f"scale {scale}x ({grow})", file=sys.stderr)
+    excel_file = os.path.join(work_dir, f"mastersheet_{grow}_{scale}x.xlsx")
+    shapefile_path = os.path.join(work_dir, f"Admin2_{grow}_{scale}x")
+    dims = make_synthetic_mastersheet(excel_file, scale, grow=grow)
+    labels = synthetic_labels(dims)
+    make_synthetic_shapefile(shapefile_path, labels["states"])
+
+    stages: list[dict] = []
+    kw = dict(memory=memory)
+    raw = measure(stages, "load_raw_data", utils.load_raw_data, excel_file, **kw)
+    cleaned = measure(stages, "clean_data", utils.clean_data, raw, **kw)
+    cube = measure(stages, "cube_from_series", DeficitCube.from_series, cleaned, **kw)
+    # float32 like the cube, so the layouts compare on equal terms
+    compact = measure(
+        stages,
+        "compact_from_series",
+        CompactSeries.from_series,
+        cleaned,
+        dtype=np.float32,
+        **kw,
+    )
+    state_geoms = measure(
+        stages,
+        "load_state_geometries",
+        utils.load_state_geometries,
+        shapefile_path,
+        **kw,
+    )
+
+    for name, by in (("line", LINE_BY), ("map", MAP_BY)):
+        keys = _sample_queries(cube.group_keys(by), n_queries)
+        groups = cleaned.groupby(by)
+        measure(stages, f"{name}_query_groupby", query_groupby, groups, keys, **kw)
+        measure(stages, f"{name}_query_cube", query_cube, cube, by, keys, **kw)
+        measure(stages, f"{name}_query_view", query_cube_view, cube, by, keys, **kw)
+        measure(stages, f"{name}_query_compact", query_cube, compact, by, keys, **kw)
+
+    measure(stages, "plot_line_figure", draw_line_figures, cube, n_figures, **kw)
+    measure(
+        stages, "plot_map_figure", draw_map_figures, cube, state_geoms, n_figures, **kw
+    )
+
+    return {
+        "scale": scale,
+        "grow": grow,
+        "dimensions": dims,
+        "rows": int(raw.shape[0]),
+        "columns": int(raw.shape[1]),
+        "values": int(len(cleaned)),
+        "queries": n_queries,
+        "figures": n_figures,
+        "stages": stages,
+        "layout_bytes": {
+            "series": int(cleaned.memory_usage(deep=True)),
+            "cube": cube.nbytes,
+            "compact": compact.nbytes,
+        },
+    }
+
+
+def environment() -> dict:
+    """
+    Returns the metadata stored alongside the results.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "openpyxl": openpyxl.__version__,
+        "shapely": shapely.__version__,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--figures", type=int, default=5)
+    parser.add_argument(
+        "--grow",
+        choices=["all", "states"],
+        default="all",
+        help="grow every dimension by scale**0.25, or the states by scale",
+    )
+    parser.add_argument("--no-memory", action="store_true", help="skip traced runs")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--work-dir", help="keep the synthetic inputs here")
+    args = parser.parse_args(argv)
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        runs = [
+            run_benchmark(
+                scale,
+                work_dir,
+                args.queries,
+                args.figures,
+                not args.no_memory,
+                args.grow,
+            )
+            for scale in args.scales
+        ]
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "runs": runs}, f, indent=2)
+    print(f"wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
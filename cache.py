@@ -0,0 +1,238 @@
+"""
+Content-addressed on-disk cache of the cleaned deficit series.
+
+Entries are keyed by a hash of the mastersheet bytes plus the cleaning-code
+version, and stored as an uncompressed `.npz` holding the index level labels,
+the integer codes of every index level and the float values, so loading one
+back is a handful of array reads instead of an xlsx parse and `clean_data`.
+
+Usage:
+    python cache.py warm [EXCEL_FILE ...]
+    python cache.py clear
+    python cache.py info
+"""
+
+import argparse
+import hashlib
+import inspect
+import os
+from importlib.metadata import version
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import constants as c
+import utils
+from tracing import traced
+
+EXCEL_FILE = "Documents/14_07_22_VW_AAAQ_mastersheet__26_NOV_23.xlsx"
+CACHE_DIR = ".cache/cleaned"
+# Bump when the on-disk layout changes; source edits of the loaders are
+# picked up automatically through `cleaning_version`.
+CACHE_FORMAT = 1
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def cleaning_version() -> str:
+    """
+    Returns a short hash of everything that determines the cleaned series
+    besides the workbook itself: the loader/cleaner source and its parsing
+    helpers, the openpyxl version they hook into and the dropped columns.
+    The version is read from the package metadata so a cache hit does not
+    import openpyxl.
+    """
+    h = hashlib.sha256(f"format={CACHE_FORMAT}".encode())
+    for obj in (
+        utils.load_raw_data,
+        utils.clean_data,
+        utils._streaming_sheet_parser,
+        utils._hidden_columns,
+        utils._header_names,
+        utils._has_parser_hooks,
+        utils._read_rows_public,
+    ):
+        h.update(inspect.getsource(obj).encode())
+    h.update(f"openpyxl={version('openpyxl')}".encode())
+    h.update(repr((c.MASTERSHEET, c.CHANGE_COLS)).encode())
+    return h.hexdigest()[:16]
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Returns the sha256 hex digest of the file contents.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(excel_file: str) -> str:
+    """
+    Returns the cache key for a mastersheet: content hash + cleaning version.
+    """
+    return f"{file_digest(excel_file)[:32]}-{cleaning_version()}"
+
+
+def get_cache_path(cache_dir: str, key: str) -> str:
+    """
+    Constructs the path of a cache entry, e.g. {cache_dir}/{key}.npz
+    Pure: just returns a string, does not create directories.
+    """
+    return os.path.join(cache_dir, f"{key}.npz")
+
+
+def cast_multiindex(index: pd.Index) -> pd.MultiIndex:
+    """
+    Returns `index` as a MultiIndex (a flat index becomes a single level).
+    """
+    if isinstance(index, pd.MultiIndex):
+        return index
+    return pd.MultiIndex.from_arrays([index], names=[index.name])
+
+
+def save_series(path: str, series: pd.Series) -> None:
+    """
+    Writes the cleaned series to `path` atomically as level labels, level codes
+    and values.
+    """
+    index = cast_multiindex(series.index)
+    arrays = {"values": series.to_numpy(dtype=float)}
+    for i, (level, codes) in enumerate(zip(index.levels, index.codes)):
+        labels = level.to_numpy()
+        if labels.dtype == object:
+            labels = labels.astype(str)
+        arrays[f"level_{i}"] = labels
+        arrays[f"codes_{i}"] = np.asarray(codes)
+    arrays["names"] = np.array(index.names, dtype=str)
+    arrays["series_name"] = np.array([series.name], dtype=str)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_series(path: str) -> pd.Series:
+    """
+    Reads a series written by `save_series`.
+    """
+    with np.load(path, allow_pickle=False) as npz:
+        names = npz["names"].tolist()
+        levels = [npz[f"level_{i}"] for i in range(len(names))]
+        codes = [npz[f"codes_{i}"] for i in range(len(names))]
+        index = pd.MultiIndex(
+            levels=levels, codes=codes, names=names, verify_integrity=False
+        )
+        return pd.Series(npz["values"], index=index, name=str(npz["series_name"][0]))
+
+
+def evict(cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES) -> list[str]:
+    """
+    Removes least recently used entries until the cache fits in `max_bytes`.
+    The most recent entry is always kept. Returns the removed paths.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            path = os.path.join(cache_dir, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+    entries.sort(reverse=True)
+
+    removed, total = [], 0
+    for i, (_, size, path) in enumerate(entries):
+        total += size
+        if i > 0 and total > max_bytes:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def clear(cache_dir: str = CACHE_DIR) -> int:
+    """
+    Removes every cache entry. Returns the number of removed entries.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    count = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith((".npz", ".tmp")):
+            os.remove(os.path.join(cache_dir, name))
+            count += 1
+    return count
+
+
+def invalidate(excel_file: str, cache_dir: str = CACHE_DIR) -> bool:
+    """
+    Drops the entry of the current version of `excel_file`, if any.
+    """
+    path = get_cache_path(cache_dir, cache_key(excel_file))
+    if os.path.exists(path):
+        os.remove(path)
+        return True
+    return False
+
+
+@traced("load_cleaned")
+def load_cleaned(
+    excel_file: str,
+    cache_dir: str = CACHE_DIR,
+    max_bytes: int = MAX_CACHE_BYTES,
+) -> pd.Series:
+    """
+    Returns `clean_data(load_raw_data(excel_file))`, served from the on-disk
+    cache when the workbook and the cleaning code are unchanged.
+    """
+    path = get_cache_path(cache_dir, cache_key(excel_file))
+    if os.path.exists(path):
+        try:
+            series = load_series(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"ignoring unreadable cache entry {path}: {e}", file=sys.stderr)
+        else:
+            os.utime(path)  # mark as recently used for eviction
+            return series
+
+    series = utils.clean_data(utils.load_raw_data(excel_file))
+    save_series(path, series)
+    evict(cache_dir, max_bytes)
+    return series
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm", help="load mastersheets into the cache")
+    warm.add_argument("excel_files", nargs="*", default=[EXCEL_FILE])
+    warm.add_argument("--max-bytes", type=int, default=MAX_CACHE_BYTES)
+    sub.add_parser("clear", help="remove all cache entries")
+    sub.add_parser("info", help="list cache entries")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        for excel_file in args.excel_files:
+            series = load_cleaned(excel_file, args.cache_dir, args.max_bytes)
+            print(f"{excel_file}: {len(series)} values")
+    elif args.command == "clear":
+        print(f"removed {clear(args.cache_dir)} entries")
+    elif args.command == "info":
+        if os.path.isdir(args.cache_dir):
+            for name in sorted(os.listdir(args.cache_dir)):
+                size = os.path.getsize(os.path.join(args.cache_dir, name))
+                print(f"{name}\t{size / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
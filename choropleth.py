@@ -0,0 +1,96 @@
+"""
+Folium choropleth over a TopoJSON file the browser fetches by URL.
+
+`folium.Choropleth` embeds the full geometry in the map script, so
+`st_folium` resends it on every rerun. `TopoChoropleth` embeds only the URL
+and a {state: colour} mapping; the browser downloads the geometry once and
+revalidates it from its HTTP cache afterwards. The decoder script
+(topojson_feature.js) is served by the app as well, so the map works without
+access to a CDN.
+"""
+
+import branca.colormap as cm
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from folium.elements import JSCSSMixin
+from folium.template import Template
+
+from topology import OBJECT_NAME
+
+NAN_COLOR = "black"
+
+
+class TopoChoropleth(JSCSSMixin, MacroElement):
+    """
+    Fills the features of the TopoJSON at `url` with `colors[feature.id]`,
+    using `nan_color` for features without a colour. Hovering a state
+    highlights it and shows `tooltips[feature.id]`. `script_url` is where the
+    app serves topojson_feature.js.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var colors = {{ this.colors|tojson }};
+            var tooltips = {{ this.tooltips|tojson }};
+            fetch({{ this.url|tojson }})
+                .then(function (r) { return r.json(); })
+                .then(function (topo) {
+                    var features = topojson.feature(topo, topo.objects[{{ this.object_name|tojson }}]);
+                    var layer = L.geoJson(features, {
+                        style: function (f) {
+                            return {
+                                fillColor: colors[f.id] || {{ this.nan_color|tojson }},
+                                fillOpacity: {{ this.fill_opacity }},
+                                color: "black",
+                                weight: 1,
+                                opacity: {{ this.line_opacity }},
+                            };
+                        },
+                        onEachFeature: function (f, l) {
+                            l.bindTooltip(tooltips[f.id] || f.id);
+                            l.on("mouseover", function () { l.setStyle({weight: 3, fillOpacity: 0.9}); });
+                            l.on("mouseout", function () { layer.resetStyle(l); });
+                        },
+                    });
+                    layer.addTo({{ this._parent.get_name() }});
+                });
+        })();
+        {% endmacro %}
+        """)
+
+    def __init__(
+        self,
+        url: str,
+        colors: dict,
+        script_url: str,
+        tooltips: dict | None = None,
+        fill_opacity: float = 0.7,
+        line_opacity: float = 0.2,
+        nan_color: str = NAN_COLOR,
+        object_name: str = OBJECT_NAME,
+    ):
+        super().__init__()
+        self._name = "TopoChoropleth"
+        self.default_js = [("topojson", script_url)]
+        self.url, self.colors = url, colors
+        self.tooltips = tooltips or {}
+        self.fill_opacity, self.line_opacity = fill_opacity, line_opacity
+        self.nan_color, self.object_name = nan_color, object_name
+
+
+def state_colors(values: pd.Series, caption: str = "Deficit"):
+    """
+    Maps {state: value} to {state: hex colour} on a six-step RdYlGn scale over
+    the value range, like the default `folium.Choropleth` binning. Returns the
+    colours and the colormap, for the legend.
+    """
+    finite = values[np.isfinite(values)]
+    vmin, vmax = (finite.min(), finite.max()) if len(finite) else (0.0, 1.0)
+    if vmin == vmax:
+        vmax = vmin + 1
+    colormap = cm.linear.RdYlGn_06.scale(vmin, vmax).to_step(6)
+    colormap.caption = caption
+    colors = {state: colormap(v) for state, v in finite.items()}
+    return colors, colormap
@@ -0,0 +1,233 @@
+"""
+Compact categorical layout of the cleaned deficit series.
+
+`CompactSeries` stores the (states, year, variable, cadres) series from
+`clean_data` as its values, the index level labels once, and small unsigned
+codes. Rows are kept in LINE_BY order with CSR-style offsets, so a
+line-plot group is a contiguous slice and the state and variable codes of a
+row follow from its group; only the year and cadre codes are stored per row.
+MAP_BY groups go through one precomputed permutation with its own offsets.
+Unlike `DeficitCube`, memory grows with the number of cells present rather
+than with the product of the axes.
+
+`to_series` rebuilds the source series with the same index, levels, row order
+and name. Values round-trip exactly with the float64 default; dtype=np.float32
+halves their memory and rounds them like the cube does.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cube import LINE_BY, MAP_BY, SERIES_LEVELS
+
+
+def _smallest_uint(n: int) -> np.dtype:
+    """
+    Smallest unsigned dtype holding 0..n-1. Pure: no I/O.
+    """
+    return np.min_scalar_type(max(n - 1, 0))
+
+
+def _offsets(keys: np.ndarray, n_groups: int, n_rows: int) -> np.ndarray:
+    """
+    Returns the (n_groups + 1) start offsets of sorted group `keys`.
+    Pure: no I/O.
+    """
+    counts = np.bincount(keys, minlength=n_groups)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return offsets.astype(_smallest_uint(n_rows + 1))
+
+
+class CompactSeries:
+    """
+    Integer-coded stand-in for the cleaned series with O(1) group slices. The
+    arrays are read-only.
+    """
+
+    def __init__(
+        self,
+        levels: list[pd.Index],
+        line_offsets: np.ndarray,
+        year_codes: np.ndarray,
+        cadre_codes: np.ndarray,
+        values: np.ndarray,
+        name=None,
+        dtype=np.float64,
+        source_order: np.ndarray | None = None,
+    ):
+        self.levels = levels  # in SERIES_LEVELS order, as in the source index
+        # rows are grouped by (state, variable); group g = state * n_variables
+        # + variable spans line_offsets[g]:line_offsets[g + 1]
+        self.line_offsets = line_offsets
+        self.year_codes, self.cadre_codes = year_codes, cadre_codes
+        self.values = values
+        self.name = name
+        self.dtype = dtype  # dtype of the source values
+        # storage row of every source row; None when the source was sorted
+        # by SERIES_LEVELS
+        self.source_order = source_order
+
+        self._pos = [{label: i for i, label in enumerate(lv)} for lv in levels]
+        n_s, n_y, n_v, n_k = (len(lv) for lv in levels)
+        _, v = np.divmod(self._row_groups(), n_v)
+        map_keys = (v * n_y + year_codes) * n_k + cadre_codes
+        self.map_order = np.argsort(map_keys, kind="stable").astype(
+            _smallest_uint(len(values))
+        )
+        self.map_offsets = _offsets(map_keys, n_v * n_y * n_k, len(values))
+        for array in self._arrays():
+            array.setflags(write=False)
+
+    @classmethod
+    def from_series(cls, series: pd.Series, dtype=np.float64) -> "CompactSeries":
+        """
+        Encodes a series indexed by (states, year, variable, cadres), keeping
+        every index level as is.
+        """
+        index = series.index
+        positions = [index.names.index(level) for level in SERIES_LEVELS]
+        levels = [index.levels[i] for i in positions]
+        s, y, v, k = (np.asarray(index.codes[i], dtype=np.int64) for i in positions)
+        if any((codes < 0).any() for codes in (s, y, v, k)):
+            raise ValueError("the series index has missing labels")
+
+        n = len(series)
+        line_order = np.lexsort((k, y, v, s))
+        source_order = None
+        if not np.array_equal(np.lexsort((k, v, y, s)), np.arange(n)):
+            source_order = np.empty(n, dtype=_smallest_uint(n))
+            source_order[line_order] = np.arange(n)
+
+        groups = (s * len(levels[2]) + v)[line_order]
+        return cls(
+            levels,
+            _offsets(groups, len(levels[0]) * len(levels[2]), n),
+            y[line_order].astype(_smallest_uint(len(levels[1]))),
+            k[line_order].astype(_smallest_uint(len(levels[3]))),
+            series.to_numpy()[line_order].astype(dtype),
+            name=series.name,
+            dtype=series.dtype,
+            source_order=source_order,
+        )
+
+    def _arrays(self) -> list[np.ndarray]:
+        arrays = [self.line_offsets, self.year_codes, self.cadre_codes, self.values]
+        arrays += [self.map_order, self.map_offsets]
+        return arrays + ([] if self.source_order is None else [self.source_order])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self._arrays())
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _row_groups(self, rows=None) -> np.ndarray:
+        """
+        Returns the (state, variable) group of every storage row, or of `rows`.
+        """
+        counts = np.diff(self.line_offsets.astype(np.int64))
+        if rows is None:
+            return np.repeat(np.arange(len(counts)), counts)
+        return np.searchsorted(self.line_offsets, rows, side="right") - 1
+
+    def _codes(self, rows) -> list[np.ndarray]:
+        """
+        Returns the per-level codes (in SERIES_LEVELS order) of `rows`.
+        """
+        s, v = np.divmod(self._row_groups(rows), len(self.levels[2]))
+        return [s, self.year_codes[rows], v, self.cadre_codes[rows]]
+
+    def _labels(self, level: int) -> list:
+        if level in (0, 2):
+            groups = np.flatnonzero(np.diff(self.line_offsets.astype(np.int64)))
+            codes = np.divmod(groups, len(self.levels[2]))[level // 2]
+        else:
+            codes = self.year_codes if level == 1 else self.cadre_codes
+        return list(self.levels[level][np.unique(codes)])
+
+    @property
+    def states(self) -> list[str]:
+        return self._labels(0)
+
+    @property
+    def years(self) -> list[int]:
+        return [int(y) for y in self._labels(1)]
+
+    @property
+    def variables(self) -> list[str]:
+        return self._labels(2)
+
+    @property
+    def cadres(self) -> list[str]:
+        return self._labels(3)
+
+    # ---------------------------------------------------------------
+    # pandas views matching `cleaned.groupby(...).get_group(...)`
+    # ---------------------------------------------------------------
+
+    def _series(self, rows: np.ndarray) -> pd.Series:
+        index = pd.MultiIndex(
+            levels=self.levels,
+            codes=self._codes(rows),
+            names=SERIES_LEVELS,
+            verify_integrity=False,
+        )
+        return pd.Series(
+            self.values[rows].astype(self.dtype), index=index, name=self.name
+        )
+
+    def line_group(self, state: str, variable: str) -> pd.Series:
+        """
+        Returns the (state, variable) group as indexed by `clean_data`.
+        """
+        g = self._pos[0][state] * len(self.levels[2]) + self._pos[2][variable]
+        return self._series(np.arange(self.line_offsets[g], self.line_offsets[g + 1]))
+
+    def map_group(self, variable: str, year: int, cadre: str) -> pd.Series:
+        """
+        Returns the (variable, year, cadre) group as indexed by `clean_data`.
+        """
+        n_y, n_k = len(self.levels[1]), len(self.levels[3])
+        g = (self._pos[2][variable] * n_y + self._pos[1][year]) * n_k
+        g += self._pos[3][cadre]
+        start, end = self.map_offsets[g], self.map_offsets[g + 1]
+        return self._series(self.map_order[start:end])
+
+    def group(self, by: list, key: tuple) -> pd.Series:
+        """
+        `get_group` for the two groupings used by the plots: LINE_BY and MAP_BY.
+        """
+        if by == LINE_BY:
+            return self.line_group(*key)
+        if by == MAP_BY:
+            return self.map_group(*key)
+        raise ValueError(f"unsupported grouping {by}")
+
+    def group_keys(self, by: list) -> list[tuple]:
+        """
+        Returns the sorted keys of the non-empty groups of `by`.
+        """
+        states, years, variables, cadres = self.levels
+        if by == LINE_BY:
+            groups = np.flatnonzero(np.diff(self.line_offsets.astype(np.int64)))
+            s, v = np.divmod(groups, len(variables))
+            return sorted((states[i], variables[j]) for i, j in zip(s, v))
+        if by == MAP_BY:
+            groups = np.flatnonzero(np.diff(self.map_offsets.astype(np.int64)))
+            vy, k = np.divmod(groups, len(cadres))
+            v, y = np.divmod(vy, len(years))
+            keys = [
+                (variables[i], int(years[l]), cadres[j]) for i, l, j in zip(v, y, k)
+            ]
+            return sorted(keys)
+        raise ValueError(f"unsupported grouping {by}")
+
+    def to_series(self) -> pd.Series:
+        """
+        Returns the source series: same index, row order, dtype and name.
+        """
+        if self.source_order is None:
+            s, y, v, k = self._codes(np.arange(len(self)))
+            return self._series(np.lexsort((k, v, y, s)))
+        return self._series(self.source_order)
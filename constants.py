@@ -1,5 +1,8 @@
 # Constants
 
+# Sheet of the mastersheet workbook holding the raw-value based deficits
+MASTERSHEET = 'Mastersheet_raw_values_based_de'
+
 # Columns to drop from the raw data
 CHANGE_COLS = [
     'ApD_sex_mix_1981_1991_percent_decadal_change',
@@ -0,0 +1,251 @@
+"""
+Dense ndarray layout of the cleaned deficit series.
+
+`DeficitCube` stores the (states, year, variable, cadres) series from
+`clean_data` as a float32 array of shape states x variables x cadres x years
+with a label -> position lookup per axis. Missing cells are NaN; `present` is
+the boolean mask of cells that exist in the series. Line-plot and map slices
+are basic-indexing views, so looking one up is O(1) and copies nothing.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Index level order of the series produced by `clean_data`
+SERIES_LEVELS = ["states", "year", "variable", "cadres"]
+LINE_BY = ["states", "variable"]
+MAP_BY = ["variable", "year", "cadres"]
+
+
+class DeficitCube:
+    """
+    Dense states x variables x cadres x years cube with integer label lookups.
+    The arrays are read-only; build a new cube to change values.
+    """
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        states: list[str],
+        variables: list[str],
+        cadres: list[str],
+        years: list[int],
+        name=None,
+    ):
+        if data.shape != (len(states), len(variables), len(cadres), len(years)):
+            raise ValueError(f"data shape {data.shape} does not match the labels")
+        self.data = data
+        self.data.setflags(write=False)
+        self.present = ~np.isnan(data)
+        self.present.setflags(write=False)
+        self.states, self.variables = list(states), list(variables)
+        self.cadres, self.years = list(cadres), [int(y) for y in years]
+        self.name = name
+        self.state_pos = {s: i for i, s in enumerate(self.states)}
+        self.variable_pos = {v: i for i, v in enumerate(self.variables)}
+        self.cadre_pos = {k: i for i, k in enumerate(self.cadres)}
+        self.year_pos = {y: i for i, y in enumerate(self.years)}
+        # full label levels, so slices build their MultiIndex from codes alone
+        self._levels = [
+            pd.Index(self.states, dtype=object, name="states"),
+            pd.Index(self.years, name="year"),
+            pd.Index(self.variables, dtype=object, name="variable"),
+            pd.Index(self.cadres, dtype=object, name="cadres"),
+        ]
+
+    @classmethod
+    def from_series(cls, series: pd.Series, dtype=np.float32) -> "DeficitCube":
+        """
+        Builds the cube from a series indexed by (states, year, variable, cadres)
+        in a single vectorized scatter.
+        """
+        index = series.index
+        labels, codes = {}, {}
+        for level in SERIES_LEVELS:
+            values = index.get_level_values(level)
+            uniques = values.unique().sort_values()
+            labels[level] = uniques.tolist()
+            codes[level] = uniques.get_indexer(values)
+
+        shape = tuple(len(labels[k]) for k in ("states", "variable", "cadres", "year"))
+        data = np.full(shape, np.nan, dtype=dtype)
+        data[codes["states"], codes["variable"], codes["cadres"], codes["year"]] = (
+            series.to_numpy()
+        )
+        return cls(
+            data,
+            labels["states"],
+            labels["variable"],
+            labels["cadres"],
+            labels["year"],
+            name=series.name,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.present.nbytes
+
+    # ---------------------------------------------------------------
+    # zero-copy slices
+    # ---------------------------------------------------------------
+
+    def by_state_var(self, state: str, variable: str) -> np.ndarray:
+        """
+        Returns the (cadres, years) view of one state and variable.
+        """
+        return self.data[self.state_pos[state], self.variable_pos[variable]]
+
+    def by_var_year_cadre(self, variable: str, year: int, cadre: str) -> np.ndarray:
+        """
+        Returns the (states,) view of one variable, year and cadre.
+        """
+        return self.data[
+            :, self.variable_pos[variable], self.cadre_pos[cadre], self.year_pos[year]
+        ]
+
+    def mask_state_var(self, state: str, variable: str) -> np.ndarray:
+        """
+        Returns the (cadres, years) mask of cells present in the series.
+        """
+        return self.present[self.state_pos[state], self.variable_pos[variable]]
+
+    def mask_var_year_cadre(self, variable: str, year: int, cadre: str) -> np.ndarray:
+        """
+        Returns the (states,) mask of cells present in the series.
+        """
+        return self.present[
+            :, self.variable_pos[variable], self.cadre_pos[cadre], self.year_pos[year]
+        ]
+
+    # ---------------------------------------------------------------
+    # pandas views matching `cleaned.groupby(...).get_group(...)`
+    # ---------------------------------------------------------------
+
+    def line_group(self, state: str, variable: str) -> pd.Series:
+        """
+        Returns the (state, variable) group as indexed by `clean_data`.
+        """
+        values = self.by_state_var(state, variable).T  # (years, cadres)
+        years, cadres = np.nonzero(self.mask_state_var(state, variable).T)
+        codes = [
+            np.full(len(years), self.state_pos[state]),
+            years,
+            np.full(len(years), self.variable_pos[variable]),
+            cadres,
+        ]
+        return self._series(values[years, cadres], codes)
+
+    def map_group(self, variable: str, year: int, cadre: str) -> pd.Series:
+        """
+        Returns the (variable, year, cadre) group as indexed by `clean_data`.
+        """
+        values = self.by_var_year_cadre(variable, year, cadre)
+        (states,) = np.nonzero(self.mask_var_year_cadre(variable, year, cadre))
+        codes = [
+            states,
+            np.full(len(states), self.year_pos[year]),
+            np.full(len(states), self.variable_pos[variable]),
+            np.full(len(states), self.cadre_pos[cadre]),
+        ]
+        return self._series(values[states], codes)
+
+    def group(self, by: list, key: tuple) -> pd.Series:
+        """
+        `get_group` for the two groupings used by the plots: LINE_BY and MAP_BY.
+        """
+        if by == LINE_BY:
+            return self.line_group(*key)
+        if by == MAP_BY:
+            return self.map_group(*key)
+        raise ValueError(f"unsupported grouping {by}")
+
+    def group_keys(self, by: list) -> list[tuple]:
+        """
+        Returns the sorted keys of the non-empty groups of `by`.
+        """
+        if by == LINE_BY:
+            s, v = np.nonzero(self.present.any(axis=(2, 3)))
+            return [(self.states[i], self.variables[j]) for i, j in zip(s, v)]
+        if by == MAP_BY:
+            v, k, y = np.nonzero(self.present.any(axis=0))
+            keys = [
+                (self.variables[i], self.years[l], self.cadres[j])
+                for i, j, l in zip(v, k, y)
+            ]
+            return sorted(keys)
+        raise ValueError(f"unsupported grouping {by}")
+
+    def reindex(
+        self, states: list, variables: list, cadres: list, years: list
+    ) -> "DeficitCube":
+        """
+        Returns a cube over the given labels, with NaN for labels this cube
+        does not have. Labels missing from the arguments are dropped.
+        """
+        data = np.full(
+            (len(states), len(variables), len(cadres), len(years)),
+            np.nan,
+            dtype=self.data.dtype,
+        )
+        targets, sources = [], []
+        for lookup, labels in (
+            (self.state_pos, states),
+            (self.variable_pos, variables),
+            (self.cadre_pos, cadres),
+            (self.year_pos, years),
+        ):
+            pos = np.array([lookup.get(label, -1) for label in labels], dtype=np.int64)
+            targets.append(np.flatnonzero(pos >= 0))
+            sources.append(pos[pos >= 0])
+        data[np.ix_(*targets)] = self.data[np.ix_(*sources)]
+        return DeficitCube(data, states, variables, cadres, years, name=self.name)
+
+    def to_series(self) -> pd.Series:
+        """
+        Returns the cube as a series indexed like `clean_data` output.
+        """
+        s, v, k, y = np.nonzero(self.present)
+        series = self._series(self.data[s, v, k, y], [s, y, v, k])
+        return series.sort_index()
+
+    def _series(self, values: np.ndarray, codes: list) -> pd.Series:
+        """
+        Wraps float values and per-level codes (in SERIES_LEVELS order) into a
+        float64 series without re-factorizing any labels.
+        """
+        index = pd.MultiIndex(
+            levels=self._levels,
+            codes=codes,
+            names=SERIES_LEVELS,
+            verify_integrity=False,
+        )
+        return pd.Series(values.astype(float), index=index, name=self.name)
+
+
+def changed_keys(old: DeficitCube, new: DeficitCube, by: list) -> list[tuple]:
+    """
+    Returns the sorted keys of the `by` groups (LINE_BY or MAP_BY) of `new`
+    whose cells differ from `old`, counting cells added or removed and groups
+    `old` does not have. Groups that only `old` has are not returned.
+    """
+    labels = [
+        sorted(set(a) | set(b))
+        for a, b in (
+            (old.states, new.states),
+            (old.variables, new.variables),
+            (old.cadres, new.cadres),
+            (old.years, new.years),
+        )
+    ]
+    before, after = old.reindex(*labels), new.reindex(*labels)
+    a, b = before.data, after.data
+    differs = (a != b) & ~(np.isnan(a) & np.isnan(b))
+    states, variables, cadres, years = labels
+    if by == LINE_BY:
+        hit = differs.any(axis=(2, 3)) & after.present.any(axis=(2, 3))
+        return [(states[i], variables[j]) for i, j in zip(*np.nonzero(hit))]
+    if by == MAP_BY:
+        hit = differs.any(axis=0) & after.present.any(axis=0)
+        v, k, y = np.nonzero(hit)
+        return sorted((variables[i], years[l], cadres[j]) for i, j, l in zip(v, k, y))
+    raise ValueError(f"unsupported grouping {by}")
@@ -1,17 +1,24 @@
+import os
+
+import numpy as np
+import pandas as pd
 import streamlit as st
-import altair as alt
-import geopandas as gpd
-import folium
-from streamlit_folium import st_folium
-import shapely
-import json
 
 import constants as c
-from utils import *
+import tracing
+from data_service import DataService, file_stamp
+from tracing import span
+from utils import determine_cadre_intersection
+
+# altair, folium, the choropleth, the version store and the uncertainty engine
+# are imported by the charts that use them, and the page itself is built by
+# `main`, so importing this module (for the startup budget in
+# startup_budget.py) runs no Streamlit code.
 
 EXCEL_FILE = "Documents/14_07_22_VW_AAAQ_mastersheet__26_NOV_23.xlsx"
 SHAPEFILE_PATH = "Documents/maps-master/States/Admin2"
 RESULTS_DIR = "Results/raw-value-based"
+VERSIONS_DIR = ".cache/versions"
 
 cadre_colors = {
     cadre: f"C{i}"
@@ -20,51 +27,70 @@ cadre_colors = {
     )
 }
 
-st.title("AAAQ HRH Deficit Explorer")
-st.set_page_config(layout="wide")
 
+@st.cache_resource
+def get_data_service() -> DataService:
+    """
+    One DataService per server process, shared by every session.
+    """
+    return DataService(EXCEL_FILE, SHAPEFILE_PATH)
 
-@st.cache_data
-def load_line_gb(excel_file: str):
-    data = load_raw_data(excel_file)
-    cleaned_data = clean_data(data)
-    return cleaned_data.groupby(["states", "variable"])
 
+# Store and reconstructed cubes kept per process; every ingest changes the
+# stamp, so without a bound each one would stay cached for good
+VERSION_STORES_CACHED = 2
+VERSION_CUBES_CACHED = 8
 
-@st.cache_data
-def load_map_geom() -> gpd.GeoDataFrame:
-    state_geoms = load_state_geometries(SHAPEFILE_PATH)
-    return gpd.GeoDataFrame(
-        [(k, v) for k, v in state_geoms.items()], columns=["state", "geometry"]
-    )
 
+@st.cache_resource(max_entries=VERSION_STORES_CACHED)
+def get_version_store(store_dir: str, stamp: tuple):
+    """
+    The version store as of `stamp` (its file's mtime and size), shared by
+    every session until the next ingest.
+    """
+    from versions import VersionStore
+
+    return VersionStore.open(store_dir)
+
+
+@st.cache_resource(max_entries=VERSION_CUBES_CACHED)
+def get_version_cube(store_dir: str, stamp: tuple, version: str):
+    return get_version_store(store_dir, stamp).cube(version)
+
+
+# One what-if engine per projection scenario of the current mastersheet
+PROJECTION_ENGINES_CACHED = 4
+
+
+@st.cache_resource(max_entries=PROJECTION_ENGINES_CACHED)
+def get_projection_engine(_data, stamp: tuple, scenario: str):
+    """
+    The what-if engine over the mastersheet cube re-extrapolated with a
+    projection scenario, shared by every session until the mastersheet
+    changes (`stamp`).
+    """
+    from projection import project
+    from whatif import ScenarioEngine
+
+    return ScenarioEngine(project(_data.cube, scenario))
 
-@st.cache_data
-def load_map_geojson() -> dict:
-    state_geoms = load_state_geometries(SHAPEFILE_PATH)
-    return {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "id": k,
-                "geometry": json.loads(shapely.to_geojson(v)),
-                "properties": {"state": k},
-            }
-            for k, v in state_geoms.items()
-        ],
-    }
-
-
-@st.cache_data
-def load_map_gb(excel_file: str):
-    data = load_raw_data(excel_file)
-    cleaned_data = clean_data(data)
-    return cleaned_data.groupby(["variable", "year", "cadres"])
-
-
-def display_line_chart(line_gb, chosen_state, chosen_var):
-    series = line_gb.get_group((chosen_state, chosen_var))
+
+def line_band(series, state, variable):
+    """
+    Monte Carlo percentile band of the line group of (state, variable), as
+    low/high columns indexed like `series`.
+    """
+    from cube import DeficitCube
+    from uncertainty import simulate_bands
+
+    bands = simulate_bands(DeficitCube.from_series(series))
+    return bands.line_band(state, variable)
+
+
+def display_line_chart(cube, chosen_state, chosen_var, show_band=False):
+    import altair as alt
+
+    series = cube.line_group(chosen_state, chosen_var)
     intersection = determine_cadre_intersection(
         chosen_var, series, c.CADRES_OF_INTEREST
     )
@@ -74,7 +100,13 @@ def display_line_chart(line_gb, chosen_state, chosen_var):
     else:
         # Prepare the DataFrame for plotting
         deficit_col = "deficit"
-        df = series.rename(deficit_col).reset_index().copy()
+        df = series.rename(deficit_col)
+        if show_band:
+            with span("uncertainty band"):
+                df = pd.concat(
+                    [df, line_band(series, chosen_state, chosen_var)], axis=1
+                )
+        df = df.reset_index()
         st.dataframe(df, height=300)
 
         st.text(f"Showing deficit for {len(intersection)} cadres")
@@ -91,6 +123,8 @@ def display_line_chart(line_gb, chosen_state, chosen_var):
 
         # Clip deficit column at -1, 1 for readable charts
         df[deficit_col] = np.clip(df[deficit_col], a_min=-1, a_max=1)
+        if show_band:
+            df[["low", "high"]] = np.clip(df[["low", "high"]], a_min=-1, a_max=1)
         # Set y-axis limits with a margin of 0.125
         y_min_margin = df[deficit_col].min() - 1
         y_max_margin = df[deficit_col].max() + 1
@@ -143,8 +177,26 @@ def display_line_chart(line_gb, chosen_state, chosen_var):
             alt.Chart().mark_rule(color="gray", opacity=0.4).encode(y=alt.datum(0))
         )
 
+        layers = [line_chart, point_chart, horizontal_line]
+        if show_band:
+            band_chart = (
+                alt.Chart(df)
+                .mark_area()
+                .encode(
+                    x=alt.X("year:O"),
+                    y=alt.Y("low:Q"),
+                    y2=alt.Y2("high:Q"),
+                    color=alt.Color("Cadre Label:N"),
+                    opacity=alt.condition(
+                        cadre_selection, alt.value(0.2), alt.value(0.03)
+                    ),
+                    tooltip=["year", "Cadre Label", "low", "high"],
+                )
+            )
+            layers.insert(0, band_chart)
+
         chart = (
-            (line_chart + point_chart + horizontal_line)
+            alt.layer(*layers)
             .properties(
                 width=600,
                 height=400,
@@ -157,10 +209,80 @@ def display_line_chart(line_gb, chosen_state, chosen_var):
         st.altair_chart(chart, use_container_width=True)
 
 
-def display_map_chart(map_gb, chosen_var, chosen_year, chosen_cadre, geojson):
-    series = map_gb.get_group((chosen_var, chosen_year, chosen_cadre)).rename("deficit")
-    df = series.reset_index().copy()
-    # st.dataframe(df, height=300)
+def display_version_overlay(store_dir, stamp, chosen_state, chosen_var, old, new):
+    import altair as alt
+
+    frames = []
+    for version in (old, new):
+        cube = get_version_cube(store_dir, stamp, version)
+        if chosen_state not in cube.state_pos or chosen_var not in cube.variable_pos:
+            continue
+        series = cube.line_group(chosen_state, chosen_var)
+        cadres = determine_cadre_intersection(chosen_var, series, c.CADRES_OF_INTEREST)
+        df = series.rename("deficit").reset_index()
+        df = df[df["cadres"].isin(cadres)]
+        df["version"] = version
+        frames.append(df)
+    if not frames:
+        st.text("No Data Available")
+        return
+
+    df = pd.concat(frames, ignore_index=True)
+    df["Cadre Label"] = df["cadres"].map(lambda x: c.CADRE_LABEL_MAPPING.get(x, x))
+    df["deficit"] = np.clip(df["deficit"], a_min=-1, a_max=1)
+    chart = (
+        alt.Chart(df)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("year:O", title="Year"),
+            y=alt.Y("deficit", title="Deficit"),
+            color=alt.Color("Cadre Label:N", title="Cadre"),
+            strokeDash=alt.StrokeDash(
+                "version:N",
+                title="Version",
+                scale=alt.Scale(domain=[old, new], range=[[4, 4], [1, 0]]),
+            ),
+            tooltip=["version", "year", "Cadre Label", "deficit"],
+        )
+        .properties(
+            width=600,
+            height=400,
+            title=f"{c.VARNAME_MAPPING.get(chosen_var, chosen_var)} in {chosen_state}",
+        )
+        .interactive()
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    diff = get_version_store(store_dir, stamp).diff(old, new)
+    index = diff.index
+    diff = diff[
+        (index.get_level_values("states") == chosen_state)
+        & (index.get_level_values("variable") == chosen_var)
+    ]
+    st.text(f"{len(diff)} cells differ between {old} and {new}")
+    if len(diff):
+        st.dataframe(diff, height=300)
+
+
+def static_url(static_file: str) -> str:
+    """
+    URL under which Streamlit serves a file of the static directory.
+    """
+    base = st.get_option("server.baseUrlPath").strip("/")
+    return "/" + "/".join(p for p in [base, "app/static", static_file] if p)
+
+
+def display_map_chart(
+    cube, chosen_var, chosen_year, chosen_cadre, topology_file, script_file
+):
+    import folium
+    from streamlit_folium import st_folium
+
+    from choropleth import TopoChoropleth, state_colors
+
+    series = cube.map_group(chosen_var, chosen_year, chosen_cadre)
+    values = series.droplevel(["year", "variable", "cadres"])
+    colors, colormap = state_colors(values)
 
     m = folium.Map(
         location=[23, 81],
@@ -171,65 +293,141 @@ def display_map_chart(map_gb, chosen_var, chosen_year, chosen_cadre, geojson):
         extent=[-180, -90, 180, 90],
     )
 
-    folium.Choropleth(
-        geo_data=geojson,
-        name="choropleth",
-        data=df,
-        columns=["states", "deficit"],
-        key_on="feature.id",
-        fill_color="RdYlGn",
-        fill_opacity=0.7,
-        line_opacity=0.2,
-        legend_name="Deficit",
-        highlight=True,
+    # the geometry is fetched by URL; only the colours change between reruns
+    TopoChoropleth(
+        static_url(topology_file),
+        colors,
+        static_url(script_file),
+        tooltips={state: f"{state}: {v:.3f}" for state, v in values.items()},
     ).add_to(m)
-
-    folium.LayerControl().add_to(m)
+    colormap.add_to(m)
 
     st_folium(m, width=800, height=800)
 
 
-tab_lines, tab_maps = st.tabs(["Deficit over time", "Deficit over geography"])
+def scenario_panel(data):
+    """
+    Sidebar controls of the projection and the norm what-if mode. Returns the
+    cube as seen under them: its projection years re-extrapolated with the
+    chosen projection scenario, then the chosen norm's thresholds scaled.
+    """
+    from projection import SCENARIOS
 
-with tab_lines:
-    st.title("Deficit over time")
-    line_gb = load_line_gb(EXCEL_FILE)
+    with st.sidebar:
+        st.header("Projection")
+        projection = st.selectbox("Projection scenario", ["mastersheet", *SCENARIOS])
+        if projection == "mastersheet":
+            engine = data.whatif
+        else:
+            engine = get_projection_engine(data, data.source_stamp, projection)
+            st.caption(
+                f"Years from {c.PROJECTION_YEAR} on are re-extrapolated from the "
+                "observed years."
+            )
+        return engine.view(norm_panel(engine))
+
+
+def norm_panel(engine) -> dict:
+    """
+    Sidebar controls of the norm what-if mode. Returns the scenario as
+    {norm: {cadre: threshold multiplier}}, empty when off.
+    """
+    with st.sidebar:
+        st.header("Norm what-if")
+        norm = st.selectbox("Norm", ["(mastersheet)"] + engine.norms)
+        if norm == "(mastersheet)":
+            return {}
+        factor = st.slider("Threshold multiplier", 0.5, 2.0, 1.0, 0.05)
+        cadres = st.multiselect("Cadres", engine.cube.cadres, engine.cube.cadres)
+        st.caption(
+            f"{norm} thresholds x{factor:.2f} for {len(cadres)} cadres; "
+            "AvD and ApD cadre-mix variables of this norm are recomputed."
+        )
+        return {norm: {cadre: factor for cadre in cadres}}
 
-    state_opts, varname_opts = set(), set()
-    for s, v in line_gb.groups.keys():
-        state_opts.add(s)
-        varname_opts.add(v)
 
-    sidebar_col, _, main_col = st.columns([4, 1, 12])
-    with sidebar_col:
-        chosen_state = st.selectbox("State", state_opts)
-        chosen_var = st.selectbox("Variable", varname_opts)
-        st.text(f"Showing {len(state_opts)} states, {len(varname_opts)} variables")
+def main():
+    st.title("AAAQ HRH Deficit Explorer")
+    st.set_page_config(layout="wide")
 
-    with main_col:
-        display_line_chart(line_gb, chosen_state, chosen_var)
+    with span("data snapshot"):
+        data = get_data_service().snapshot()
 
+    with span("what-if"):
+        view = scenario_panel(data)
 
-with tab_maps:
-    st.title("Deficit over geography")
-    map_gb = load_map_gb(EXCEL_FILE)
-    geojson = load_map_geojson()
+    tab_lines, tab_maps, tab_versions = st.tabs(
+        ["Deficit over time", "Deficit over geography", "Compare versions"]
+    )
 
-    sidebar_col, _, main_col = st.columns([4, 1, 12])
+    with tab_lines:
+        st.title("Deficit over time")
+        cube = data.cube
+        state_opts, varname_opts = cube.states, cube.variables
 
-    year_opts, varname_opts, cadre_opts = set(), set(), set()
-    for v, y, c in map_gb.groups.keys():
-        year_opts.add(y)
-        varname_opts.add(v)
-        cadre_opts.add(c)
+        sidebar_col, _, main_col = st.columns([4, 1, 12])
+        with sidebar_col:
+            chosen_state = st.selectbox("State", state_opts)
+            chosen_var = st.selectbox("Variable", varname_opts)
+            show_band = st.checkbox("Uncertainty bands", value=True)
+            st.text(f"Showing {len(state_opts)} states, {len(varname_opts)} variables")
 
-    with sidebar_col:
-        chosen_var = st.selectbox("Map Variable", varname_opts)
-        chosen_year = st.selectbox("Map Year", year_opts)
-        chosen_cadre = st.selectbox("Map Cadre", cadre_opts)
-        st.text(
-            f"Showing {len(year_opts)} years, {len(varname_opts)} variables, {len(cadre_opts)} cadres"
-        )
+        with main_col:
+            with span("line chart", state=chosen_state, variable=chosen_var):
+                display_line_chart(view, chosen_state, chosen_var, show_band)
+
+    with tab_maps:
+        st.title("Deficit over geography")
+        cube = data.cube
 
-    with main_col:
-        display_map_chart(map_gb, chosen_var, chosen_year, chosen_cadre, geojson)
+        sidebar_col, _, main_col = st.columns([4, 1, 12])
+
+        year_opts, varname_opts, cadre_opts = cube.years, cube.variables, cube.cadres
+
+        with sidebar_col:
+            chosen_var = st.selectbox("Map Variable", varname_opts)
+            chosen_year = st.selectbox("Map Year", year_opts)
+            chosen_cadre = st.selectbox("Map Cadre", cadre_opts)
+            st.text(
+                f"Showing {len(year_opts)} years, {len(varname_opts)} variables, {len(cadre_opts)} cadres"
+            )
+
+        with main_col:
+            with span("map chart", variable=chosen_var, year=chosen_year):
+                display_map_chart(
+                    view,
+                    chosen_var,
+                    chosen_year,
+                    chosen_cadre,
+                    data.topology_file,
+                    data.script_file,
+                )
+
+    with tab_versions:
+        st.title("Compare mastersheet versions")
+        store_path = os.path.join(VERSIONS_DIR, "store.npz")
+        if not os.path.exists(store_path):
+            st.text("Ingest mastersheets with `python versions.py ingest FILE ...`")
+        else:
+            stamp = file_stamp(store_path)
+            names = get_version_store(VERSIONS_DIR, stamp).names
+            cube = data.cube
+            sidebar_col, _, main_col = st.columns([4, 1, 12])
+            with sidebar_col:
+                old = st.selectbox("Old version", names, index=max(len(names) - 2, 0))
+                new = st.selectbox("New version", names, index=len(names) - 1)
+                chosen_state = st.selectbox("Version State", cube.states)
+                chosen_var = st.selectbox("Version Variable", cube.variables)
+            with main_col:
+                with span("version overlay", old=old, new=new):
+                    display_version_overlay(
+                        VERSIONS_DIR, stamp, chosen_state, chosen_var, old, new
+                    )
+
+    # With AAAQ_TRACE set, spans of every rerun are appended next to the trace
+    # file; merge them with `python tracing.py $AAAQ_TRACE`.
+    tracing.flush_part()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Process-wide data layer for the dashboard.
+
+`DataService` loads the mastersheet (through the on-disk cache) and the state
+geometries once per process and hands every session the same immutable
+`DashboardData` snapshot. When the mastersheet changes on disk, the next
+`snapshot()` call builds a new snapshot and swaps it in atomically; sessions
+holding the old one keep a consistent view until they rerun.
+
+The state polygons reach the browser as a TopoJSON file published under
+`static_dir` and named after the geometry store digest, so browsers fetch it
+once and serve later reruns and sessions from their cache. The TopoJSON
+decoder the choropleth runs is published next to it, so the map needs no CDN.
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from cache import load_cleaned
+from cube import DeficitCube
+from geometry import GeometryStore, open_geometry_store
+from whatif import ScenarioEngine
+
+# Served by Streamlit at app/static/ with server.enableStaticServing
+STATIC_DIR = "static"
+# topojson.feature for the browser, see topojson_feature.js
+SCRIPT_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "topojson_feature.js"
+)
+
+
+@dataclass(frozen=True)
+class DashboardData:
+    """
+    Read-only data shared by all dashboard sessions. The cube arrays are
+    non-writeable. `topology_file` and `script_file` are the names of the
+    published TopoJSON and of its decoder script in the static directory.
+    `whatif` recomputes the cube under norm scenarios, caching slices across
+    sessions.
+    """
+
+    cube: DeficitCube
+    state_geoms: MappingProxyType
+    topology_file: str
+    script_file: str
+    source_stamp: tuple
+    whatif: ScenarioEngine
+
+
+def _remove_stale(static_dir: str, pattern: str, keep: str) -> None:
+    """
+    Deletes the files in `static_dir` matching `pattern` other than `keep`,
+    the copies published for an older store or script.
+    """
+    for path in glob.glob(os.path.join(static_dir, pattern)):
+        if os.path.basename(path) != keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def publish_topology(store: GeometryStore, level: str, static_dir: str) -> str:
+    """
+    Copies the TopoJSON of `level` into `static_dir` under a name unique to
+    the store, unless it is already there, and removes the copies of older
+    stores. Returns the file name.
+    """
+    name = f"states-{os.path.basename(store.path)[:16]}-{level}.topo.json"
+    path = os.path.join(static_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(static_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(store.topology_path(level), tmp)
+        os.replace(tmp, path)
+    _remove_stale(static_dir, f"states-*-{level}.topo.json", name)
+    return name
+
+
+def publish_script(static_dir: str, source: str = SCRIPT_FILE) -> str:
+    """
+    Copies the decoder script into `static_dir` under a name unique to its
+    contents, unless it is already there, and removes older versions.
+    Returns the file name.
+    """
+    with open(source, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    name = f"topojson-{digest[:16]}.js"
+    path = os.path.join(static_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(static_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, path)
+    _remove_stale(static_dir, "topojson-*.js", name)
+    return name
+
+
+def file_stamp(path: str) -> tuple:
+    """
+    Returns a cheap change marker for `path` (mtime and size).
+    """
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class DataService:
+    """
+    Loads the dashboard data once and reloads it when the mastersheet changes.
+    Safe to share between the threads serving Streamlit sessions.
+    """
+
+    def __init__(
+        self,
+        excel_file: str,
+        shapefile_path: str,
+        level: str = "light",
+        static_dir: str = STATIC_DIR,
+    ):
+        self.excel_file = excel_file
+        self.shapefile_path = shapefile_path
+        self.level = level
+        self.static_dir = static_dir
+        self._lock = threading.Lock()
+        self._data: DashboardData | None = None
+
+    def _load(self, stamp: tuple) -> DashboardData:
+        store = open_geometry_store(self.shapefile_path)
+        state_geoms = MappingProxyType(dict(store.geometries(self.level)))
+        cube = DeficitCube.from_series(load_cleaned(self.excel_file))
+        return DashboardData(
+            cube=cube,
+            state_geoms=state_geoms,
+            topology_file=publish_topology(store, self.level, self.static_dir),
+            script_file=publish_script(self.static_dir),
+            source_stamp=stamp,
+            whatif=ScenarioEngine(cube),
+        )
+
+    def snapshot(self) -> DashboardData:
+        """
+        Returns the current data, reloading it first if the mastersheet changed.
+        """
+        stamp = file_stamp(self.excel_file)
+        data = self._data
+        if data is not None and data.source_stamp == stamp:
+            return data
+        with self._lock:
+            data = self._data
+            if data is None or data.source_stamp != stamp:
+                if data is not None:
+                    # geometries do not depend on the mastersheet
+                    cube = DeficitCube.from_series(load_cleaned(self.excel_file))
+                    data = DashboardData(
+                        cube,
+                        data.state_geoms,
+                        data.topology_file,
+                        data.script_file,
+                        stamp,
+                        ScenarioEngine(cube),
+                    )
+                else:
+                    data = self._load(stamp)
+                self._data = data
+            return data
@@ -0,0 +1,251 @@
+"""
+Vectorized recomputation of the AAAQ deficit indices from workforce and
+population counts, so a changed norm or threshold does not need an Excel
+recalculation.
+
+Densities d are HRH per 100,000 population of the same segment; thr is the
+threshold of a norm per 100,000 (supplement S6) and w the population density
+weight of a state (supplement S5):
+
+    AvD_{norm}            1 - d_total / thr
+    AvD_urban_{norm}      1 - d_urban / thr
+    AvD_male_{norm}       1 - d_male / thr
+    AsD                   1 - w * d_rural / d_urban
+    ApD_sex_mix           1 - d_female / d_male
+    ApD_cadre_mix_{norm}  1 - (d_total / d_doctor) / (thr / thr_doctor)
+    QD                    1 - qualified HRH / total HRH
+
+Divisions by zero give NaN, like #DIV/0! in the mastersheet. Every index is
+computed for all states, cadres, years and norms at once.
+
+Usage:
+    python deficits.py [EXCEL_FILE]
+"""
+
+import re
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import cache
+from cube import DeficitCube
+from tracing import traced
+
+PER_POPULATION = 100_000
+SEGMENTS = ["total", "male", "female", "urban", "rural"]
+NORMS = ["HLEG", "Bhore", "IHME_UHC80", "IHME_UHC90", "IPHS", "SDG", "MDG"]
+# The mastersheet has cadre-mix deficits for these norms and cadres only
+CADRE_MIX_NORMS = ["HLEG", "Bhore", "IHME_UHC80", "IHME_UHC90", "IPHS"]
+CADRE_MIX_CADRES = ["nursing cadres", "supporting cadres"]
+
+THRESHOLD_SHEET = "HRH_needed_to reach_req._thresh"
+DERIVATION_SHEETS = {
+    1981: "Missing_states_derivation_1981",
+    1991: "Missing_states_derivation_1991",
+}
+# Column prefix of each segment in the derivation sheets (+ "_hrh" / "_pop")
+DERIVATION_COLUMNS = {
+    "total": "total_persons",
+    "male": "total_male",
+    "female": "total_female",
+    "urban": "urban_persons",
+    "rural": "rural_persons",
+}
+
+
+@dataclass(frozen=True)
+class WorkforceInputs:
+    """
+    Dense inputs on the DeficitCube axes. NaN marks unknown values.
+      hrh         (segments, states, cadres, years) workforce counts
+      population  (segments, states, years)
+      qualified   (states, cadres, years) qualified workforce counts
+      weight      (states, years) population density weight (S5)
+    """
+
+    states: list[str]
+    cadres: list[str]
+    years: list[int]
+    hrh: np.ndarray
+    population: np.ndarray
+    qualified: np.ndarray
+    weight: np.ndarray
+
+
+def deficit_variables(norms: list[str]) -> list[str]:
+    """
+    Returns the variables `compute_deficits` produces for `norms`, in order.
+    Pure: no I/O.
+    """
+    return (
+        [f"AvD_{n}" for n in norms]
+        + [f"AvD_urban_{n}" for n in norms]
+        + [f"AvD_male_{n}" for n in norms]
+        + ["AsD", "ApD_sex_mix"]
+        + [f"ApD_cadre_mix_{n}" for n in norms if n in CADRE_MIX_NORMS]
+        + ["QD"]
+    )
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """
+    Elementwise num / den with NaN wherever the division is undefined.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = num / den
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+@traced("compute_deficits")
+def compute_deficits(inputs: WorkforceInputs, thresholds: pd.DataFrame) -> DeficitCube:
+    """
+    Computes every deficit index from `inputs` and a thresholds table
+    (norms x cadres, per 100,000). Cadres missing from the table get NaN
+    thresholds. Returns the indices as a cube with the same labels as the
+    cleaned mastersheet.
+    """
+    norms = list(thresholds.index)
+    thr = thresholds.reindex(columns=inputs.cadres).to_numpy(dtype=float)
+    thr = thr[:, None, :, None]  # (norms, states, cadres, years)
+
+    density = _ratio(inputs.hrh, inputs.population[:, :, None, :]) * PER_POPULATION
+    d = dict(zip(SEGMENTS, density))  # each (states, cadres, years)
+
+    avd = 1 - _ratio(d["total"][None], thr)
+    avd_urban = 1 - _ratio(d["urban"][None], thr)
+    avd_male = 1 - _ratio(d["male"][None], thr)
+    asd = 1 - inputs.weight[:, None, :] * _ratio(d["rural"], d["urban"])
+    sex_mix = 1 - _ratio(d["female"], d["male"])
+
+    mix_norms = [i for i, n in enumerate(norms) if n in CADRE_MIX_NORMS]
+    cadre_mix = np.full((len(mix_norms),) + d["total"].shape, np.nan)
+    if "doctor" in inputs.cadres:
+        doctor = inputs.cadres.index("doctor")
+        mix_cadres = [
+            inputs.cadres.index(k) for k in CADRE_MIX_CADRES if k in inputs.cadres
+        ]
+        observed = _ratio(d["total"], d["total"][:, doctor : doctor + 1])
+        normed = _ratio(thr[mix_norms], thr[mix_norms][:, :, doctor : doctor + 1])
+        mix = 1 - _ratio(observed[None], normed)
+        cadre_mix[:, :, mix_cadres] = mix[:, :, mix_cadres]
+
+    qd = 1 - _ratio(inputs.qualified, inputs.hrh[SEGMENTS.index("total")])
+
+    stacked = np.concatenate(
+        [avd, avd_urban, avd_male, asd[None], sex_mix[None], cadre_mix, qd[None]]
+    )  # (variables, states, cadres, years)
+    return DeficitCube(
+        np.ascontiguousarray(stacked.transpose(1, 0, 2, 3), dtype=np.float32),
+        inputs.states,
+        deficit_variables(norms),
+        inputs.cadres,
+        inputs.years,
+        name="default",
+    )
+
+
+def validate(computed: DeficitCube, reference: pd.Series, atol: float = 1e-4):
+    """
+    Compares recomputed indices with the cleaned mastersheet on the cells both
+    have. Returns a frame per variable with the number of compared cells, the
+    largest absolute difference and the number of cells off by more than `atol`.
+    """
+    joined = pd.concat(
+        [computed.to_series().rename("computed"), reference.rename("mastersheet")],
+        axis=1,
+        join="inner",
+    ).dropna()
+    diff = (joined["computed"] - joined["mastersheet"]).abs()
+    by_variable = diff.groupby(level="variable")
+    return pd.DataFrame(
+        {
+            "cells": by_variable.size(),
+            "max_abs_diff": by_variable.max(),
+            "mismatches": (diff > atol).groupby(level="variable").sum(),
+        }
+    )
+
+
+# -------------------------------------------------------------------
+# INPUTS FROM THE MASTERSHEET WORKBOOK
+# -------------------------------------------------------------------
+
+
+def load_thresholds(excel_file: str) -> pd.DataFrame:
+    """
+    Reads the HLEG thresholds per cadre that the workbook uses for the 2031
+    requirement table. Other norms' thresholds (S6) are not in the workbook;
+    add rows to the returned table to recompute them.
+    """
+    sheet = pd.read_excel(excel_file, sheet_name=THRESHOLD_SHEET, usecols="B,J")
+    sheet.columns = ["cadres", "HLEG"]
+    sheet["cadres"] = sheet["cadres"].str.lower()
+    table = sheet.dropna().drop_duplicates("cadres").set_index("cadres")
+    return table.T.rename_axis(index="norm", columns=None)
+
+
+def _numeric(column: pd.Series) -> np.ndarray:
+    """
+    Returns the column as floats; formula strings and blanks become NaN.
+    """
+    return pd.to_numeric(column, errors="coerce").to_numpy(dtype=float)
+
+
+def load_derivation_inputs(excel_file: str) -> WorkforceInputs:
+    """
+    Reads the census workforce and population counts of the missing-state
+    derivation sheets (undivided Bihar, Madhya Pradesh and Uttar Pradesh in
+    1981 and 1991). Aggregate cadres that are Excel formulas are left NaN, as
+    are the qualified counts and density weights, which the sheets lack.
+    """
+    frames = []
+    for year, sheet_name in DERIVATION_SHEETS.items():
+        sheet = pd.read_excel(excel_file, sheet_name=sheet_name, usecols="A:U")
+        sheet = sheet.dropna(subset=[sheet.columns[0], sheet.columns[1]])
+        sheet["year"] = year
+        frames.append(sheet)
+    raw = pd.concat(frames, ignore_index=True)
+    raw["states"] = [
+        re.sub(r"_[0-9]{4}$", "", s).strip().lower() for s in raw.iloc[:, 0]
+    ]
+    raw["cadres"] = raw.iloc[:, 1].str.strip().str.lower()
+    raw = raw.drop_duplicates(["states", "cadres", "year"])
+
+    states, cadres = sorted(raw["states"].unique()), sorted(raw["cadres"].unique())
+    years = sorted(DERIVATION_SHEETS)
+    s = pd.Index(states).get_indexer(raw["states"])
+    k = pd.Index(cadres).get_indexer(raw["cadres"])
+    y = pd.Index(years).get_indexer(raw["year"])
+
+    hrh = np.full((len(SEGMENTS), len(states), len(cadres), len(years)), np.nan)
+    population = np.full((len(SEGMENTS), len(states), len(years)), np.nan)
+    for i, segment in enumerate(SEGMENTS):
+        prefix = DERIVATION_COLUMNS[segment]
+        hrh[i, s, k, y] = _numeric(raw[f"{prefix}_hrh"])
+        # aggregate rows carry no population; keep the value of the others
+        pop = _numeric(raw[f"{prefix}_pop"])
+        known = ~np.isnan(pop)
+        population[i, s[known], y[known]] = pop[known]
+
+    return WorkforceInputs(
+        states=states,
+        cadres=cadres,
+        years=years,
+        hrh=hrh,
+        population=population,
+        qualified=np.full(hrh.shape[1:], np.nan),
+        weight=np.full((len(states), len(years)), np.nan),
+    )
+
+
+if __name__ == "__main__":
+    excel_file = sys.argv[1] if len(sys.argv) > 1 else cache.EXCEL_FILE
+    computed = compute_deficits(
+        load_derivation_inputs(excel_file), load_thresholds(excel_file)
+    )
+    report = validate(computed, cache.load_cleaned(excel_file))
+    print(report.to_string())
+    sys.exit(1 if report["mismatches"].any() else 0)
@@ -0,0 +1,285 @@
+"""
+District-level geometries, spatial lookups and population-weighted rollups.
+
+The Admin2 shapefile holds one polygon per district, but
+`load_state_geometries` keeps only the first shape of every state.
+`load_district_geometries` reads all of them, keyed "{state}/{district}", and
+`DistrictIndex` puts them in a shapely STRtree for point lookups and spatial
+district -> state assignment. Keys keep the state name of their source
+(telangana, ladakh); `state_of` maps them to the merged mastersheet states and
+`match_districts` joins table keys to geometry keys across the renames.
+
+District deficits come as a long table (csv or xlsx) laid out like the
+mastersheet, with a district column after the state:
+
+    states, districts, cadres, population, AvD_HLEG_2011, ...
+
+`clean_district_data` returns the same (states, year, variable, cadres) series
+as `clean_data`, with the district keys in the `states` level, so the cube, the
+groupings and the map path take a district series unchanged. `rollup` and
+`rollup_to_states` average districts into states weighted by population.
+
+Usage:
+    python districts.py [SHAPEFILE_PATH] [DISTRICT_FILE] [OUT_DIR]
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+import shapefile
+import shapely
+
+import utils
+from cube import DeficitCube
+from results_tables import TABLES_DIR, write_table
+from tracing import span, traced
+
+SHAPEFILE_PATH = "Documents/maps-master/States/Admin2"
+STATE_FIELD = "ST_NM"
+# Field names of the district name in the Admin2 releases we have seen
+DISTRICT_FIELDS = ("DISTRICT", "dtname", "DT_NM", "NAME_2")
+POPULATION_COLUMN = "population"
+# Shapefile state names -> state names of the mastersheet and the state maps
+STATE_RENAMES = {
+    "delhi": "n.c.t. of delhi",
+    "andaman & nicobar": "andaman & nicobar islands",
+    "dadra and nagar haveli and daman and diu": "dadra & nagar haveli",
+    "ladakh": "jammu & kashmir",
+    "telangana": "andhra pradesh",
+}
+KEY_SEP = "/"
+
+
+def district_key(state: str, district: str) -> str:
+    return f"{state.lower().strip()}{KEY_SEP}{district.lower().strip()}"
+
+
+def state_of(keys) -> np.ndarray:
+    """
+    Returns the mastersheet state of district keys, after the state renames
+    and merges of `load_state_geometries`. Pure: no I/O.
+    """
+    states = (key.split(KEY_SEP, 1)[0] for key in keys)
+    return np.array([STATE_RENAMES.get(s, s) for s in states], dtype=object)
+
+
+def canonical_key(key: str) -> str:
+    """
+    Returns a district key with its state renamed like `state_of`. Pure: no I/O.
+    """
+    state, sep, district = key.partition(KEY_SEP)
+    return f"{STATE_RENAMES.get(state, state)}{sep}{district}"
+
+
+def match_districts(keys, names) -> tuple[dict[str, str], list[str]]:
+    """
+    Matches the district keys of a table to the keys of the geometries, as
+    they are or after renaming the states of both sides with `canonical_key`
+    (a table may name a district "andhra pradesh/hyderabad" and the shapefile
+    "telangana/hyderabad"). Returns {key: geometry key} and the keys without a
+    geometry. Pure: no I/O.
+    """
+    names = list(names)
+    canonical = {}
+    for name in names:
+        canonical.setdefault(canonical_key(name), name)
+    known = set(names)
+    matched, unmatched = {}, []
+    for key in keys:
+        name = key if key in known else canonical.get(canonical_key(key))
+        if name is None:
+            unmatched.append(key)
+        else:
+            matched[key] = name
+    return matched, unmatched
+
+
+def _district_field(fields: list[str], district_field: str | None) -> str | None:
+    if district_field is not None:
+        if district_field not in fields:
+            raise KeyError(f"the shapefile has no field {district_field!r}")
+        return district_field
+    return next((f for f in DISTRICT_FIELDS if f in fields), None)
+
+
+@traced("load_district_geometries")
+def load_district_geometries(
+    shapefile_path: str = SHAPEFILE_PATH, district_field: str | None = None
+) -> dict[str, shapely.Geometry]:
+    """
+    Returns {"{state}/{district}": geometry} for every shape of the shapefile,
+    with the state as named in the shapefile. Shapes of the same district are
+    unioned. Without a district name field, shapes are named by
+    their record number.
+    """
+    with span("geometry read"), shapefile.Reader(shapefile_path) as reader:
+        fields = [f[0] for f in reader.fields[1:]]
+        field = _district_field(fields, district_field)
+        keys, geoms = [], []
+        for i, (shape, record) in enumerate(zip(reader.shapes(), reader.records())):
+            district = str(record[field]) if field else str(i)
+            keys.append(district_key(record[STATE_FIELD], district))
+            geoms.append(shapely.geometry.shape(shape))
+
+    with span("geometry merge"):
+        if len(set(keys)) == len(keys):
+            return dict(zip(keys, geoms))
+        parts = pd.Series(geoms, index=keys, dtype=object).groupby(level=0, sort=False)
+        return {key: shapely.union_all(list(group)) for key, group in parts}
+
+
+class DistrictIndex:
+    """
+    District geometries in an STRtree, with the state of every district as an
+    integer code into `state_names`.
+    """
+
+    def __init__(self, district_geoms: dict[str, shapely.Geometry]):
+        self.names = np.array(list(district_geoms), dtype=object)
+        self.geoms = np.array(list(district_geoms.values()), dtype=object)
+        self.tree = shapely.STRtree(self.geoms)
+        states = pd.Index(state_of(self.names))
+        self.state_codes, uniques = pd.factorize(states, sort=True)
+        self.state_names: list[str] = list(uniques)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def locate(self, x, y) -> np.ndarray:
+        """
+        Returns the position of the district containing each point, or -1 for
+        points outside every district. Points on a shared border go to the
+        first district in the index.
+        """
+        points = shapely.points(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        points = np.atleast_1d(points)
+        hits = self.tree.query(points, predicate="intersects")
+        out = np.full(len(points), -1, dtype=np.int64)
+        # query returns (point, district) pairs sorted by point; keep the first
+        first = np.unique(hits[0], return_index=True)[1]
+        out[hits[0][first]] = hits[1][first]
+        return out
+
+    def assign_states(self, state_geoms: dict[str, shapely.Geometry]) -> np.ndarray:
+        """
+        Returns the state of `state_geoms` containing a representative point of
+        every district, or None where no state does. Used to check the state
+        names of the district shapefile against the state maps.
+        """
+        names = np.array(list(state_geoms), dtype=object)
+        tree = shapely.STRtree(list(state_geoms.values()))
+        hits = tree.query(shapely.point_on_surface(self.geoms), predicate="within")
+        out = np.full(len(self), None, dtype=object)
+        out[hits[0]] = names[hits[1]]
+        return out
+
+
+def misassigned_districts(
+    index: DistrictIndex, state_geoms: dict[str, shapely.Geometry]
+) -> list[tuple[str, str]]:
+    """
+    Returns (district key, state) for the districts lying in another state of
+    `state_geoms` than the one `state_of` names. Districts outside every state
+    polygon are not counted: the state maps keep one shape per state.
+    """
+    located = index.assign_states(state_geoms)
+    named = state_of(index.names)
+    wrong = np.array(
+        [s is not None and s != n for s, n in zip(located, named)], dtype=bool
+    )
+    return list(zip(index.names[wrong], located[wrong]))
+
+
+# -------------------------------------------------------------------
+# DISTRICT DEFICITS AND ROLLUPS
+# -------------------------------------------------------------------
+
+
+def load_district_table(path: str) -> pd.DataFrame:
+    if path.endswith((".xlsx", ".xls")):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
+
+
+def district_population(data: pd.DataFrame) -> pd.Series:
+    """
+    Returns the population of every district of a district table, indexed by
+    district key. Pure: no I/O.
+    """
+    keys = [district_key(s, d) for s, d in zip(data.iloc[:, 0], data.iloc[:, 1])]
+    population = pd.Series(
+        data[POPULATION_COLUMN].to_numpy(dtype=float), index=keys, name="population"
+    )
+    return population.groupby(level=0).first()
+
+
+def clean_district_data(data: pd.DataFrame) -> pd.Series:
+    """
+    Cleans a district table with `clean_data`, keyed by district instead of
+    state.
+    """
+    keys = [district_key(s, d) for s, d in zip(data.iloc[:, 0], data.iloc[:, 1])]
+    keyed = data.drop(columns=data.columns[:2])
+    keyed.insert(0, "states", keys)
+    return utils.clean_data(keyed)
+
+
+def rollup(
+    values: np.ndarray, weights: np.ndarray, groups: np.ndarray, n_groups: int
+) -> np.ndarray:
+    """
+    Weighted mean of `values` (districts, ...) into `n_groups` groups along the
+    first axis, with the group code of every district in `groups`. NaN values
+    are left out with their weight; groups without any weighted value are NaN.
+    Pure: no I/O.
+    """
+    flat = values.reshape(len(values), -1).astype(np.float64)
+    present = ~np.isnan(flat)
+    w = np.where(present, np.asarray(weights, dtype=np.float64)[:, None], 0.0)
+    # (groups, districts) membership matrix: one product sums every column
+    member = (groups[None, :] == np.arange(n_groups)[:, None]).astype(np.float64)
+    totals = member @ (w * np.where(present, flat, 0.0))
+    norms = member @ w
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = totals / norms
+    out[norms == 0] = np.nan
+    return out.reshape((n_groups,) + values.shape[1:])
+
+
+@traced("rollup_to_states")
+def rollup_to_states(cube: DeficitCube, population: pd.Series) -> DeficitCube:
+    """
+    Rolls a district cube up to a state cube, weighting every district by its
+    population. Districts without a population are left out.
+    """
+    weights = population.reindex(cube.states).fillna(0).to_numpy()
+    codes, states = pd.factorize(pd.Index(state_of(cube.states)), sort=True)
+    data = rollup(cube.data, weights, codes, len(states))
+    return DeficitCube(
+        data.astype(cube.data.dtype),
+        list(states),
+        cube.variables,
+        cube.cadres,
+        cube.years,
+        name=cube.name,
+    )
+
+
+if __name__ == "__main__":
+    shapefile_path = sys.argv[1] if len(sys.argv) > 1 else SHAPEFILE_PATH
+    index = DistrictIndex(load_district_geometries(shapefile_path))
+    counts = np.bincount(index.state_codes, minlength=len(index.state_names))
+    print(f"{len(index)} districts in {len(index.state_names)} states")
+    for state, n in zip(index.state_names, counts):
+        print(f"  {state}: {n}")
+
+    if len(sys.argv) > 2:
+        out_dir = sys.argv[3] if len(sys.argv) > 3 else TABLES_DIR
+        table = load_district_table(sys.argv[2])
+        cube = DeficitCube.from_series(clean_district_data(table))
+        states = rollup_to_states(cube, district_population(table))
+        for path in write_table(
+            states.to_series().unstack("cadres"), out_dir, "district_rollup"
+        ):
+            print(f"wrote {path}")
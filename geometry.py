@@ -0,0 +1,270 @@
+"""
+Compiled geometry store of the merged state polygons.
+
+`load_state_geometries` re-reads the Admin2 shapefile and redoes the
+Ladakh/Telangana merges on every call. This module does that once and writes:
+
+    {store_dir}/meta.json      state names, levels, source digest and path
+    {store_dir}/wkb.bin        WKB of every state at every simplification level
+    {store_dir}/offsets.npy    (levels, states + 1) byte offsets into wkb.bin
+    {store_dir}/centroids.npy  (states, 2) centroid x/y of the full geometry
+    {store_dir}/bounds.npy     (states, 4) minx/miny/maxx/maxy
+
+`wkb.bin` and the arrays are memory-mapped on load, so only the requested
+level is ever decoded. `GeometryStore.topology(level)` adds
+{store_dir}/topology-{level}.json, the TopoJSON the dashboard sends to the
+browser, on first use. Compiling a store removes the older stores of the
+same shapefile; stores of other shapefiles are evicted least recently used
+first beyond `cache.MAX_CACHE_BYTES`, like the cleaned cache.
+
+Usage:
+    python geometry.py [SHAPEFILE_PATH]
+"""
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import shapely
+
+import topology
+import utils
+from cache import MAX_CACHE_BYTES, file_digest
+from tracing import traced
+
+SHAPEFILE_PATH = "Documents/maps-master/States/Admin2"
+STORE_DIR = ".cache/geometry"
+# Simplification tolerances in degrees: "full" for the high-dpi PDFs,
+# "light" for the dashboard choropleth.
+LEVELS = {"full": 0.0, "medium": 0.005, "light": 0.02}
+STORE_FORMAT = 1
+
+
+def source_digest(shapefile_path: str, levels: dict = LEVELS) -> str:
+    """
+    Hashes the shapefile components, the merge code and the levels.
+    """
+    h = hashlib.sha256(f"format={STORE_FORMAT}".encode())
+    for path in sorted(glob.glob(f"{shapefile_path}.*")):
+        h.update(os.path.basename(path).encode())
+        h.update(file_digest(path).encode())
+    h.update(inspect.getsource(utils.load_state_geometries).encode())
+    h.update(repr(sorted(levels.items())).encode())
+    return h.hexdigest()[:32]
+
+
+def evict(store_dir: str = STORE_DIR, max_bytes: int = MAX_CACHE_BYTES) -> list[str]:
+    """
+    Removes least recently used stores until they fit in `max_bytes`. The
+    most recent store is always kept. Returns the removed paths.
+    """
+    if not os.path.isdir(store_dir):
+        return []
+    entries = []
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if os.path.exists(os.path.join(path, "meta.json")):
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.stat(path).st_mtime, size, path))
+    entries.sort(reverse=True)
+
+    removed, total = [], 0
+    for i, (_, size, path) in enumerate(entries):
+        total += size
+        if i > 0 and total > max_bytes:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+def _remove_superseded(store_dir: str, source: str, keep: str) -> None:
+    """
+    Removes the stores other than `keep` compiled from `source`, or from an
+    unrecorded source.
+    """
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if path != keep and meta.get("source", source) == source:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def compile_geometry_store(
+    shapefile_path: str,
+    store_dir: str,
+    levels: dict = LEVELS,
+    max_bytes: int = MAX_CACHE_BYTES,
+) -> str:
+    """
+    Loads and merges the state geometries once, simplifies them at every level
+    and writes the store atomically into {store_dir}/{digest}/, removing the
+    older stores of `shapefile_path` and evicting the others beyond
+    `max_bytes`. Returns the path of the compiled store.
+    """
+    digest = source_digest(shapefile_path, levels)
+    source = os.path.abspath(shapefile_path)
+    out_dir = os.path.join(store_dir, digest)
+    if os.path.exists(os.path.join(out_dir, "meta.json")):
+        os.utime(out_dir)  # mark as recently used for eviction
+        _remove_superseded(store_dir, source, out_dir)
+        return out_dir
+
+    state_geoms = utils.load_state_geometries(shapefile_path)
+    names = list(state_geoms.keys())
+    geoms = np.array([state_geoms[name] for name in names], dtype=object)
+
+    blobs, offsets = [], np.zeros((len(levels), len(names) + 1), dtype=np.int64)
+    position = 0
+    for i, tolerance in enumerate(levels.values()):
+        level_geoms = (
+            shapely.simplify(geoms, tolerance, preserve_topology=True)
+            if tolerance
+            else geoms
+        )
+        for j, wkb in enumerate(shapely.to_wkb(level_geoms)):
+            blobs.append(wkb)
+            offsets[i, j] = position
+            position += len(wkb)
+        offsets[i, -1] = position
+
+    centroids = shapely.get_coordinates(shapely.centroid(geoms))
+    bounds = shapely.bounds(geoms)
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=store_dir, suffix=".tmp")
+    try:
+        with open(os.path.join(tmp_dir, "wkb.bin"), "wb") as f:
+            f.writelines(blobs)
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+        np.save(os.path.join(tmp_dir, "bounds.npy"), bounds)
+        meta = {
+            "names": names,
+            "levels": list(levels),
+            "digest": digest,
+            "source": source,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _remove_superseded(store_dir, source, out_dir)
+    evict(store_dir, max_bytes)
+    return out_dir
+
+
+class GeometryStore:
+    """
+    Read-only view of a compiled store. Geometries are decoded per level on
+    first access; centroids and bounds are memory-mapped arrays.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.path = path
+        self.names: list[str] = meta["names"]
+        self.levels: list[str] = meta["levels"]
+        self._wkb = np.memmap(os.path.join(path, "wkb.bin"), dtype=np.uint8, mode="r")
+        self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.centroid_array = np.load(
+            os.path.join(path, "centroids.npy"), mmap_mode="r"
+        )
+        self.bounds_array = np.load(os.path.join(path, "bounds.npy"), mmap_mode="r")
+        self._decoded: dict[str, dict] = {}
+
+    def geometries(self, level: str = "full") -> dict[str, shapely.Geometry]:
+        """
+        Returns {state: geometry} at the given simplification level.
+        """
+        if level not in self._decoded:
+            offsets = self._offsets[self.levels.index(level)]
+            blobs = [
+                self._wkb[start:end].tobytes()
+                for start, end in zip(offsets[:-1], offsets[1:])
+            ]
+            self._decoded[level] = dict(zip(self.names, shapely.from_wkb(blobs)))
+        return self._decoded[level]
+
+    @property
+    def centroids(self) -> dict[str, tuple[float, float]]:
+        """
+        Returns {state: (x, y)} of the full-detail centroids.
+        """
+        return {
+            name: (float(x), float(y))
+            for name, (x, y) in zip(self.names, self.centroid_array)
+        }
+
+    @property
+    def bounds(self) -> dict[str, tuple[float, float, float, float]]:
+        """
+        Returns {state: (minx, miny, maxx, maxy)}.
+        """
+        return {
+            name: tuple(float(v) for v in b)
+            for name, b in zip(self.names, self.bounds_array)
+        }
+
+    def topology_path(self, level: str = "light") -> str:
+        """
+        Returns the path of the TopoJSON of `level`, building it on first use.
+        Arcs are simplified after the topology is built, so borders stay
+        shared at every level.
+        """
+        path = os.path.join(self.path, f"topology-{level}.json")
+        if not os.path.exists(path):
+            topo = topology.build_topology(
+                self.geometries("full"), tolerance=LEVELS[level]
+            )
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(topo, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        return path
+
+
+def open_geometry_store(
+    shapefile_path: str = SHAPEFILE_PATH, store_dir: str = STORE_DIR
+) -> GeometryStore:
+    """
+    Opens the compiled store of `shapefile_path`, compiling it first when the
+    shapefile or the merge code changed.
+    """
+    return GeometryStore(compile_geometry_store(shapefile_path, store_dir))
+
+
+@traced("load_geometries")
+def load_geometries(
+    shapefile_path: str = SHAPEFILE_PATH,
+    level: str = "full",
+    store_dir: str = STORE_DIR,
+) -> dict[str, shapely.Geometry]:
+    """
+    Drop-in replacement for `load_state_geometries` served from the store.
+    """
+    return open_geometry_store(shapefile_path, store_dir).geometries(level)
+
+
+if __name__ == "__main__":
+    path = compile_geometry_store(
+        sys.argv[1] if len(sys.argv) > 1 else SHAPEFILE_PATH, STORE_DIR
+    )
+    store = GeometryStore(path)
+    for level in store.levels:
+        n_coords = sum(
+            len(shapely.get_coordinates(g)) for g in store.geometries(level).values()
+        )
+        print(f"{level}: {len(store.names)} states, {n_coords} vertices")
@@ -1,6 +1,4 @@
-def main():
-    print("Hello from aaaq-hrh-deficit!")
-
+from AAAQ_plots_script import main
 
 if __name__ == "__main__":
     main()
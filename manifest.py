@@ -0,0 +1,107 @@
+"""
+Build manifest for the Results/ tree.
+
+The manifest maps every output path (relative to the results directory) to a
+fingerprint of the inputs the figure was drawn from. A figure is redrawn only
+when its fingerprint changed or the file is missing.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_NAME = ".manifest.json"
+
+
+def get_manifest_path(results_dir: str) -> str:
+    """
+    Constructs the path of the manifest, e.g. {results_dir}/.manifest.json
+    Pure: just returns a string.
+    """
+    return os.path.join(results_dir, MANIFEST_NAME)
+
+
+def load_manifest(path: str) -> dict[str, str]:
+    """
+    Reads the manifest; a missing or unreadable file is an empty manifest.
+    """
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+def save_manifest(path: str, entries: dict[str, str]) -> None:
+    """
+    Writes the manifest atomically.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f, indent=0, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def is_current(entries: dict[str, str], results_dir: str, out_path: str, fp: str):
+    """
+    True when `out_path` exists and was drawn from inputs with fingerprint `fp`.
+    """
+    key = os.path.relpath(out_path, results_dir)
+    return entries.get(key) == fp and os.path.exists(out_path)
+
+
+def record(entries: dict[str, str], results_dir: str, out_path: str, fp: str):
+    """
+    Stores the fingerprint of a freshly written `out_path`.
+    """
+    entries[os.path.relpath(out_path, results_dir)] = fp
+
+
+def fingerprint(*parts) -> str:
+    """
+    Hashes a mix of pandas objects, arrays, bytes and plain values (through
+    their repr) into a hex digest. Pure: no I/O.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.Series, pd.DataFrame)):
+            h.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            h.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, bytes):
+            h.update(part)
+        else:
+            h.update(repr(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def geometry_digest(state_geoms: dict) -> str:
+    """
+    Hashes the state names and the WKB of their geometries.
+    """
+    h = hashlib.sha256()
+    for state in sorted(state_geoms):
+        h.update(state.encode())
+        h.update(state_geoms[state].wkb)
+    return h.hexdigest()
+
+
+def source_digest(*objs, extra=()) -> str:
+    """
+    Hashes the source of the given functions plus any extra style values, so
+    edits to the drawing code invalidate the figures it produced.
+    """
+    return fingerprint(*(inspect.getsource(obj) for obj in objs), *extra)
@@ -0,0 +1,554 @@
+"""
+Batched projection of the deficit trajectories and the 2031 HRH requirement
+table (T1).
+
+Every state x variable x cadre series is fitted on the observed years (before
+`constants.PROJECTION_YEAR`) and extrapolated to the projection years in one
+array operation per scenario:
+
+    linear          least-squares line through the observed values
+    decadal_growth  1 - v (the density as a share of the threshold) keeps
+                    growing at its average decadal rate between the first and
+                    the last observed year
+    average_decadal_change, recent_decadal_change
+                    the workbook's extrapolation: v grows by |v| times the
+                    average or recent decadal change of T2 every decade
+
+`validate` compares the two decadal change scenarios with the workbook's
+extrapolation sheet, projecting the sheet's own 1981-2011 columns. The
+average differs where the workbook handles a decade differently:
+
+    undefined change  a change with a missing end or a zero start is left
+                      out of the average, which needs MIN_DECADES of them
+                      (results_tables.py); the workbook gives #DIV/0!
+    blank change      the workbook counts a blank change or average cell as
+                      0 (many ApD_cadre_mix rows)
+
+and both differ where a workbook formula uses the wrong cell:
+
+    formula slips     AvD_SDG 2031 (average) steps with the recent change;
+                      ApD_cadre_mix_IHME_UHC90 2021 (recent) uses the
+                      1991-2001 change instead of 2001-2011; the 1981-1991
+                      changes of ApD_cadre_mix_IHME_UHC90 and _IPHS use each
+                      other's columns. A cell counts as a slip only where
+                      the slipped formula, recomputed with the sheet's blank
+                      cells as 0, gives the workbook's value.
+
+Projecting the cleaned mastersheet also differs where its observed values do:
+it has no 1981 AsD or ApD_sex_mix, so their averages use two decades.
+
+T1 follows the workbook's requirement sheet: with population P, threshold
+thr (per 100,000) and projected indices,
+
+    total HRH needed               P / 1e5 * thr
+    additional HRH needed          P / 1e5 * thr * AvD
+    additional female HRH needed   P_female / 1e5 * thr * (ApD_sex + AvD_male - ApD_sex * AvD_male)
+    additional rural HRH needed    P_rural / 1e5 * thr * (AsD + AvD_urban - AsD * AvD_urban)
+    additional qualified HRH       P / 1e5 * thr * (QD + AvD - QD * AvD)
+
+An index a cadre has in no state (ApD_sex_mix of ANMs) counts as 0, as the
+workbook's blank cells do; other missing indices leave the measure missing,
+like its #DIV/0! cells. `validate` also recomputes the requirement sheet's
+measures from its own 2031 indices and compares them with its cells.
+
+Usage:
+    python projection.py [EXCEL_FILE] [OUT_DIR]
+    python projection.py validate [EXCEL_FILE]
+"""
+
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+import cache
+import constants as c
+from cube import DeficitCube
+from deficits import PER_POPULATION, THRESHOLD_SHEET
+from results_tables import TABLES_DIR, average_change, percent_change, write_table
+from tracing import traced
+from whatif import NORM_ALIASES
+
+SCENARIOS = (
+    "linear",
+    "decadal_growth",
+    "average_decadal_change",
+    "recent_decadal_change",
+)
+T1_YEAR = 2031
+T1_MEASURES = [
+    "total HRH needed",
+    "additional HRH needed",
+    "additional female HRH needed",
+    "additional rural HRH needed",
+    "additional qualified HRH needed",
+]
+
+
+def _fit_linear(values: np.ndarray, mask: np.ndarray, x: np.ndarray, targets):
+    """
+    Per-series least squares of `values` (..., years) on `x`, evaluated at
+    `targets`. Series with fewer than two observations give NaN.
+    """
+    w = mask.astype(float)
+    y = np.where(mask, values, 0.0)
+    n, sx, sy = w.sum(-1), (w * x).sum(-1), (w * y).sum(-1)
+    sxx, sxy = (w * x * x).sum(-1), (w * x * y).sum(-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+    slope[n < 2] = np.nan
+    return intercept[..., None] + slope[..., None] * np.asarray(targets, dtype=float)
+
+
+def _fit_decadal_growth(values: np.ndarray, mask: np.ndarray, x: np.ndarray, targets):
+    """
+    Extrapolates 1 - values at the average decadal growth rate between each
+    series' first and last observation. Series whose 1 - value is not positive
+    at both ends, or with fewer than two observations, give NaN.
+    """
+    first = mask.argmax(-1)
+    last = mask.shape[-1] - 1 - mask[..., ::-1].argmax(-1)
+    share = 1 - values
+    s0 = np.take_along_axis(share, first[..., None], -1)[..., 0]
+    s1 = np.take_along_axis(share, last[..., None], -1)[..., 0]
+    decades = (x[last] - x[first]) / 10
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = (s1 / s0) ** (1 / decades)
+    rate[(decades <= 0) | (s0 <= 0) | (s1 <= 0) | ~mask.any(-1)] = np.nan
+    ahead = (np.asarray(targets, dtype=float) - x[last][..., None]) / 10
+    return 1 - s1[..., None] * rate[..., None] ** ahead
+
+
+def _fit_decadal_change(values: np.ndarray, x: np.ndarray, targets, recent: bool):
+    """
+    Steps the last observed value forward by whole decades, each adding |v|
+    times the recent or average percentage change. Like the workbook's IFS,
+    a zero value gives NaN.
+    """
+    changes = percent_change(values)
+    rate = (changes[..., -1] if recent else average_change(changes)) / 100
+    return _step_decades(values[..., -1], [rate], x[-1], targets)
+
+
+def _step_decades(last: np.ndarray, rates: list, x_last: float, targets):
+    """
+    Steps `last` forward from `x_last` by whole decades, the n-th one adding
+    |v| times rates[n] (the last rate repeats). A zero value gives NaN.
+    """
+    value = np.where(last == 0, np.nan, last)
+    out = []
+    step = 0
+    for target in targets:
+        while x_last + 10 * step < target:
+            value = value + np.abs(value) * rates[min(step, len(rates) - 1)]
+            step += 1
+        out.append(value)
+    return np.stack(out, axis=-1)
+
+
+@traced("project")
+def project(
+    cube: DeficitCube, scenario: str, proj_year: int = c.PROJECTION_YEAR
+) -> DeficitCube:
+    """
+    Returns a cube whose years from `proj_year` on are replaced by the
+    `scenario` extrapolation of the earlier years. Observed years are kept.
+    """
+    years = np.asarray(cube.years, dtype=float)
+    observed = years < proj_year
+    targets = years[~observed]
+    values = cube.data[..., observed].astype(float)
+    mask = cube.present[..., observed]
+    if scenario == "linear":
+        projected = _fit_linear(values, mask, years[observed], targets)
+    elif scenario == "decadal_growth":
+        projected = _fit_decadal_growth(values, mask, years[observed], targets)
+    elif scenario in ("average_decadal_change", "recent_decadal_change"):
+        recent = scenario == "recent_decadal_change"
+        projected = _fit_decadal_change(values, years[observed], targets, recent)
+    else:
+        raise ValueError(f"unknown projection scenario {scenario!r}")
+
+    data = cube.data.copy()
+    data[..., ~observed] = projected
+    return DeficitCube(
+        data, cube.states, cube.variables, cube.cadres, cube.years, name=cube.name
+    )
+
+
+# -------------------------------------------------------------------
+# T1: NUMBER OF HRH NEEDED IN 2031
+# -------------------------------------------------------------------
+
+
+def load_requirements(excel_file: str) -> pd.DataFrame:
+    """
+    Reads the HLEG threshold and the 2031 populations per (states, cadres) from
+    the workbook's requirement sheet, with labels cleaned like `clean_data`.
+    """
+    sheet = pd.read_excel(excel_file, sheet_name=THRESHOLD_SHEET)
+    sheet["states"] = sheet["states"].str.lower().str.strip()
+    sheet["cadres"] = sheet["cadres"].str.lower()
+    columns = {
+        "HLEG_req_threshold": "threshold",
+        f"total_persons_pop_{T1_YEAR}": "population",
+        f"total_female_pop_{T1_YEAR}": "female_population",
+        f"rural_persons_pop_{T1_YEAR}": "rural_population",
+    }
+    requirements = sheet.dropna(subset=["states", "cadres"]).set_index(
+        ["states", "cadres"]
+    )[list(columns)]
+    return requirements.rename(columns=columns).astype(float)
+
+
+def _at(
+    cube: DeficitCube,
+    variable: str,
+    states,
+    cadres,
+    year: int,
+    blank_as_zero: bool = False,
+) -> np.ndarray:
+    """
+    Values of `variable` at `year` for aligned state/cadre label arrays, NaN
+    where a label is not in the cube. With `blank_as_zero`, cadres without the
+    variable in any state at `year` (ApD_sex_mix of ANMs) give 0, as the
+    workbook's blank cells do in its formulas; other missing values stay NaN,
+    like its #DIV/0! cells.
+    """
+    s = pd.Index(cube.states).get_indexer(states)
+    k = pd.Index(cube.cadres).get_indexer(cadres)
+    if variable not in cube.variable_pos or year not in cube.year_pos:
+        return np.full(len(s), np.nan)
+    v, y = cube.variable_pos[variable], cube.year_pos[year]
+    out = cube.data[s, v, k, y].astype(float)
+    if blank_as_zero:
+        blank = ~cube.present[:, v, :, y].any(axis=0)
+        out[blank[k] & (k >= 0)] = 0.0
+    out[(s < 0) | (k < 0)] = np.nan
+    return out
+
+
+def t1_table(
+    cubes: dict[str, DeficitCube],
+    requirements: pd.DataFrame,
+    norm: str = "HLEG",
+    year: int = T1_YEAR,
+) -> pd.DataFrame:
+    """
+    Builds T1: total and additional HRH needed in `year` per (state, cadre)
+    under every {scenario: cube}. Columns are (scenario, measure).
+    """
+    states = requirements.index.get_level_values("states")
+    cadres = requirements.index.get_level_values("cadres")
+    per_thr = requirements["threshold"].to_numpy() / PER_POPULATION
+    total = requirements["population"].to_numpy() * per_thr
+
+    def either(a, b):
+        return a + b - a * b
+
+    columns = {}
+    for scenario, cube in cubes.items():
+        at = {
+            v: _at(cube, v, states, cadres, year, blank_as_zero=True)
+            for v in ["AsD", "ApD_sex_mix", "QD"]
+        }
+        for prefix in ["AvD", "AvD_male", "AvD_urban"]:
+            at[prefix] = _at(
+                cube, f"{prefix}_{norm}", states, cadres, year, blank_as_zero=True
+            )
+        measures = [
+            total,
+            total * at["AvD"],
+            requirements["female_population"].to_numpy()
+            * per_thr
+            * either(at["ApD_sex_mix"], at["AvD_male"]),
+            requirements["rural_population"].to_numpy()
+            * per_thr
+            * either(at["AsD"], at["AvD_urban"]),
+            total * either(at["QD"], at["AvD"]),
+        ]
+        for measure, values in zip(T1_MEASURES, measures):
+            columns[(scenario, measure)] = values
+
+    table = pd.DataFrame(columns, index=requirements.index)
+    table.columns = pd.MultiIndex.from_tuples(table.columns, names=["scenario", ""])
+    return table
+
+
+def write_t1(table: pd.DataFrame, out_dir: str = TABLES_DIR) -> list[str]:
+    """
+    Writes T1 in every table format into `out_dir`. Returns the written paths.
+    """
+    return write_table(table.round(0), out_dir, f"T1_hrh_needed_{T1_YEAR}")
+
+
+# -------------------------------------------------------------------
+# VALIDATION AGAINST THE WORKBOOK'S EXTRAPOLATION SHEET
+# -------------------------------------------------------------------
+
+EXTRAPOLATION_SHEET = "Rough_deficit_indices_extrapola"
+_OBSERVED_COLUMN = re.compile(r"^(?P<variable>[A-Za-z].*)_(?P<year>\d{4})$")
+_CHANGE_COLUMN = re.compile(
+    r"^(?P<variable>.+)_(?P<period>\d{4}_\d{4}|average)_percent_decadal_change$"
+)
+_PROJECTED_COLUMN = re.compile(
+    r"^(?P<variable>.+)_(?P<year>\d{4})_using_(?P<rate>average|recent)"
+    r"_decadal_change_rate$"
+)
+
+
+def _canonical_variable(variable: str) -> str:
+    """
+    Spells the norm of a sheet header like the mastersheet variables
+    (ApD_cadre_mix_UHC_90 -> ApD_cadre_mix_IHME_UHC90). Pure: no I/O.
+    """
+    for alias, norm in NORM_ALIASES.items():
+        if variable.endswith(f"_{alias}"):
+            return variable[: -len(alias)] + norm
+    return variable
+
+
+def load_extrapolation_sheet(
+    excel_file: str,
+) -> tuple[pd.Series, pd.DataFrame, pd.Series]:
+    """
+    Reads the workbook's extrapolation sheet. Returns its observed values as a
+    (states, year, variable, cadres) series, its 2021/2031 cells with one
+    column per decadal change scenario indexed the same way, and which decadal
+    change cells of a (states, variable, cadres) series are blank, one column
+    per decade and the last for the average.
+    Error cells (#DIV/0!, #N/A) become NaN.
+    """
+    sheet = pd.read_excel(excel_file, sheet_name=EXTRAPOLATION_SHEET)
+    sheet["states"] = sheet["states"].str.lower().str.strip()
+    sheet["cadres"] = sheet["cadres"].str.lower().str.strip()
+    sheet = sheet.dropna(subset=["states", "cadres"])
+    sheet = sheet.drop_duplicates(["states", "cadres"]).set_index(["states", "cadres"])
+
+    observed, projected, blank = {}, {}, {}
+    for column in sheet.columns:
+        if m := _PROJECTED_COLUMN.match(column):
+            variable = _canonical_variable(m["variable"])
+            key = (f"{m['rate']}_decadal_change", variable, int(m["year"]))
+            projected[key] = sheet[column]
+        elif m := _CHANGE_COLUMN.match(column):
+            variable = _canonical_variable(m["variable"])
+            blank[(variable, m["period"])] = sheet[column].isna()
+        elif m := _OBSERVED_COLUMN.match(column):
+            observed[(m["variable"], int(m["year"]))] = sheet[column]
+
+    def long(columns: dict, names: list) -> pd.Series:
+        frame = pd.DataFrame(columns).apply(pd.to_numeric, errors="coerce")
+        frame.columns.names = names
+        return frame.stack(list(range(len(names))), future_stack=True)
+
+    levels = ["states", "year", "variable", "cadres"]
+    observed = long(observed, ["variable", "year"]).dropna().reorder_levels(levels)
+    projected = long(projected, ["scenario", "variable", "year"]).unstack("scenario")
+    projected = projected.reorder_levels(levels)
+    blank = pd.DataFrame(blank).rename_axis(columns=["variable", "period"])
+    blank = blank.stack("variable", future_stack=True)
+    blank = blank.reorder_levels(["states", "variable", "cadres"])
+    blank = blank.sort_index().sort_index(axis=1)
+    return observed.sort_index(), projected.sort_index(), blank
+
+
+def _workbook_formulas(
+    cube: DeficitCube, scenario: str, blank: np.ndarray
+) -> DeficitCube:
+    """
+    Projects `cube` with a decadal change scenario the way the workbook's
+    formulas compute it, slips included (see above). `blank` marks the change
+    cells the sheet leaves blank, (states, variables, cadres, decades), the
+    last decade standing for the average; they count as 0 and the average is
+    the plain mean of the three changes. Pure: no I/O.
+    """
+    years = np.asarray(cube.years, dtype=float)
+    observed = years < c.PROJECTION_YEAR
+    values = cube.data[..., observed].astype(float)
+    changes = percent_change(values)
+    uhc90 = cube.variable_pos.get("ApD_cadre_mix_IHME_UHC90")
+    iphs = cube.variable_pos.get("ApD_cadre_mix_IPHS")
+    sdg = cube.variable_pos.get("AvD_SDG")
+    if uhc90 is not None and iphs is not None:
+        # both 1981-1991 changes read the IPHS 1981 and the UHC90 1991 cells
+        ends = np.stack([values[:, iphs, :, 0], values[:, uhc90, :, 1]], axis=-1)
+        cross = percent_change(ends)[..., 0]
+        changes[:, uhc90, :, 0] = changes[:, iphs, :, 0] = cross
+    changes[blank[..., :-1]] = 0.0
+    recent = changes[..., -1] / 100
+    if scenario == "recent_decadal_change":
+        # UHC90's 2021 steps with its 1991-2001 change, 2031 with the right one
+        rates = [recent.copy(), recent]
+        if uhc90 is not None:
+            rates[0][:, uhc90] = changes[:, uhc90, :, -2] / 100
+    else:
+        average = np.where(blank[..., -1], 0.0, changes.mean(-1)) / 100
+        # AvD_SDG's 2031 steps with the recent change
+        rates = [average, average.copy()]
+        if sdg is not None:
+            rates[1][:, sdg] = recent[:, sdg]
+
+    data = cube.data.copy()
+    last, targets = years[observed][-1], years[~observed]
+    data[..., ~observed] = _step_decades(values[..., -1], rates, last, targets)
+    return DeficitCube(
+        data, cube.states, cube.variables, cube.cadres, cube.years, name=cube.name
+    )
+
+
+@traced("validate_projection")
+def validate(excel_file: str, rtol: float = 1e-6) -> pd.DataFrame:
+    """
+    Projects the observed columns of the extrapolation sheet with the decadal
+    change scenarios and compares them with the sheet's 2021/2031 cells.
+    Returns a frame per (scenario, variable) with the compared cells (where
+    either side has a value), the mismatches, the mismatches explained by a
+    known difference (an undefined change, a blank change cell or a formula
+    slip the cell's value reproduces) and the largest absolute difference.
+    """
+    observed, projected, blank = load_extrapolation_sheet(excel_file)
+    cube = DeficitCube.from_series(observed, dtype=np.float64)
+    years = sorted(set(cube.years) | set(projected.index.unique("year")))
+    cube = cube.reindex(cube.states, cube.variables, cube.cadres, years)
+    y = [cube.year_pos[year] for year in years if year < c.PROJECTION_YEAR]
+    # series with a change we leave out of the average (missing end, zero start)
+    undefined = np.isnan(percent_change(cube.data[..., y])).any(-1)
+    blank_cells = np.zeros(cube.data.shape[:3] + (blank.shape[1],), dtype=bool)
+    for (state, variable, cadre), row in blank.iterrows():
+        if (
+            state in cube.state_pos
+            and variable in cube.variable_pos
+            and cadre in cube.cadre_pos
+        ):
+            pos = cube.state_pos[state], cube.variable_pos[variable]
+            blank_cells[pos[0], pos[1], cube.cadre_pos[cadre]] = row.to_numpy()
+
+    reports = []
+    for scenario in projected.columns:
+        joined = pd.concat(
+            [
+                project(cube, scenario).to_series().rename("ours"),
+                projected[scenario].rename("workbook"),
+            ],
+            axis=1,
+            join="inner",
+        )
+        joined = joined[joined.notna().any(axis=1)]
+        formulas = _workbook_formulas(cube, scenario, blank_cells).to_series()
+        slipped = formulas.reindex(joined.index).to_numpy()
+        index = joined.index
+        states = index.get_level_values("states")
+        variables = index.get_level_values("variable")
+        cadres = index.get_level_values("cadres")
+
+        close = np.isclose(joined["ours"], joined["workbook"], rtol=rtol)
+        mismatch = ~close & ~joined.isna().all(axis=1).to_numpy()
+        gap = undefined[
+            [cube.state_pos[s] for s in states],
+            [cube.variable_pos[v] for v in variables],
+            [cube.cadre_pos[k] for k in cadres],
+        ]
+        is_blank = (
+            blank.reindex(pd.MultiIndex.from_arrays([states, variables, cadres]))
+            .fillna(False)
+            .to_numpy(dtype=bool)
+            .any(axis=1)
+        )
+        # a cell whose slipped formula, reproduced, gives the workbook's value
+        slip = np.isclose(slipped, joined["workbook"], rtol=rtol)
+        # the average is the one rate built from several changes
+        averaged = scenario == "average_decadal_change"
+        frame = pd.DataFrame(
+            {
+                "cells": 1,
+                "mismatches": mismatch,
+                "undefined_change": mismatch & gap & averaged,
+                "blank_change": mismatch & ~gap & is_blank & averaged,
+                "workbook_slip": mismatch & ~((gap | is_blank) & averaged) & slip,
+                "max_abs_diff": (joined["ours"] - joined["workbook"]).abs(),
+            },
+            index=index,
+        )
+        report = frame.groupby(level="variable").agg(
+            dict.fromkeys(frame.columns[:-1], "sum") | {"max_abs_diff": "max"}
+        )
+        reports.append(pd.concat({scenario: report}, names=["scenario"]))
+    return pd.concat(reports)
+
+
+@traced("validate_t1")
+def validate_t1(excel_file: str, rtol: float = 1e-9) -> pd.DataFrame:
+    """
+    Recomputes the measures of the workbook's requirement sheet with
+    `t1_table` from the sheet's own 2031 indices and compares them with its
+    cells. Returns a frame per measure with the compared cells (where either
+    side has a value), the mismatches and the largest absolute difference.
+    """
+    sheet = pd.read_excel(excel_file, sheet_name=THRESHOLD_SHEET)
+    sheet["states"] = sheet["states"].str.lower().str.strip()
+    sheet["cadres"] = sheet["cadres"].str.lower()
+    sheet = sheet.dropna(subset=["states", "cadres"])
+    sheet = sheet.drop_duplicates(["states", "cadres"]).set_index(["states", "cadres"])
+
+    indices = {}
+    for column in sheet.columns:
+        m = _OBSERVED_COLUMN.match(column)
+        if m and int(m["year"]) == T1_YEAR and "_pop_" not in column:
+            indices[(m["variable"], T1_YEAR)] = sheet[column]
+    indices = pd.DataFrame(indices).apply(pd.to_numeric, errors="coerce")
+    indices.columns.names = ["variable", "year"]
+    series = indices.stack([0, 1], future_stack=True).dropna()
+    series = series.reorder_levels(["states", "year", "variable", "cadres"])
+    cube = DeficitCube.from_series(series.sort_index(), dtype=np.float64)
+
+    table = t1_table({"workbook": cube}, load_requirements(excel_file))["workbook"]
+    rows = []
+    for measure in T1_MEASURES:
+        column = f"{measure} in {T1_YEAR}"
+        if column not in sheet.columns:
+            continue
+        ours = table[measure]
+        workbook = pd.to_numeric(sheet[column], errors="coerce").reindex(ours.index)
+        compared = ours.notna() | workbook.notna()
+        close = np.isclose(ours, workbook, rtol=rtol)
+        rows.append(
+            {
+                "measure": measure,
+                "cells": int(compared.sum()),
+                "mismatches": int((compared & ~close).sum()),
+                "max_abs_diff": (ours - workbook).abs().max(),
+            }
+        )
+    return pd.DataFrame(rows).set_index("measure")
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["validate"]:
+    excel_file = sys.argv[2] if len(sys.argv) > 2 else cache.EXCEL_FILE
+    report = validate(excel_file)
+    print(report.to_string())
+    explained = report[["undefined_change", "blank_change", "workbook_slip"]]
+    unexplained = report["mismatches"] - explained.sum(axis=1)
+    print(
+        f"{report['mismatches'].sum()} of {report['cells'].sum()} cells differ, "
+        f"{unexplained.sum()} not explained by a known workbook difference"
+    )
+    t1_report = validate_t1(excel_file)
+    print(t1_report.to_string())
+    print(
+        f"T1: {t1_report['mismatches'].sum()} of {t1_report['cells'].sum()} "
+        "cells differ from the requirement sheet"
+    )
+    sys.exit(1 if unexplained.any() or t1_report["mismatches"].any() else 0)
+elif __name__ == "__main__":
+    excel_file = sys.argv[1] if len(sys.argv) > 1 else cache.EXCEL_FILE
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else TABLES_DIR
+    # published tables keep the mastersheet's float64 values
+    cube = DeficitCube.from_series(cache.load_cleaned(excel_file), dtype=np.float64)
+    cubes = {"mastersheet": cube}
+    cubes.update({scenario: project(cube, scenario) for scenario in SCENARIOS})
+    for path in write_t1(t1_table(cubes, load_requirements(excel_file)), out_dir):
+        print(f"wrote {path}")
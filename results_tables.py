@@ -0,0 +1,138 @@
+"""
+Results tables computed from the cleaned series instead of the workbook.
+
+T2 holds the decadal percentage change of every variable per state and cadre,
+as in the workbook's extrapolation sheet:
+
+    change over a decade     (v_t - v_{t-10}) / |v_{t-10}| * 100
+    recent decadal change    the change over the last observed decade
+    average decadal change   the mean change over the observed decades
+
+Changes from a zero value are NaN like the workbook's #DIV/0! cells. A decade
+with a missing end is left out of the average, which needs at least
+MIN_DECADES changes; the workbook is not consistent there (see
+projection.py). The header is the change, with the cadres as columns below
+it.
+
+Usage:
+    python results_tables.py [EXCEL_FILE] [OUT_DIR]
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import cache
+import constants as c
+from cube import DeficitCube
+from tracing import traced
+
+TABLES_DIR = "Results/tables"
+TABLE_FORMATS = ("parquet", "csv", "xlsx")
+# Decadal changes an average needs; fewer give NaN
+MIN_DECADES = 2
+
+
+def observed_years(cube: DeficitCube, proj_year: int = c.PROJECTION_YEAR) -> list[int]:
+    return [y for y in cube.years if y < proj_year]
+
+
+def percent_change(values: np.ndarray) -> np.ndarray:
+    """
+    Percentage change between consecutive entries of the last axis, relative
+    to the magnitude of the earlier one. Pure: no I/O.
+    """
+    prev, curr = values[..., :-1], values[..., 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (curr - prev) / np.abs(prev) * 100
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def average_change(changes: np.ndarray, min_decades: int = MIN_DECADES) -> np.ndarray:
+    """
+    Mean of the decadal changes on the last axis, leaving NaN changes out.
+    Series with fewer than `min_decades` changes give NaN. Pure: no I/O.
+    """
+    counts = (~np.isnan(changes)).sum(-1)
+    total = np.nansum(changes, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / counts
+    mean[counts < min_decades] = np.nan
+    return mean
+
+
+@traced("decadal_change")
+def decadal_change(
+    cube: DeficitCube, proj_year: int = c.PROJECTION_YEAR
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the recent and average decadal percentage change over the observed
+    years, each (states, variables, cadres).
+    """
+    years = observed_years(cube, proj_year)
+    y = [cube.year_pos[year] for year in years]
+    changes = percent_change(cube.data[..., y].astype(float))
+    return changes[..., -1], average_change(changes)
+
+
+def t2_table(cube: DeficitCube, proj_year: int = c.PROJECTION_YEAR) -> pd.DataFrame:
+    """
+    Builds T2: rows (variable, states), columns (decadal change, cadres).
+    Rows without any value are dropped.
+    """
+    years = observed_years(cube, proj_year)
+    recent, average = decadal_change(cube, proj_year)
+    headers = [
+        f"recent decadal change {years[-2]}-{years[-1]} (%)",
+        f"average decadal change {years[0]}-{years[-1]} (%)",
+    ]
+    # (states, variables, cadres) -> (variables * states, cadres) per change
+    blocks = [
+        values.transpose(1, 0, 2).reshape(-1, len(cube.cadres))
+        for values in (recent, average)
+    ]
+    table = pd.DataFrame(
+        np.hstack(blocks),
+        index=pd.MultiIndex.from_product(
+            [cube.variables, cube.states], names=["variable", "states"]
+        ),
+        columns=pd.MultiIndex.from_product(
+            [headers, cube.cadres], names=["decadal change", "cadres"]
+        ),
+    )
+    return table.dropna(how="all")
+
+
+def write_table(
+    table: pd.DataFrame, out_dir: str, name: str, formats=TABLE_FORMATS
+) -> list[str]:
+    """
+    Writes `table` as {out_dir}/{name}.{format} for every format, keeping the
+    multi-level header. Returns the written paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        if fmt == "parquet":
+            table.to_parquet(path)
+        elif fmt == "csv":
+            table.to_csv(path)
+        elif fmt == "xlsx":
+            table.to_excel(path, sheet_name=name[:31])
+        else:
+            raise ValueError(f"unknown table format {fmt!r}")
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    excel_file = sys.argv[1] if len(sys.argv) > 1 else cache.EXCEL_FILE
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else TABLES_DIR
+    # published tables keep the mastersheet's float64 values
+    cube = DeficitCube.from_series(cache.load_cleaned(excel_file), dtype=np.float64)
+    for path in write_table(t2_table(cube), out_dir, "T2_decadal_change"):
+        print(f"wrote {path}")
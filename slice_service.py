@@ -0,0 +1,311 @@
+"""
+Local HTTP service serving deficit slices as JSON, for embedding charts in
+other tools without a Streamlit session per viewer.
+
+    GET /line/{state}/{variable}          cadre series of one state/variable
+    GET /map/{variable}/{year}/{cadre}    one value per state
+    GET /index                            every servable slice path
+
+Path segments are URL-encoded labels as in the cleaned series (lowercase
+states and cadres). Every response body, its gzip encoding and their ETags
+(the gzip one with a "-gz" suffix) are built once at startup, so a request is
+a dictionary lookup; clients that send If-None-Match get 304 Not Modified.
+Restart the service to pick up a changed mastersheet.
+
+Usage:
+    python slice_service.py serve [--excel-file FILE] [--port 8765]
+    python slice_service.py load-test [--url http://127.0.0.1:8765] [--requests 2000]
+"""
+
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+
+import numpy as np
+
+import constants as c
+from cache import EXCEL_FILE, load_cleaned
+from cube import LINE_BY, MAP_BY, DeficitCube
+from tracing import traced
+from utils import determine_cadre_intersection
+
+HOST = "127.0.0.1"
+PORT = 8765
+# float32 cells carry about 7 significant digits
+DECIMALS = 6
+
+
+@dataclass(frozen=True)
+class Response:
+    body: bytes
+    gzipped: bytes
+    etag: str
+    gzip_etag: str
+
+
+def make_response(payload: dict) -> Response:
+    """
+    Serializes `payload` as compact JSON with its gzip encoding and a strong
+    ETag for each representation. Pure: no I/O.
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return Response(body, gzip.compress(body, mtime=0), f'"{digest}"', f'"{digest}-gz"')
+
+
+def _values(array: np.ndarray) -> list:
+    """
+    Rounded floats with None for missing cells. Pure: no I/O.
+    """
+    return [None if np.isnan(v) else round(float(v), DECIMALS) for v in array]
+
+
+def line_payload(cube: DeficitCube, state: str, variable: str) -> dict:
+    """
+    The (state, variable) slice: one value per year for every cadre the line
+    plots show, None where the mastersheet has no value.
+    """
+    group = cube.line_group(state, variable)
+    cadres = determine_cadre_intersection(variable, group, c.CADRES_OF_INTEREST)
+    values = cube.by_state_var(state, variable)  # (cadres, years)
+    return {
+        "state": state,
+        "variable": variable,
+        "label": c.VARNAME_MAPPING.get(variable, variable),
+        "years": cube.years,
+        "projection_year": c.PROJECTION_YEAR,
+        "cadres": {k: _values(values[cube.cadre_pos[k]]) for k in sorted(cadres)},
+    }
+
+
+def map_payload(cube: DeficitCube, variable: str, year: int, cadre: str) -> dict:
+    """
+    The (variable, year, cadre) slice: parallel lists of states and values.
+    """
+    group = cube.map_group(variable, year, cadre)
+    return {
+        "variable": variable,
+        "year": year,
+        "cadre": cadre,
+        "label": c.VARNAME_MAPPING.get(variable, variable),
+        "states": group.index.get_level_values("states").tolist(),
+        "values": _values(group.to_numpy()),
+    }
+
+
+def slice_path(kind: str, key: tuple) -> str:
+    return "/" + "/".join([kind, *(quote(str(part), safe="") for part in key)])
+
+
+def slice_path_of(request_path: str) -> str:
+    """
+    Normalizes a request path to the key form of `slice_path` (decoded, then
+    re-encoded the same way). Pure: no I/O.
+    """
+    parts = [unquote(p) for p in urlsplit(request_path).path.split("/") if p]
+    return "/" + "/".join(quote(p, safe="") for p in parts)
+
+
+def _etags(header: str) -> set[str]:
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def accepts_gzip(header: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows gzip: listed (or matched by "*"
+    when not listed) with a q-value above 0, so "gzip;q=0" turns it off.
+    Pure: no I/O.
+    """
+    q = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        q[coding.lower()] = weight
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in q:
+            return q[coding] > 0
+    return False
+
+
+@traced("build_responses")
+def build_responses(cube: DeficitCube) -> dict[str, Response]:
+    """
+    Precomputes the response of every non-empty line and map slice, plus the
+    index, keyed by request path.
+    """
+    responses = {}
+    for key in cube.group_keys(LINE_BY):
+        responses[slice_path("line", key)] = make_response(line_payload(cube, *key))
+    for key in cube.group_keys(MAP_BY):
+        responses[slice_path("map", key)] = make_response(map_payload(cube, *key))
+    responses["/index"] = make_response({"paths": sorted(responses)})
+    return responses
+
+
+class SliceHandler(BaseHTTPRequestHandler):
+    """
+    Serves the precomputed responses of `server.responses`.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in two writes; without this, keep-alive
+    # clients wait for the delayed ACK on every request
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path = slice_path_of(self.path)
+        use_gzip = accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        response = self.server.responses.get(path)
+        if response is None:
+            error = make_response({"error": f"no slice at {path}"})
+            self._send(404, error, use_gzip)
+            return
+        etag = response.gzip_etag if use_gzip else response.etag
+        if etag in _etags(self.headers.get("If-None-Match", "")):
+            self._send(304, response, use_gzip, body=False)
+            return
+        self._send(200, response, use_gzip)
+
+    def _send(self, status: int, response: Response, use_gzip: bool, body: bool = True):
+        data = response.gzipped if use_gzip else response.body
+        self.send_response(status)
+        self.send_header("ETag", response.gzip_etag if use_gzip else response.etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if body:
+            self.send_header("Content-Type", "application/json")
+            if use_gzip:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(cube: DeficitCube, host: str = HOST, port: int = PORT):
+    """
+    Returns a threading HTTP server with the responses of `cube` built.
+    """
+    server = ThreadingHTTPServer((host, port), SliceHandler)
+    server.daemon_threads = True
+    server.responses = build_responses(cube)
+    return server
+
+
+# -------------------------------------------------------------------
+# LOAD TEST CLIENT
+# -------------------------------------------------------------------
+
+
+def load_test(
+    url: str, n_requests: int, concurrency: int, revalidate: float, seed: int = 0
+) -> dict:
+    """
+    Fetches random slices from a running service on `concurrency` keep-alive
+    connections. A `revalidate` share of the requests send the ETag of an
+    earlier response. Returns request counts and latency percentiles in ms.
+    """
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    conn.request("GET", "/index", headers={"Accept-Encoding": "gzip"})
+    paths = json.loads(gzip.decompress(conn.getresponse().read()))["paths"]
+    conn.close()
+
+    rng = random.Random(seed)
+    plan = [(rng.choice(paths), rng.random() < revalidate) for _ in range(n_requests)]
+    etags: dict[str, str] = {}
+    local = threading.local()
+
+    def fetch(item):
+        path, conditional = item
+        if not hasattr(local, "conn"):
+            local.conn = http.client.HTTPConnection(parts.hostname, parts.port)
+        headers = {"Accept-Encoding": "gzip"}
+        if conditional and path in etags:
+            headers["If-None-Match"] = etags[path]
+        start = time.perf_counter()
+        local.conn.request("GET", path, headers=headers)
+        response = local.conn.getresponse()
+        size = len(response.read())
+        elapsed = time.perf_counter() - start
+        etags[path] = response.getheader("ETag")
+        return response.status, size, elapsed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(fetch, plan))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(r[2] * 1000 for r in results)
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        "requests": n_requests,
+        "statuses": statuses,
+        "bytes": sum(r[1] for r in results),
+        "requests_per_s": n_requests / wall,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(0.99 * (len(latencies) - 1))],
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="serve the slices of a mastersheet")
+    serve.add_argument("--excel-file", default=EXCEL_FILE)
+    serve.add_argument("--host", default=HOST)
+    serve.add_argument("--port", type=int, default=PORT)
+    test = sub.add_parser("load-test", help="measure a running service")
+    test.add_argument("--url", default=f"http://{HOST}:{PORT}")
+    test.add_argument("--requests", type=int, default=2000)
+    test.add_argument("--concurrency", type=int, default=8)
+    test.add_argument(
+        "--revalidate",
+        type=float,
+        default=0.5,
+        help="share of requests sending If-None-Match",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        cube = DeficitCube.from_series(load_cleaned(args.excel_file))
+        server = make_server(cube, args.host, args.port)
+        print(
+            f"serving {len(server.responses)} slices on "
+            f"http://{args.host}:{args.port}",
+            file=sys.stderr,
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    elif args.command == "load-test":
+        report = load_test(args.url, args.requests, args.concurrency, args.revalidate)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
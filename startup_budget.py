@@ -0,0 +1,152 @@
+"""
+Cold-start import budget of the plot script and the dashboard.
+
+Imports every entry point in a fresh interpreter under `python -X importtime`,
+several times, and checks two budgets per entry point:
+
+    modules   packages the entry point must not import at startup; they are
+              imported by the code paths that need them
+    time      the median cumulative import time of the entry module, in ms
+
+Exits with status 1 when any budget is exceeded, so a change that makes the
+batch jobs or the dashboard pods start slower fails the check. The time
+budgets were set on a single core with a warm page cache; use --scale on
+slower machines.
+
+Usage:
+    python startup_budget.py [--runs 5] [--scale 1.0] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Budget:
+    ms: float
+    forbidden: tuple[str, ...]
+
+
+# Measured medians with lazy imports: utils 570 ms (pandas), the plot script
+# 1050 ms (pandas, pyplot) and the dashboard 810 ms (streamlit, pandas,
+# shapely). Eager imports took utils to 860 ms and the plot script to 1540 ms.
+BUDGETS = {
+    "utils": Budget(750, ("openpyxl", "shapefile", "shapely", "cartopy")),
+    "AAAQ_plots_script": Budget(
+        1350,
+        (
+            "cartopy",
+            "shapely",
+            "shapefile",
+            "openpyxl",
+            "geopandas",
+            "matplotlib.backends.backend_pdf",
+        ),
+    ),
+    "dashboard": Budget(
+        1100,
+        (
+            "altair",
+            "folium",
+            "streamlit_folium",
+            "branca",
+            "geopandas",
+            "cartopy",
+            "openpyxl",
+            "matplotlib",
+        ),
+    ),
+}
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """
+    Returns {module: cumulative import time in us} from `-X importtime`
+    output. Pure: no I/O.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def measure(module: str, runs: int) -> tuple[float, set[str]]:
+    """
+    Imports `module` in `runs` fresh interpreters. Returns the median
+    cumulative import time in ms and the modules imported on the way.
+    """
+    durations, modules = [], set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if result.returncode:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        times = parse_importtime(result.stderr)
+        durations.append(times[module] / 1000)
+        modules |= times.keys()
+    return statistics.median(durations), modules
+
+
+def check(budgets: dict, runs: int, scale: float) -> list[dict]:
+    """
+    Measures every entry point against its budget. Returns one report per
+    entry point; `ok` is False when either budget is exceeded.
+    """
+    reports = []
+    for module, budget in budgets.items():
+        ms, modules = measure(module, runs)
+        imported = sorted(
+            name
+            for name in budget.forbidden
+            if any(m == name or m.startswith(name + ".") for m in modules)
+        )
+        limit = budget.ms * scale
+        reports.append(
+            {
+                "module": module,
+                "ms": round(ms, 1),
+                "budget_ms": limit,
+                "forbidden_imports": imported,
+                "ok": ms <= limit and not imported,
+            }
+        )
+    return reports
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="multiplier of the time budgets"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON reports")
+    args = parser.parse_args(argv)
+
+    reports = check(BUDGETS, args.runs, args.scale)
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for r in reports:
+            status = "ok" if r["ok"] else "FAIL"
+            print(
+                f"{status:4} {r['module']}: {r['ms']:.0f} ms (budget {r['budget_ms']:.0f} ms)"
+            )
+            if r["forbidden_imports"]:
+                print(f"     imports {', '.join(r['forbidden_imports'])} at startup")
+    sys.exit(0 if all(r["ok"] for r in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
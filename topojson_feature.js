@@ -0,0 +1,61 @@
+// Minimal TopoJSON decoder for the dashboard choropleth, served from the
+// static directory next to the topology (see data_service.publish_script).
+// Implements topojson.feature of topojson-client for the Polygon and
+// MultiPolygon objects topology.py writes: quantized, delta-encoded arcs.
+(function (root) {
+    "use strict";
+
+    function decodeArcs(topology) {
+        var t = topology.transform;
+        return topology.arcs.map(function (arc) {
+            if (!t) {
+                return arc.map(function (p) { return p.slice(); });
+            }
+            var x = 0, y = 0;
+            return arc.map(function (p) {
+                x += p[0];
+                y += p[1];
+                return [x * t.scale[0] + t.translate[0], y * t.scale[1] + t.translate[1]];
+            });
+        });
+    }
+
+    function feature(topology, object) {
+        var arcs = decodeArcs(topology);
+
+        function ring(ids) {
+            var points = [];
+            ids.forEach(function (i, k) {
+                var arc = i < 0 ? arcs[~i].slice().reverse() : arcs[i];
+                // consecutive arcs share their end point
+                points.push.apply(points, k ? arc.slice(1) : arc);
+            });
+            while (points.length < 4) {
+                points.push(points[0]);
+            }
+            return points;
+        }
+
+        function geometry(o) {
+            var coordinates = null;
+            if (o.type === "Polygon") {
+                coordinates = o.arcs.map(ring);
+            } else if (o.type === "MultiPolygon") {
+                coordinates = o.arcs.map(function (p) { return p.map(ring); });
+            }
+            return {
+                type: "Feature",
+                id: o.id,
+                properties: o.properties || {},
+                geometry: coordinates && {type: o.type, coordinates: coordinates},
+            };
+        }
+
+        if (object.type === "GeometryCollection") {
+            return {type: "FeatureCollection", features: object.geometries.map(geometry)};
+        }
+        return geometry(object);
+    }
+
+    root.topojson = {feature: feature};
+})(this);
@@ -0,0 +1,204 @@
+"""
+TopoJSON encoding of the state polygons for the dashboard choropleth.
+
+Borders shared by two states are stored once as an arc, coordinates are
+quantized to an integer grid and delta-encoded, and arcs are simplified after
+the topology is built, so neighbouring states keep identical borders at any
+tolerance. The browser decodes the result with topojson-client.
+
+Junctions (points where rings stop running alongside each other) are found
+with one sort over all ring vertices; rings are then cut at their junctions
+and equal arcs, in either direction, are stored once.
+"""
+
+import numpy as np
+import shapely
+
+OBJECT_NAME = "states"
+QUANTIZATION = 100_000
+
+
+def _polygons(geom) -> list:
+    return list(geom.geoms) if hasattr(geom, "geoms") else [geom]
+
+
+def _rings(polygon) -> list:
+    return [polygon.exterior, *polygon.interiors]
+
+
+def _quantize(coords: np.ndarray, translate, scale) -> np.ndarray:
+    """
+    Integer grid points of a closed ring, without the closing point and
+    without consecutive duplicates. Pure: no I/O.
+    """
+    points = np.round((coords[:-1, :2] - translate) / scale).astype(np.int64)
+    keep = np.any(points != np.roll(points, 1, axis=0), axis=1)
+    keep[0] |= len(points) == 1 or not keep.any()
+    return points[keep]
+
+
+def find_junctions(rings: list[np.ndarray]) -> set[tuple[int, int]]:
+    """
+    Returns the grid points of `rings` where two rings meet and part: points
+    seen with more than one (unordered) pair of neighbours. Pure: no I/O.
+    """
+    points = np.concatenate(rings)
+    prev = np.concatenate([np.roll(r, 1, axis=0) for r in rings])
+    nxt = np.concatenate([np.roll(r, -1, axis=0) for r in rings])
+    # order each neighbour pair so that a ring and its reverse agree
+    swap = (prev[:, 0] > nxt[:, 0]) | (
+        (prev[:, 0] == nxt[:, 0]) & (prev[:, 1] > nxt[:, 1])
+    )
+    a = np.where(swap[:, None], nxt, prev)
+    b = np.where(swap[:, None], prev, nxt)
+    rows = np.unique(np.hstack([points, a, b]), axis=0)
+    pts, counts = np.unique(rows[:, :2], axis=0, return_counts=True)
+    return set(map(tuple, pts[counts > 1].tolist()))
+
+
+def _cut(ring: np.ndarray, junctions: set) -> list[np.ndarray]:
+    """
+    Splits a ring into open arcs from junction to junction. A ring without
+    junctions becomes one closed arc starting at its smallest point, so equal
+    rings produce equal arcs. Pure: no I/O.
+    """
+    at = [i for i, p in enumerate(map(tuple, ring.tolist())) if p in junctions]
+    if not at:
+        start = int(np.lexsort((ring[:, 1], ring[:, 0]))[0])
+        ring = np.roll(ring, -start, axis=0)
+        return [np.vstack([ring, ring[:1]])]
+    ring = np.roll(ring, -at[0], axis=0)
+    cuts = [i - at[0] for i in at] + [len(ring)]
+    closed = np.vstack([ring, ring[:1]])
+    return [closed[s : e + 1] for s, e in zip(cuts[:-1], cuts[1:])]
+
+
+def _simplify(arc: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Douglas-Peucker on one arc in grid units, keeping its end points and at
+    least a triangle for closed arcs. Pure: no I/O.
+    """
+    if tolerance <= 0 or len(arc) <= 2:
+        return arc
+    simple = shapely.get_coordinates(
+        shapely.simplify(shapely.linestrings(arc), tolerance)
+    )
+    closed = np.array_equal(arc[0], arc[-1])
+    if closed and len(simple) < 4:
+        return arc
+    return np.round(simple).astype(np.int64)
+
+
+def build_topology(
+    geoms: dict,
+    tolerance: float = 0.0,
+    quantization: int = QUANTIZATION,
+) -> dict:
+    """
+    Encodes {name: Polygon | MultiPolygon} as a TopoJSON topology with one
+    GeometryCollection `states` whose features have id = name. `tolerance`
+    simplifies the shared arcs, in degrees.
+    """
+    names = list(geoms)
+    minx, miny, maxx, maxy = shapely.total_bounds(list(geoms.values()))
+    translate = np.array([minx, miny])
+    scale = np.array(
+        [(maxx - minx) / (quantization - 1), (maxy - miny) / (quantization - 1)]
+    )
+    scale[scale == 0] = 1
+
+    # name -> polygons -> rings of grid points
+    shapes = [
+        [
+            [
+                _quantize(shapely.get_coordinates(r), translate, scale)
+                for r in _rings(polygon)
+            ]
+            for polygon in _polygons(geoms[name])
+        ]
+        for name in names
+    ]
+    shapes = [
+        [[r for r in rings if len(r) >= 3] for rings in polygons] for polygons in shapes
+    ]
+    all_rings = [r for polygons in shapes for rings in polygons for r in rings]
+    junctions = find_junctions(all_rings) if all_rings else set()
+
+    arcs: list[np.ndarray] = []
+    index: dict[bytes, int] = {}
+
+    def arc_ids(ring: np.ndarray) -> list[int]:
+        ids = []
+        for arc in _cut(ring, junctions):
+            key = arc.tobytes()
+            if key in index:
+                ids.append(index[key])
+                continue
+            reverse = arc[::-1]
+            if not np.array_equal(arc[0], arc[-1]) or len(arc) <= 2:
+                rkey = np.ascontiguousarray(reverse).tobytes()
+            else:
+                # a closed arc reversed: start again from its smallest point
+                rkey = _cut(reverse[:-1], set())[0].tobytes()
+            if rkey in index:
+                ids.append(~index[rkey])
+                continue
+            index[key] = len(arcs)
+            arcs.append(arc)
+            ids.append(index[key])
+        return ids
+
+    geometries = []
+    for name, polygons in zip(names, shapes):
+        encoded = [
+            [arc_ids(ring) for ring in rings] for rings in polygons if len(rings)
+        ]
+        geometry = {"id": name, "properties": {"state": name}}
+        if len(encoded) == 1:
+            geometry.update(type="Polygon", arcs=encoded[0])
+        else:
+            geometry.update(type="MultiPolygon", arcs=encoded)
+        geometries.append(geometry)
+
+    grid_tolerance = tolerance / float(scale.max())
+    delta_arcs = []
+    for arc in arcs:
+        simple = _simplify(arc, grid_tolerance)
+        delta = np.vstack([simple[:1], np.diff(simple, axis=0)])
+        delta_arcs.append(delta.tolist())
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": scale.tolist(), "translate": translate.tolist()},
+        "objects": {
+            OBJECT_NAME: {"type": "GeometryCollection", "geometries": geometries}
+        },
+        "arcs": delta_arcs,
+    }
+
+
+def decode_topology(topology: dict) -> dict:
+    """
+    Decodes a topology of `build_topology` back to {name: geometry}.
+    """
+    scale = np.array(topology["transform"]["scale"])
+    translate = np.array(topology["transform"]["translate"])
+    arcs = [
+        np.cumsum(np.array(arc, dtype=np.int64), axis=0) * scale + translate
+        for arc in topology["arcs"]
+    ]
+
+    def ring(ids):
+        parts = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in ids]
+        return np.vstack([parts[0]] + [p[1:] for p in parts[1:]])
+
+    def polygon(rings):
+        return shapely.Polygon(ring(rings[0]), [ring(r) for r in rings[1:]])
+
+    geoms = {}
+    for g in topology["objects"][OBJECT_NAME]["geometries"]:
+        if g["type"] == "Polygon":
+            geoms[g["id"]] = polygon(g["arcs"])
+        else:
+            geoms[g["id"]] = shapely.MultiPolygon([polygon(p) for p in g["arcs"]])
+    return geoms
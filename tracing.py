@@ -0,0 +1,189 @@
+"""
+Stage-level tracing for the plot script and the dashboard.
+
+Wrap a stage in `with span("name", key=value):` or decorate a function with
+`@traced("name")`. Tracing is off unless `enable(path)` is called or the
+AAAQ_TRACE environment variable names an output file; while off, `span`
+returns a shared no-op context manager and `traced` adds a single flag check.
+
+`write()` saves a Chrome trace (open it in chrome://tracing or Perfetto) that
+merges the spans of pool workers, and prints the slowest figures.
+"""
+
+import atexit
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+TRACE_ENV = "AAAQ_TRACE"
+
+_ENABLED = False
+_PATH: str | None = None
+_EVENTS: list[dict] = []
+_LOCK = threading.Lock()
+_NULL_SPAN = nullcontext()
+
+# forked pool workers must not re-flush the spans buffered by their parent
+os.register_at_fork(after_in_child=_EVENTS.clear)
+
+
+def enable(path: str) -> None:
+    """
+    Starts recording spans; `write()` will save them to `path`. The path is
+    exported through AAAQ_TRACE so worker processes record too.
+    """
+    global _ENABLED, _PATH
+    _ENABLED, _PATH = True, path
+    os.environ[TRACE_ENV] = path
+
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+
+def _record(name: str, start_ns: int, end_ns: int, args: dict) -> None:
+    event = {
+        "name": name,
+        "ph": "X",
+        "ts": start_ns / 1000,
+        "dur": (end_ns - start_ns) / 1000,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args,
+    }
+    with _LOCK:
+        _EVENTS.append(event)
+
+
+@contextmanager
+def _span(name: str, args: dict):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _record(name, start, time.perf_counter_ns(), args)
+
+
+def span(name: str, **args):
+    """
+    Context manager recording one span; a shared no-op when tracing is off.
+    """
+    if not _ENABLED:
+        return _NULL_SPAN
+    return _span(name, args)
+
+
+def traced(name: str | None = None):
+    """
+    Decorator recording a span around every call of the function.
+    """
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return fn(*args, **kwargs)
+            with _span(span_name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _part_path(path: str, pid: int) -> str:
+    return f"{path}.{pid}.part"
+
+
+def flush_part() -> None:
+    """
+    Appends this process's buffered spans to its part file next to the trace.
+    Called by pool workers after each job; the main process merges the parts.
+    """
+    if not _ENABLED or not _EVENTS:
+        return
+    with _LOCK:
+        events = _EVENTS[:]
+        _EVENTS.clear()
+    with open(_part_path(_PATH, os.getpid()), "a") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def collect_events() -> list[dict]:
+    """
+    Returns the spans of this process plus those flushed by worker processes,
+    removing the worker part files.
+    """
+    with _LOCK:
+        events = _EVENTS[:]
+        _EVENTS.clear()
+    for part in glob.glob(_part_path(_PATH, "*")):
+        with open(part) as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+        os.remove(part)
+    return sorted(events, key=lambda e: e["ts"])
+
+
+def summarize(events: list[dict], top: int = 10) -> str:
+    """
+    Returns a table of total time per stage and of the slowest figures
+    (spans carrying a `figure` argument). Pure: no I/O.
+    """
+    stages: dict[str, list[float]] = {}
+    figures: dict[str, dict[str, float]] = {}
+    for event in events:
+        stages.setdefault(event["name"], []).append(event["dur"])
+        figure = event["args"].get("figure")
+        if figure is not None:
+            parts = figures.setdefault(figure, {})
+            parts[event["name"]] = parts.get(event["name"], 0) + event["dur"]
+
+    lines = [f"{'stage':<32}{'calls':>7}{'total s':>10}{'max s':>9}"]
+    for name, durs in sorted(stages.items(), key=lambda kv: -sum(kv[1])):
+        lines.append(
+            f"{name:<32}{len(durs):>7}{sum(durs) / 1e6:>10.3f}{max(durs) / 1e6:>9.3f}"
+        )
+    if figures:
+        lines += ["", f"slowest {min(top, len(figures))} figures (s):"]
+        slowest = sorted(figures.items(), key=lambda kv: -sum(kv[1].values()))
+        for figure, parts in slowest[:top]:
+            detail = ", ".join(f"{k} {v / 1e6:.3f}" for k, v in sorted(parts.items()))
+            lines.append(f"  {sum(parts.values()) / 1e6:8.3f}  {figure}  ({detail})")
+    return "\n".join(lines)
+
+
+def write(path: str | None = None, summary: bool = True) -> str | None:
+    """
+    Saves all spans recorded so far as a Chrome trace and prints the summary.
+    Returns the written path, or None when tracing is off.
+    """
+    if not _ENABLED:
+        return None
+    path = path or _PATH
+    events = collect_events()
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    if summary:
+        print(summarize(events), file=sys.stderr)
+    return path
+
+
+if os.environ.get(TRACE_ENV) and __name__ != "__main__":
+    enable(os.environ[TRACE_ENV])
+    # Pool workers may be terminated without running atexit handlers; they
+    # call `flush_part` after each job instead.
+    atexit.register(flush_part)
+
+
+if __name__ == "__main__":
+    # Merge the part files of a traced run (e.g. the dashboard) into one trace
+    enable(sys.argv[1] if len(sys.argv) > 1 else os.environ[TRACE_ENV])
+    print(f"wrote {write()}")
@@ -0,0 +1,326 @@
+"""
+Monte Carlo uncertainty bands of the deficit indices.
+
+The thresholds (S6), population and workforce counts behind the indices are
+estimates. Each draw multiplies them by lognormal errors and maps the stored
+value v of every cell to a new one through the 1 - v gap, as the what-if
+scenarios do (see whatif.py), so no workforce inputs are needed:
+
+    AvD_{norm}, AvD_urban_{norm}, AvD_male_{norm}
+        1 - (1 - v) * e_hrh / (e_pop * e_thr)
+    ApD_cadre_mix_{norm}
+        1 - (1 - v) * (e_hrh / e_hrh_doctor) / (e_thr / e_thr_doctor)
+    AsD, ApD_sex_mix, QD
+        1 - (1 - v) * e_ratio, the error of a ratio of two independent
+        estimates (workforce only for QD, workforce and population otherwise)
+
+Threshold errors are drawn per norm and cadre and shared by every state and
+year; population errors per state and year; workforce errors per state, cadre
+and year, shared by the segments and norms of a cell. The draws of a block of
+states are one (draws, states, variables, cadres, years) array, so every
+series is evaluated by the same handful of array operations. Every state
+draws its errors from its own stream, keyed by the seed and its name, so its
+bands depend on the seed, the draw count and the cube axes but not on which
+other states are simulated or how they are blocked.
+
+Usage:
+    python uncertainty.py [EXCEL_FILE] [OUT_DIR] [DRAWS]
+"""
+
+import sys
+import time
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import cache
+import manifest
+from cube import DeficitCube
+from results_tables import TABLES_DIR, write_table
+from tracing import span, traced
+from whatif import variable_norm
+
+DRAWS = 2000
+PERCENTILES = (5.0, 95.0)
+# Elements of the draw array of one block of states (float32)
+MAX_CELLS = 2**24
+# Ratio variables of two workforce counts of the same population
+RATIO_WORKFORCE = ("QD",)
+
+
+@dataclass(frozen=True)
+class Uncertainty:
+    """
+    Standard deviations of the log errors of the estimates, e.g. 0.1 for
+    a relative error of about 10%.
+    """
+
+    threshold: float = 0.10
+    population: float = 0.05
+    workforce: float = 0.10
+
+
+@dataclass(frozen=True)
+class Bands:
+    """
+    Lower and upper percentile of every cell, as cubes on the axes of the
+    simulated cube.
+    """
+
+    low: DeficitCube
+    high: DeficitCube
+    percentiles: tuple[float, float]
+
+    def line_band(self, state: str, variable: str) -> pd.DataFrame:
+        """
+        Returns the (low, high) columns of one (state, variable) group, indexed
+        like `DeficitCube.line_group`.
+        """
+        return pd.concat(
+            {
+                "low": self.low.line_group(state, variable),
+                "high": self.high.line_group(state, variable),
+            },
+            axis=1,
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        low, high = self.percentiles
+        return pd.concat(
+            {f"p{low:g}": self.low.to_series(), f"p{high:g}": self.high.to_series()},
+            axis=1,
+        )
+
+
+def error_models(variables: list[str], spec: Uncertainty) -> dict:
+    """
+    Returns the error model of every variable as arrays over `variables`:
+    `norm` (position in `norms`, -1 for ratio variables), `cadre_mix`, `ratio`
+    (position among the `n_ratio` ratio variables, -1 for the others) and
+    `ratio_sigma` (the log error of ratio variables, 0 for the others), plus
+    the sorted `norms`. Pure: no I/O.
+    """
+    norm_of = [variable_norm(v) for v in variables]
+    norms = sorted({n for n in norm_of if n is not None})
+    norm = np.array([-1 if n is None else norms.index(n) for n in norm_of])
+    ratio_sigma = np.where(
+        np.isin(variables, RATIO_WORKFORCE),
+        spec.workforce,
+        np.hypot(spec.workforce, spec.population),
+    )
+    is_ratio = norm < 0
+    return {
+        "norms": norms,
+        "norm": norm,
+        "n_ratio": int(is_ratio.sum()),
+        "ratio": np.where(is_ratio, np.cumsum(is_ratio) - 1, -1),
+        "cadre_mix": np.array([v.startswith("ApD_cadre_mix") for v in variables]),
+        # a ratio of two independent estimates has sqrt(2) times their error
+        "ratio_sigma": np.where(is_ratio, np.sqrt(2) * ratio_sigma, 0).astype(
+            np.float32
+        ),
+    }
+
+
+def state_rng(seed: int, state: str) -> np.random.Generator:
+    """
+    The random stream of one state's errors. Pure: no I/O.
+    """
+    return np.random.default_rng([seed, zlib.crc32(state.encode())])
+
+
+def _state_normals(rngs: list, shape: tuple, draws: int) -> np.ndarray:
+    """
+    (draws, states) + `shape` standard normals, each state's from its stream.
+    """
+    out = np.empty((draws, len(rngs)) + shape, dtype=np.float32)
+    for i, rng in enumerate(rngs):
+        out[:, i] = rng.standard_normal((draws,) + shape, np.float32)
+    return out
+
+
+def log_errors(
+    cells: tuple[np.ndarray, ...],
+    models: dict,
+    shape: tuple[int, int],
+    doctor: int,
+    spec: Uncertainty,
+    draws: int,
+    rngs: list[np.random.Generator],
+    threshold_errors: np.ndarray,
+) -> np.ndarray:
+    """
+    Returns the (draws, cells) log factors of the 1 - v gap of the (state,
+    variable, cadre, year) positions in `cells`, for a block of states with
+    one stream in `rngs` each and error arrays of `shape` (cadres, years); the
+    cadre-mix variables compare every cadre with the `doctor` position.
+    `threshold_errors` is the (draws, norms, cadres) log error of the
+    thresholds, shared by all blocks.
+    """
+    s, v, k, y = cells
+    n_cadres, n_years = shape
+    workforce = _state_normals(rngs, (n_cadres, n_years), draws)
+    workforce *= spec.workforce
+    population = _state_normals(rngs, (n_years,), draws)
+    population *= spec.population
+
+    out = np.zeros((draws, len(s)), dtype=np.float32)
+    norm = models["norm"][v]
+    density = (norm >= 0) & ~models["cadre_mix"][v]
+    i = np.flatnonzero(density)
+    out[:, i] = (
+        workforce[:, s[i], k[i], y[i]]
+        - population[:, s[i], y[i]]
+        - threshold_errors[:, norm[i], k[i]]
+    )
+
+    i = np.flatnonzero(models["cadre_mix"][v])
+    out[:, i] = (
+        workforce[:, s[i], k[i], y[i]]
+        - workforce[:, s[i], doctor, y[i]]
+        - threshold_errors[:, norm[i], k[i]]
+        + threshold_errors[:, norm[i], doctor]
+    )
+
+    # drawn for every cell of the block, so the stream does not depend on
+    # which cells have values
+    ratio = _state_normals(rngs, (models["n_ratio"], n_cadres, n_years), draws)
+    i = np.flatnonzero(norm < 0)
+    out[:, i] = ratio[:, s[i], models["ratio"][v[i]], k[i], y[i]]
+    out[:, i] *= models["ratio_sigma"][v[i]]
+    return out
+
+
+def percentile_bands(
+    data: np.ndarray,
+    variables: list[str],
+    cadres: list[str],
+    spec: Uncertainty = Uncertainty(),
+    draws: int = DRAWS,
+    percentiles: tuple = PERCENTILES,
+    seed: int = 0,
+    max_cells: int = MAX_CELLS,
+    states: list[str] | None = None,
+) -> np.ndarray:
+    """
+    Simulates `draws` perturbations of the (states, variables, cadres, years)
+    values in `data` and returns their `percentiles` as a
+    (percentiles, states, variables, cadres, years) float32 array. The streams
+    of the states are keyed by their names in `states` (by position without
+    it). States are processed in blocks of at most `max_cells` draw elements;
+    NaN cells stay NaN and are not simulated.
+    """
+    n_states, n_variables, n_cadres, n_years = data.shape
+    models = error_models(variables, spec)
+    # the cadre-mix indices need the doctors' errors even when the cube (e.g.
+    # one line group) has no doctor cadre; they get an extra error column
+    if "doctor" in cadres:
+        doctor, n_error_cadres = cadres.index("doctor"), n_cadres
+    else:
+        doctor, n_error_cadres = n_cadres, n_cadres + 1
+    if states is None:
+        states = [str(i) for i in range(n_states)]
+    rng = np.random.default_rng(seed)
+    threshold_errors = rng.standard_normal(
+        (draws, len(models["norms"]), n_error_cadres), np.float32
+    )
+    threshold_errors *= spec.threshold
+
+    per_state = draws * n_variables * n_cadres * n_years
+    block = max(1, max_cells // max(per_state, 1))
+    q = np.asarray(percentiles, dtype=float) / 100
+    out = np.full((len(q),) + data.shape, np.nan, dtype=np.float32)
+    for start in range(0, n_states, block):
+        gap = 1 - data[start : start + block].astype(np.float32)
+        cells = np.nonzero(~np.isnan(gap))
+        rngs = [state_rng(seed, state) for state in states[start : start + block]]
+        values = log_errors(
+            cells,
+            models,
+            (n_error_cadres, n_years),
+            doctor,
+            spec,
+            draws,
+            rngs,
+            threshold_errors,
+        )
+        np.exp(values, out=values)
+        values *= gap[cells]
+        np.subtract(1, values, out=values)
+        out[:, start : start + block][(slice(None),) + cells] = np.quantile(
+            values, q, axis=0
+        )
+    return out
+
+
+@traced("simulate_bands")
+def simulate_bands(
+    cube: DeficitCube,
+    spec: Uncertainty = Uncertainty(),
+    draws: int = DRAWS,
+    percentiles: tuple = PERCENTILES,
+    seed: int = 0,
+) -> Bands:
+    """
+    Percentile bands of every cell of `cube` under the estimate errors of
+    `spec`.
+    """
+    with span("monte carlo", draws=draws, cells=cube.data.size):
+        low, high = percentile_bands(
+            cube.data,
+            cube.variables,
+            cube.cadres,
+            spec,
+            draws,
+            percentiles,
+            seed,
+            states=cube.states,
+        )
+    labels = (cube.states, cube.variables, cube.cadres, cube.years)
+    return Bands(
+        DeficitCube(low, *labels, name=cube.name),
+        DeficitCube(high, *labels, name=cube.name),
+        tuple(percentiles),
+    )
+
+
+def bands_digest(
+    cube: DeficitCube,
+    spec: Uncertainty = Uncertainty(),
+    draws: int = DRAWS,
+    percentiles: tuple = PERCENTILES,
+    seed: int = 0,
+) -> str:
+    """
+    Hashes everything a cell's band depends on besides the cell's value: the
+    settings, the cube's variable, cadre and year axes and the simulation
+    code. Build manifests use it to tell whether a figure's band changed
+    without simulating. Pure: no I/O.
+    """
+    return manifest.fingerprint(
+        spec,
+        draws,
+        tuple(percentiles),
+        seed,
+        cube.variables,
+        cube.cadres,
+        cube.years,
+        manifest.source_digest(
+            error_models, log_errors, percentile_bands, state_rng, _state_normals
+        ),
+    )
+
+
+if __name__ == "__main__":
+    excel_file = sys.argv[1] if len(sys.argv) > 1 else cache.EXCEL_FILE
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else TABLES_DIR
+    draws = int(sys.argv[3]) if len(sys.argv) > 3 else DRAWS
+    cube = DeficitCube.from_series(cache.load_cleaned(excel_file))
+    start = time.perf_counter()
+    bands = simulate_bands(cube, draws=draws)
+    elapsed = time.perf_counter() - start
+    print(f"{draws} draws of {cube.data.size} cells in {elapsed:.2f} s")
+    for path in write_table(bands.to_frame().unstack("cadres"), out_dir, "bands"):
+        print(f"wrote {path}")
@@ -1,34 +1,222 @@
+import functools
+
 import numpy as np
 import pandas as pd
-import openpyxl
-import shapefile
-import shapely
-from cartopy.io.shapereader import Reader
 
 import constants as c
+from tracing import span, traced
+
+# openpyxl, pyshp and shapely are imported by the functions that read the
+# workbook and the shapefile, so callers of `clean_data` and
+# `determine_cadre_intersection` (the dashboard, runs served from the cache)
+# never pay for them.
 
 
-def load_raw_data(excel_file: str) -> pd.DataFrame:
+@functools.cache
+def _streaming_sheet_parser() -> type:
     """
-    Loads the Excel file, removes hidden columns, drops specified change columns,
-    and replaces error strings with NaN.
-    Returns a pandas DataFrame ready for further cleaning.
+    Returns the worksheet parser class, defined on first use so that importing
+    this module does not import openpyxl.
     """
-    wb = openpyxl.load_workbook(excel_file)
-    ws = wb["Mastersheet_raw_values_based_de"]
+    from openpyxl.utils import column_index_from_string
+    from openpyxl.worksheet._reader import WorkSheetParser
+
+    class _StreamingSheetParser(WorkSheetParser):
+        """
+        Worksheet parser that skips cells in `skip_cols` (1-based column numbers)
+        before their values are cast, so dropped columns never become Python objects.
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.skip_cols: set[int] = set()
+
+        def parse_cell(self, element):
+            if self.skip_cols:
+                coordinate = element.get("r")
+                if coordinate:
+                    column = column_index_from_string(coordinate.rstrip("0123456789"))
+                else:
+                    column = self.col_counter + 1
+                if column in self.skip_cols:
+                    self.col_counter = column
+                    return None
+            return super().parse_cell(element)
+
+    return _StreamingSheetParser
 
-    hidden_cols = []
-    for i, (_, dimension) in enumerate(ws.column_dimensions.items()):
-        if dimension.hidden and dimension.min is not None and dimension.max is not None:
-            hidden_cols.extend(list(range(dimension.min - 1, dimension.max)))
 
-    data = pd.read_excel(excel_file)
-    unhidden = np.setdiff1d(np.arange(data.shape[1]), hidden_cols)
-    data = data.iloc[:, unhidden].replace({"#DIV/0!": np.nan})
-    data = data.drop(c.CHANGE_COLS, axis=1, errors="ignore")
-    return data
+def _hidden_columns(column_dimensions: dict) -> set[int]:
+    """
+    Returns the 1-based indices of hidden columns from the raw `<col>` attributes
+    collected by the worksheet parser. Pure: no I/O.
+    """
+    hidden = set()
+    for attrs in column_dimensions.values():
+        if attrs.get("hidden") in ("1", "true") and "min" in attrs and "max" in attrs:
+            hidden.update(range(int(attrs["min"]), int(attrs["max"]) + 1))
+    return hidden
+
+
+def _header_names(header: list) -> list[str]:
+    """
+    Names header cells the way `pd.read_excel` does: blanks become
+    "Unnamed: i" and repeated names get a ".n" suffix. Pure: no I/O.
+    """
+    names, seen = [], {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _has_parser_hooks(wb, ws) -> bool:
+    """
+    True when openpyxl still has the private reader pieces `load_raw_data`
+    streams the sheet through (they are pinned to 3.1 in pyproject.toml).
+    """
+    try:
+        _streaming_sheet_parser()
+    except ImportError:
+        return False
+    return all(
+        hasattr(obj, attr)
+        for obj, attr in (
+            (ws, "_get_source"),
+            (ws, "_shared_strings"),
+            (wb, "_date_formats"),
+            (wb, "_timedelta_formats"),
+        )
+    )
+
+
+def _read_rows_public(excel_file: str, sheet_name: str) -> tuple[list[str], list]:
+    """
+    Fallback of `load_raw_data` on openpyxl's public API: a full load (read-only
+    worksheets have no column dimensions) and `ws.iter_rows(values_only=True)`.
+    Slower and heavier, but returns the same column names and rows.
+    """
+    import openpyxl
+    from openpyxl.cell.cell import ERROR_CODES
 
+    wb = openpyxl.load_workbook(excel_file, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        hidden = set()
+        for dim in ws.column_dimensions.values():
+            if dim.hidden and dim.min and dim.max:
+                hidden.update(range(dim.min, dim.max + 1))
 
+        rows = ws.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        while header and header[-1] is None:
+            header.pop()
+        names = _header_names(header)
+        dropped = set(c.CHANGE_COLS)
+        keep = [
+            i
+            for i, name in enumerate(names)
+            if i + 1 not in hidden and name not in dropped
+        ]
+
+        data, last_with_data = [], -1
+        for row in rows:
+            values = [np.nan] * len(keep)
+            for j, i in enumerate(keep):
+                value = row[i] if i < len(row) else None
+                if value is None:
+                    continue
+                if not (isinstance(value, str) and value in ERROR_CODES):
+                    values[j] = value
+                last_with_data = len(data)
+            data.append(values)
+    finally:
+        wb.close()
+    return [names[i] for i in keep], data[: last_with_data + 1]
+
+
+@traced("load_raw_data")
+def load_raw_data(excel_file: str, sheet_name: str = c.MASTERSHEET) -> pd.DataFrame:
+    """
+    Streams the mastersheet once in read-only mode, removes hidden columns and
+    the specified change columns while parsing, and replaces error cells with NaN.
+    Falls back to `_read_rows_public` when openpyxl lacks the private parser
+    hooks. Returns a pandas DataFrame ready for further cleaning.
+    """
+    import openpyxl
+
+    with span("workbook open"):
+        wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        streaming = _has_parser_hooks(wb, ws)
+        if streaming:
+            with ws._get_source() as src:
+                parser = _streaming_sheet_parser()(
+                    src,
+                    ws._shared_strings,
+                    data_only=True,
+                    epoch=wb.epoch,
+                    date_formats=wb._date_formats,
+                    timedelta_formats=wb._timedelta_formats,
+                )
+                rows = parser.parse()
+
+                with span("hidden-column scan"):
+                    # <cols> precedes <sheetData>, so hidden columns are known by the
+                    # time the header row has been parsed.
+                    header_cells = next(rows, (None, []))[1]
+                    width = max((cell["column"] for cell in header_cells), default=0)
+                    header = [None] * width
+                    for cell in header_cells:
+                        header[cell["column"] - 1] = cell["value"]
+                    while header and header[-1] is None:
+                        header.pop()
+                    names = _header_names(header)
+
+                    hidden = _hidden_columns(parser.column_dimensions)
+                    dropped = set(c.CHANGE_COLS)
+                    keep = [
+                        i + 1
+                        for i, name in enumerate(names)
+                        if i + 1 not in hidden and name not in dropped
+                    ]
+                    position = {col: i for i, col in enumerate(keep)}
+                    parser.skip_cols = set(range(1, len(names) + 1)) - set(keep)
+
+                with span("read rows"):
+                    data, last_with_data = [], -1
+                    for _, cells in rows:
+                        values = [np.nan] * len(keep)
+                        for cell in cells:
+                            if cell is None or cell["value"] is None:
+                                continue
+                            i = position.get(cell["column"])
+                            if i is None:
+                                continue
+                            if cell["data_type"] != "e":
+                                values[i] = cell["value"]
+                            last_with_data = len(data)
+                        data.append(values)
+            columns = [names[i - 1] for i in keep]
+            data = data[: last_with_data + 1]
+    finally:
+        wb.close()
+    if not streaming:
+        with span("read rows (public API)"):
+            columns, data = _read_rows_public(excel_file, sheet_name)
+
+    with span("build frame"):
+        data = pd.DataFrame(data, columns=columns)
+        return data.replace({"#DIV/0!": np.nan})
+
+
+@traced("clean_data")
 def clean_data(data: pd.DataFrame) -> pd.Series:
     """
     Transforms the raw DataFrame into a cleaned, stacked DataFrame with a MultiIndex:
@@ -38,65 +226,72 @@ def clean_data(data: pd.DataFrame) -> pd.Series:
     states = data.iloc[:, 0].str.lower().str.strip()
     cadres = data.iloc[:, 1].str.lower()
 
-    values = data.filter(
-        regex=r"^((A(v|s|p)D)|QD)_((?P<thresh>[a-zA-Z0-9_]+)_)?[0-9]{4}"
-    )
-    replace_dict = {"#DIV/0!": np.nan, "ERROR": np.nan, "#VALUE!": np.nan}
-    values = values.replace(replace_dict).astype(float)
+    with span("clean_data.regex"):
+        values = data.filter(
+            regex=r"^((A(v|s|p)D)|QD)_((?P<thresh>[a-zA-Z0-9_]+)_)?[0-9]{4}"
+        )
+        replace_dict = {"#DIV/0!": np.nan, "ERROR": np.nan, "#VALUE!": np.nan}
+        values = values.replace(replace_dict).astype(float)
 
-    cleaned = values.set_index([states, cadres])  # type: ignore
+        cleaned = values.set_index([states, cadres])  # type: ignore
 
-    extracted = cleaned.columns.str.extract(
-        r"^(?P<variable>.*)_(?P<year>[0-9]{4})(_using_(?P<method>[a-zA-Z_]+))?$"
-    )
+        extracted = cleaned.columns.str.extract(
+            r"^(?P<variable>.*)_(?P<year>[0-9]{4})(_using_(?P<method>[a-zA-Z_]+))?$"
+        )
 
-    is_year_nan = extracted["year"].isna()
-    extracted = extracted[~is_year_nan]
-    cleaned = cleaned.loc[:, ~is_year_nan.to_numpy()]
+        is_year_nan = extracted["year"].isna()
+        extracted = extracted[~is_year_nan]
+        cleaned = cleaned.loc[:, ~is_year_nan.to_numpy()]
 
-    extracted["year"] = extracted["year"].astype(int)
-    extracted = extracted.drop(2, axis=1)  # drop the unnamed column
-    extracted["method"] = extracted["method"].fillna("default")
-    extracted["variable"] = extracted["variable"].replace(
-        {"AvD_IHME_UHC_90": "AvD_IHME_UHC90"}
-    )
+        extracted["year"] = extracted["year"].astype(int)
+        extracted = extracted.drop(2, axis=1)  # drop the unnamed column
+        extracted["method"] = extracted["method"].fillna("default")
+        extracted["variable"] = extracted["variable"].replace(
+            {"AvD_IHME_UHC_90": "AvD_IHME_UHC90"}
+        )
 
-    cleaned.columns = pd.MultiIndex.from_tuples(
-        extracted.to_numpy().tolist(), names=extracted.columns
-    )
-    cleaned = cleaned.stack([0, 1]).swaplevel("cadres", "year").sort_index()
-    cleaned = cleaned.drop(["goa", "daman & diu"], level="states")
+        cleaned.columns = pd.MultiIndex.from_tuples(
+            extracted.to_numpy().tolist(), names=extracted.columns
+        )
+    with span("clean_data.stack"):
+        cleaned = cleaned.stack([0, 1]).swaplevel("cadres", "year").sort_index()
+        cleaned = cleaned.drop(["goa", "daman & diu"], level="states", errors="ignore")
     return cleaned["default"]
 
 
+@traced("load_state_geometries")
 def load_state_geometries(
     shapefile_path: str,
-) -> dict[str, shapely.geometry.Polygon]:
+) -> "dict[str, shapely.geometry.Polygon]":
     """
-    Reads the shapefile using cartopy.io.shapereader.Reader and returns a dictionary
-    mapping state names (lowercased) to their geometries, with certain manual merges/renames.
+    Reads the shapefile using pyshp and returns a dictionary mapping state
+    names (lowercased) to their geometries, with certain manual merges/renames.
     """
-    with shapefile.Reader(shapefile_path) as reader:
+    import shapefile
+    import shapely.geometry
+
+    with span("geometry read"), shapefile.Reader(shapefile_path) as reader:
         state_geoms = {}
         for shape, record in zip(reader.shapes(), reader.records()):
             state_name = record["ST_NM"].lower()
             if state_name not in state_geoms:
                 state_geoms[state_name] = shapely.geometry.shape(shape)
 
-    # Handle special cases / name merges
-    state_geoms["n.c.t. of delhi"] = state_geoms.pop("delhi")
-    state_geoms["andaman & nicobar islands"] = state_geoms.pop("andaman & nicobar")
-    state_geoms["dadra & nagar haveli"] = state_geoms.pop(
-        "dadra and nagar haveli and daman and diu"
-    )
-    # Merge Jammu & Kashmir with Ladakh
-    state_geoms["jammu & kashmir"] = state_geoms["jammu & kashmir"].union(
-        state_geoms.pop("ladakh")
-    )
-    # Merge Andhra Pradesh and Telangana
-    state_geoms["andhra pradesh"] = state_geoms["andhra pradesh"].union(
-        state_geoms.pop("telangana")
-    )
+    with span("geometry merge"):
+        # Handle special cases / name merges
+        state_geoms["n.c.t. of delhi"] = state_geoms.pop("delhi")
+        state_geoms["andaman & nicobar islands"] = state_geoms.pop("andaman & nicobar")
+        state_geoms["dadra & nagar haveli"] = state_geoms.pop(
+            "dadra and nagar haveli and daman and diu"
+        )
+        # Merge Jammu & Kashmir with Ladakh
+        state_geoms["jammu & kashmir"] = state_geoms["jammu & kashmir"].union(
+            state_geoms.pop("ladakh")
+        )
+        # Merge Andhra Pradesh and Telangana
+        state_geoms["andhra pradesh"] = state_geoms["andhra pradesh"].union(
+            state_geoms.pop("telangana")
+        )
     return state_geoms
 
 
@@ -0,0 +1,389 @@
+"""
+Versioned store of the cleaned series of several dated mastersheets.
+
+Every ingested workbook goes through `load_raw_data` + `clean_data` (served
+from the cleaned-series cache when possible) and becomes one version. Cells,
+the (states, year, variable, cadres) keys seen in any version, are stored once
+as small level codes. Values are stored as runs, grouped by cell with
+CSR-style offsets,
+
+    value, first, last    the value of a cell in versions first..last
+
+so a value that does not change between consecutive versions is stored once.
+Versions are ordered by the date in their file name (the trailing
+`26_NOV_23` of the mastersheet, else a leading `14_07_22`, else the file
+modification date); runs are re-encoded from the dense (cells, versions)
+matrix on every ingest, so the ingestion order does not matter.
+
+`diff` compares two versions cell by cell with array operations.
+
+The store is {store_dir}/store.npz, rewritten atomically on every ingest.
+
+Usage:
+    python versions.py ingest EXCEL_FILE [EXCEL_FILE ...]
+    python versions.py list
+    python versions.py diff OLD NEW [--output diff.csv]
+"""
+
+import argparse
+import json
+import os
+import re
+import tempfile
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from cache import file_digest, load_cleaned
+from cube import SERIES_LEVELS, DeficitCube
+from tracing import traced
+
+STORE_DIR = ".cache/versions"
+STORE_FORMAT = 1
+RUN_ARRAYS = ("offsets", "value", "first", "last")
+_MONTH_DATE = re.compile(r"(\d{1,2})_([A-Za-z]{3})_(\d{4}|\d{2})(?!\d)")
+_NUMERIC_DATE = re.compile(r"^(\d{2})_(\d{2})_(\d{2})_")
+
+
+def version_date(path: str) -> date:
+    """
+    The date of a mastersheet from its file name: the last DD_MON_YY, else a
+    leading DD_MM_YY, else the file modification date.
+    """
+    name = os.path.basename(path)
+    candidates = [(m, "%d_%b_%y") for m in _MONTH_DATE.findall(name)[-1:]]
+    candidates += [(m, "%d_%m_%y") for m in _NUMERIC_DATE.findall(name)]
+    for (day, month, year), fmt in candidates:
+        if len(year) == 4:
+            fmt = fmt.replace("%y", "%Y")
+        try:
+            return datetime.strptime(f"{day}_{month}_{year}", fmt).date()
+        except ValueError:
+            continue
+    return date.fromtimestamp(os.path.getmtime(path))
+
+
+def _smallest_uint(n: int) -> np.dtype:
+    return np.min_scalar_type(max(n - 1, 0))
+
+
+def encode_runs(matrix: np.ndarray) -> tuple[np.ndarray, ...]:
+    """
+    Encodes a (cells, versions) matrix, NaN for missing, as runs of equal
+    present values along the versions. Returns (offsets, value, first, last),
+    where the runs of cell i are offsets[i]:offsets[i + 1]. Pure: no I/O.
+    """
+    n_cells, n_versions = matrix.shape
+    present = ~np.isnan(matrix)
+    # a run starts where a value is present and differs from the previous one
+    starts = present.copy()
+    starts[:, 1:] &= ~(present[:, :-1] & (matrix[:, 1:] == matrix[:, :-1]))
+    cell, first = np.nonzero(starts)  # row-major: runs come sorted by cell
+    # a run ends where the next version starts a run or has no value
+    ends = present & np.concatenate(
+        [starts[:, 1:] | ~present[:, 1:], np.ones((n_cells, 1), dtype=bool)], axis=1
+    )
+    _, last = np.nonzero(ends)
+    counts = np.bincount(cell, minlength=n_cells)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.uint32)
+    version_dtype = _smallest_uint(n_versions)
+    return (
+        offsets,
+        matrix[cell, first],
+        first.astype(version_dtype),
+        last.astype(version_dtype),
+    )
+
+
+def run_cells(offsets: np.ndarray) -> np.ndarray:
+    """
+    The cell of every run. Pure: no I/O.
+    """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets.astype(np.int64)))
+
+
+def decode_runs(runs: tuple, n_versions: int) -> np.ndarray:
+    """
+    Inverse of `encode_runs`. Pure: no I/O.
+    """
+    offsets, value, first, last = runs
+    matrix = np.full((len(offsets) - 1, n_versions), np.nan)
+    first, last = first.astype(np.int64), last.astype(np.int64)
+    lengths = last - first + 1
+    rows = np.repeat(run_cells(offsets), lengths)
+    # version of every expanded entry: first + position within its run
+    offsets_in_run = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    matrix[rows, np.repeat(first, lengths) + offsets_in_run] = np.repeat(value, lengths)
+    return matrix
+
+
+class VersionStore:
+    """
+    Cells, value runs and version metadata of the store. Build new stores
+    with `ingest`; the arrays are not modified in place.
+    """
+
+    def __init__(
+        self,
+        levels: list[pd.Index],
+        codes: list[np.ndarray],
+        runs: tuple,
+        versions: list[dict],
+        path: str | None = None,
+    ):
+        self.levels = levels  # in SERIES_LEVELS order
+        self.codes = codes  # per level, one code per cell
+        self.runs = runs  # (offsets, value, first, last)
+        self.versions = versions  # {name, date, file, digest}, in date order
+        self.path = path
+
+    @classmethod
+    def empty(cls, path: str | None = None) -> "VersionStore":
+        levels = [pd.Index([], name=level) for level in SERIES_LEVELS]
+        codes = [np.zeros(0, dtype=np.uint8) for _ in SERIES_LEVELS]
+        runs = encode_runs(np.zeros((0, 0)))
+        return cls(levels, codes, runs, [], path)
+
+    @classmethod
+    def open(cls, store_dir: str = STORE_DIR) -> "VersionStore":
+        """
+        Reads the store of `store_dir`, or returns an empty one.
+        """
+        path = os.path.join(store_dir, "store.npz")
+        if not os.path.exists(path):
+            return cls.empty(path)
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if meta["format"] != STORE_FORMAT:
+                raise ValueError(f"{path} has store format {meta['format']}")
+            levels = [
+                pd.Index(npz[f"level_{i}"].tolist(), name=level)
+                for i, level in enumerate(SERIES_LEVELS)
+            ]
+            codes = [npz[f"codes_{i}"] for i in range(len(SERIES_LEVELS))]
+            runs = tuple(npz[f"run_{k}"] for k in RUN_ARRAYS)
+        return cls(levels, codes, runs, meta["versions"], path)
+
+    def save(self, path: str | None = None) -> str:
+        """
+        Writes the store atomically. Returns its path.
+        """
+        path = path or self.path
+        arrays = {
+            "meta": np.array(
+                json.dumps({"format": STORE_FORMAT, "versions": self.versions})
+            ),
+        }
+        for i, (level, codes) in enumerate(zip(self.levels, self.codes)):
+            labels = level.to_numpy()
+            arrays[f"level_{i}"] = (
+                labels.astype(str) if labels.dtype == object else labels
+            )
+            arrays[f"codes_{i}"] = codes
+        for k, array in zip(RUN_ARRAYS, self.runs):
+            arrays[f"run_{k}"] = array
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.path = path
+        return path
+
+    @property
+    def n_cells(self) -> int:
+        return len(self.codes[0])
+
+    @property
+    def names(self) -> list[str]:
+        return [v["name"] for v in self.versions]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.codes) + sum(a.nbytes for a in self.runs)
+
+    def position(self, version) -> int:
+        """
+        Position of a version given by name or position.
+        """
+        if isinstance(version, int):
+            return range(len(self.versions))[version]
+        return self.names.index(version)
+
+    def index(self) -> pd.MultiIndex:
+        """
+        The cells as a MultiIndex in SERIES_LEVELS order.
+        """
+        return pd.MultiIndex(
+            levels=self.levels,
+            codes=self.codes,
+            names=SERIES_LEVELS,
+            verify_integrity=False,
+        )
+
+    def matrix(self) -> np.ndarray:
+        """
+        The dense (cells, versions) values, NaN where a version has no value.
+        """
+        return decode_runs(self.runs, len(self.versions))
+
+    def values(self, version) -> np.ndarray:
+        """
+        The (cells,) values of one version, NaN where it has no value.
+        """
+        v = self.position(version)
+        offsets, value, first, last = self.runs
+        cell = run_cells(offsets)
+        spans = (first <= v) & (v <= last)
+        out = np.full(self.n_cells, np.nan)
+        out[cell[spans]] = value[spans]
+        return out
+
+    def series(self, version) -> pd.Series:
+        """
+        One version as the series `clean_data` returned for its workbook.
+        """
+        values = self.values(version)
+        present = ~np.isnan(values)
+        series = pd.Series(values, index=self.index(), name="default")[present]
+        return series.sort_index()
+
+    def cube(self, version) -> DeficitCube:
+        return DeficitCube.from_series(self.series(version))
+
+    @traced("versions.ingest")
+    def ingest(self, excel_file: str) -> "VersionStore":
+        """
+        Returns a store with `excel_file` added as a version, or this store
+        when a workbook with the same content is already in it.
+        """
+        digest = file_digest(excel_file)
+        if any(v["digest"] == digest for v in self.versions):
+            return self
+        series = load_cleaned(excel_file)
+
+        # cells of the new version, appended to the known cells
+        known = self.index()
+        new_index = series.index.reorder_levels(SERIES_LEVELS)
+        cells = known.append(new_index.difference(known))
+        cells = pd.MultiIndex.from_tuples(cells, names=SERIES_LEVELS)
+        old_cells = cells.get_indexer(known)
+        new_cells = cells.get_indexer(new_index)
+
+        matrix = np.full((len(cells), len(self.versions) + 1), np.nan)
+        matrix[old_cells, :-1] = self.matrix()
+        matrix[new_cells, -1] = series.to_numpy(dtype=float)
+
+        when = version_date(excel_file)
+        name = when.isoformat()
+        taken = set(self.names)
+        suffix = 2
+        while name in taken:
+            name, suffix = f"{when.isoformat()}-{suffix}", suffix + 1
+        version = {
+            "name": name,
+            "date": when.isoformat(),
+            "file": os.path.basename(excel_file),
+            "digest": digest,
+        }
+        versions = self.versions + [version]
+        order = sorted(range(len(versions)), key=lambda i: versions[i]["date"])
+
+        return VersionStore(
+            [
+                pd.Index(level, name=name)
+                for level, name in zip(cells.levels, SERIES_LEVELS)
+            ],
+            [
+                np.asarray(codes, dtype=_smallest_uint(len(level)))
+                for codes, level in zip(cells.codes, cells.levels)
+            ],
+            encode_runs(matrix[:, order]),
+            [versions[i] for i in order],
+            self.path,
+        )
+
+    def diff(self, old, new) -> pd.DataFrame:
+        """
+        Cell-level differences from version `old` to `new`: one row per cell
+        that was added, removed or changed, with its old and new value and
+        the change.
+        """
+        a, b = self.values(old), self.values(new)
+        in_a, in_b = ~np.isnan(a), ~np.isnan(b)
+        differs = (in_a != in_b) | (in_a & in_b & (a != b))
+        rows = np.flatnonzero(differs)
+        status = np.where(
+            in_a[rows] & in_b[rows], "changed", np.where(in_b[rows], "added", "removed")
+        )
+        index = self.index()[rows]
+        return pd.DataFrame(
+            {
+                "old": a[rows],
+                "new": b[rows],
+                "change": b[rows] - a[rows],
+                "status": status,
+            },
+            index=index,
+        ).sort_index()
+
+
+def diff_summary(diff: pd.DataFrame) -> pd.DataFrame:
+    """
+    Counts the differences per variable and status. Pure: no I/O.
+    """
+    counts = diff.groupby(["variable", "status"]).size().unstack("status", fill_value=0)
+    return counts.reindex(columns=["changed", "added", "removed"], fill_value=0)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="add mastersheets as versions")
+    ingest.add_argument("excel_files", nargs="+")
+    sub.add_parser("list", help="list the versions")
+    diff = sub.add_parser("diff", help="cell-level diff of two versions")
+    diff.add_argument("old", help="version name (date) or position, e.g. -2")
+    diff.add_argument("new", help="version name (date) or position, e.g. -1")
+    diff.add_argument("--output", help="write the diff as csv")
+    args = parser.parse_args(argv)
+
+    store = VersionStore.open(args.store_dir)
+    if args.command == "ingest":
+        for excel_file in args.excel_files:
+            store = store.ingest(excel_file)
+        store.save()
+        args.command = "list"
+    if args.command == "list":
+        dense = store.n_cells * len(store.versions) * 8
+        dense += sum(codes.nbytes for codes in store.codes)
+        print(
+            f"{len(store.versions)} versions, {store.n_cells} cells, "
+            f"{len(store.runs[1])} runs, {store.nbytes / 1024:.0f} KiB "
+            f"(one column per version: {dense / 1024:.0f} KiB)"
+        )
+        for v in store.versions:
+            print(f"  {v['name']}  {v['file']}")
+    elif args.command == "diff":
+
+        def version(text):
+            return int(text) if re.fullmatch(r"-?\d+", text) else text
+
+        table = store.diff(version(args.old), version(args.new))
+        if args.output:
+            table.to_csv(args.output)
+        print(diff_summary(table).to_string())
+        print(f"{len(table)} cells differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Norm what-if scenarios on top of the cleaned deficits.
+
+The norm-based indices are linear in 1 / threshold (see deficits.py), so
+scaling the threshold of a norm for a cadre by a factor f maps a stored value
+v to a new one without any workforce inputs:
+
+    AvD_{norm}, AvD_urban_{norm}, AvD_male_{norm}   1 - (1 - v) / f
+    ApD_cadre_mix_{norm}                            1 - (1 - v) * f_doctor / f
+
+A scenario is a mapping {norm: {cadre: factor}}; cadres left out keep factor 1.
+`ScenarioEngine` recomputes one variable slice at a time and keeps the most
+recently used slices, so a slider move only touches the variables of the
+norm that changed.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from cube import DeficitCube
+from deficits import NORMS
+
+# Spellings of the norms in the mastersheet headers
+NORM_ALIASES = {
+    "HME_UHC80": "IHME_UHC80",
+    "UHC_80": "IHME_UHC80",
+    "UHC_90": "IHME_UHC90",
+    "IHME_UHC_90": "IHME_UHC90",
+}
+_NORM_VARIABLE = re.compile(r"^(AvD_urban|AvD_male|ApD_cadre_mix|AvD)_(?P<norm>.+)$")
+
+
+def variable_norm(variable: str) -> str | None:
+    """
+    Returns the norm a variable is computed against, or None for AsD,
+    ApD_sex_mix and QD. Pure: no I/O.
+    """
+    match = _NORM_VARIABLE.match(variable)
+    if match is None:
+        return None
+    norm = NORM_ALIASES.get(match["norm"], match["norm"])
+    return norm if norm in NORMS else None
+
+
+def normalize_scenario(scenario: dict, cadres: list[str]) -> tuple:
+    """
+    Turns {norm: {cadre: factor}} into a hashable, canonical
+    ((norm, (factor per cadre, ...)), ...) with identity norms dropped.
+    Pure: no I/O.
+    """
+    items = []
+    for norm in sorted(scenario):
+        factors = tuple(float(scenario[norm].get(k, 1.0)) for k in cadres)
+        if any(f != 1.0 for f in factors):
+            items.append((norm, factors))
+    return tuple(items)
+
+
+class ScenarioEngine:
+    """
+    Recomputes norm-based variables of a cube under threshold scenarios, with
+    an LRU cache of (variable, factors) -> (states, cadres, years) slices.
+    Safe to share between the threads serving Streamlit sessions.
+    """
+
+    def __init__(self, cube: DeficitCube, max_slices: int = 256):
+        self.cube = cube
+        self.max_slices = max_slices
+        self.norm_of = {v: variable_norm(v) for v in cube.variables}
+        self.norms = sorted({n for n in self.norm_of.values() if n is not None})
+        self._doctor = cube.cadre_pos.get("doctor")
+        self._slices: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _compute(self, variable: str, factors: np.ndarray) -> np.ndarray:
+        # (states, cadres, years); computed per miss rather than kept for the
+        # whole cube, which would double the memory of every replica
+        gap = 1 - self.cube.data[:, self.cube.variable_pos[variable]]
+        if variable.startswith("ApD_cadre_mix"):
+            if self._doctor is None:
+                return 1 - gap
+            factors = factors / factors[self._doctor]
+        return 1 - gap / factors[None, :, None]
+
+    def variable_slice(self, variable: str, factors: tuple) -> np.ndarray:
+        """
+        Returns the read-only (states, cadres, years) values of `variable`
+        with its norm's thresholds scaled by `factors` (one per cadre).
+        """
+        key = (variable, factors)
+        with self._lock:
+            values = self._slices.get(key)
+            if values is not None:
+                self._slices.move_to_end(key)
+                self.hits += 1
+                return values
+        values = self._compute(variable, np.asarray(factors, dtype=np.float32))
+        values.setflags(write=False)
+        with self._lock:
+            self.misses += 1
+            self._slices[key] = values
+            while len(self._slices) > self.max_slices:
+                self._slices.popitem(last=False)
+        return values
+
+    def view(self, scenario: dict) -> "ScenarioView":
+        """
+        Returns the cube as seen under `scenario`.
+        """
+        return ScenarioView(self, normalize_scenario(scenario, self.cube.cadres))
+
+
+class ScenarioView:
+    """
+    Read-only stand-in for a DeficitCube under one scenario: `line_group` and
+    `map_group` return the recomputed values for variables of a scaled norm
+    and the cube's own values otherwise.
+    """
+
+    def __init__(self, engine: ScenarioEngine, scenario: tuple):
+        self.engine, self.cube, self.scenario = engine, engine.cube, scenario
+        self._factors = dict(scenario)
+
+    def __getattr__(self, name):
+        # labels and lookups (states, variables, state_pos, ...) of the cube
+        return getattr(self.cube, name)
+
+    def is_changed(self, variable: str) -> bool:
+        return self.engine.norm_of.get(variable) in self._factors
+
+    def _slice(self, variable: str) -> np.ndarray:
+        factors = self._factors[self.engine.norm_of[variable]]
+        return self.engine.variable_slice(variable, factors)
+
+    def line_group(self, state: str, variable: str) -> pd.Series:
+        series = self.cube.line_group(state, variable)
+        if not self.is_changed(variable):
+            return series
+        codes = series.index.codes
+        values = self._slice(variable)[self.cube.state_pos[state]][codes[3], codes[1]]
+        return pd.Series(values.astype(float), index=series.index, name=series.name)
+
+    def map_group(self, variable: str, year: int, cadre: str) -> pd.Series:
+        series = self.cube.map_group(variable, year, cadre)
+        if not self.is_changed(variable):
+            return series
+        values = self._slice(variable)[
+            series.index.codes[0], self.cube.cadre_pos[cadre], self.cube.year_pos[year]
+        ]
+        return pd.Series(values.astype(float), index=series.index, name=series.name)